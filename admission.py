@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+
+class ConcurrencyGate:
+    """At most ``limit`` requests inside, at most ``queue_size`` waiting.
+
+    A request that finds the queue full, or waits longer than
+    ``wait_seconds``, is turned away instead of piling up on the threadpool
+    and the SQLite write lock. A ``patient`` caller (a submit, which a retry
+    would push past its deadline) is never turned away: it queues beyond the
+    bound and waits as long as it takes. Slots are handed to waiters in
+    arrival order. Lives on the event loop: ``enter``/``leave`` are not
+    thread-safe.
+    """
+
+    def __init__(self, limit: int, queue_size: int, wait_seconds: float):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.wait = wait_seconds
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def full(self) -> bool:
+        return self.active >= self.limit and len(self._waiters) >= self.queue_size
+
+    async def enter(self, patient: bool = False) -> bool:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        if self.full() and not patient:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, None if patient else self.wait)
+        except BaseException as exc:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over just as we gave up
+                self.leave()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if isinstance(exc, asyncio.TimeoutError):
+                return False
+            raise
+        return True
+
+    def leave(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # the slot passes on: ``active`` stays the same
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class TokenBuckets:
+    """Per-key token buckets: ``burst`` requests at once, ``rate`` per second after.
+
+    Absorbs double clicks and client retry loops. Called from worker threads
+    and the loop alike, hence the lock. A bucket that has refilled is the
+    same as none, so those are dropped once ``max_keys`` is exceeded.
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def take(self, key: str) -> float:
+        """0 if a token was taken, otherwise seconds until the next one."""
+        if self.rate <= 0 or self.burst <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / self.rate
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return 0.0
+
+    def _prune(self, now: float):
+        full = [
+            key
+            for key, (tokens, updated) in self._buckets.items()
+            if tokens + (now - updated) * self.rate >= self.burst
+        ]
+        for key in full:
+            del self._buckets[key]
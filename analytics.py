@@ -0,0 +1,230 @@
+from array import array
+import sqlite3
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+HISTOGRAM_BINS = 10
+
+
+class ResponseMatrix:
+    """Graded attempts decoded into dense arrays.
+
+    ``responses[a, q, o]`` is True when attempt ``a`` selected original
+    option ``o`` of question slot ``q``; ``presented[a, q]`` marks the
+    questions the attempt was actually shown. Rows can be fed one by one
+    with ``add_decoded`` while another consumer streams the same cursor.
+    """
+
+    def __init__(self, questions: List[Dict]):
+        self.questions = questions
+        self.slots = {q["id"]: slot for slot, q in enumerate(questions)}
+        self.n_options = max((len(q["options"]) for q in questions), default=0)
+        # flat index buffers; typed arrays keep large cohorts compact
+        self._scores = array("d")
+        self._totals = array("d")
+        self._shown = (array("i"), array("i"))
+        self._picked = (array("i"), array("i"), array("i"))
+        self._arrays: Optional[Tuple[np.ndarray, ...]] = None
+
+        n_questions = len(questions)
+        self.options = np.zeros((n_questions, self.n_options), dtype=bool)
+        self.key = np.zeros((n_questions, self.n_options), dtype=bool)
+        self.has_key = np.ones(n_questions, dtype=bool)
+        for slot, q in enumerate(questions):
+            self.options[slot, : len(q["options"])] = True
+            if q.get("multiple"):
+                self.key[slot, q.get("correctIndexes", [])] = True
+            elif q.get("correctIndex") is not None:
+                self.key[slot, q["correctIndex"]] = True
+            else:
+                self.has_key[slot] = False
+
+    def add_decoded(
+        self,
+        score: Optional[int],
+        total: Optional[int],
+        presented: Iterable[int],
+        selected: Mapping[int, Iterable[int]],
+    ):
+        """Add an attempt whose answers are already mapped to original options."""
+        a = len(self._scores)
+        self._scores.append(score or 0)
+        self._totals.append(total or 0)
+        slots = self.slots
+        shown_att, shown_slot = self._shown
+        att_idx, slot_idx, opt_idx = self._picked
+
+        for qid in presented:
+            slot = slots.get(qid)
+            if slot is not None:
+                shown_att.append(a)
+                shown_slot.append(slot)
+        for qid, options in selected.items():
+            slot = slots.get(qid)
+            if slot is None:
+                continue
+            for opt in options:
+                if 0 <= opt < self.n_options:
+                    att_idx.append(a)
+                    slot_idx.append(slot)
+                    opt_idx.append(opt)
+        self._arrays = None
+
+    def _build(self) -> Tuple[np.ndarray, ...]:
+        if self._arrays is None:
+            shape = (len(self._scores), len(self.questions))
+            presented = np.zeros(shape, dtype=bool)
+            presented[_index(self._shown[0]), _index(self._shown[1])] = True
+            responses = np.zeros(shape + (self.n_options,), dtype=bool)
+            responses[tuple(_index(idx) for idx in self._picked)] = True
+            self._arrays = (
+                presented,
+                responses,
+                np.frombuffer(self._scores, dtype=np.float64).copy(),
+                np.frombuffer(self._totals, dtype=np.float64).copy(),
+            )
+        return self._arrays
+
+    @property
+    def presented(self) -> np.ndarray:
+        return self._build()[0]
+
+    @property
+    def responses(self) -> np.ndarray:
+        return self._build()[1]
+
+    @property
+    def scores(self) -> np.ndarray:
+        return self._build()[2]
+
+    @property
+    def totals(self) -> np.ndarray:
+        return self._build()[3]
+
+    @property
+    def correct(self) -> np.ndarray:
+        exact = (self.responses == self.key[None, :, :]).all(axis=2)
+        return exact & self.presented & self.has_key[None, :]
+
+
+def _index(values: array) -> np.ndarray:
+    return np.frombuffer(values, dtype=np.intc).astype(np.intp)
+
+
+def load_responses(conn: sqlite3.Connection, questions: List[Dict]) -> ResponseMatrix:
+    # attempt_answers already holds original option indexes: no shuffle to
+    # regenerate and no JSON to decode per attempt
+    rows = conn.execute(
+        """
+        SELECT a.id, a.score, a.total_questions, aa.question_id, aa.selected_mask
+        FROM attempts a
+        JOIN attempt_answers aa ON aa.attempt_id = a.id
+        WHERE a.finished_at IS NOT NULL AND a.total_questions > 0
+        ORDER BY a.id
+        """
+    )
+    matrix = ResponseMatrix(questions)
+    for _, group in groupby(rows, key=itemgetter(0)):
+        group = list(group)
+        matrix.add_decoded(
+            group[0][1],
+            group[0][2],
+            [row[3] for row in group],
+            {row[3]: mask_indexes(row[4]) for row in group if row[4]},
+        )
+    return matrix
+
+
+def mask_indexes(mask: int) -> List[int]:
+    return [i for i in range(mask.bit_length()) if mask >> i & 1]
+
+
+def _masked_mean(values: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    n = weights.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, (values * weights).sum(axis=0) / n, np.nan)
+
+
+def _value(value) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def item_analysis(matrix: ResponseMatrix) -> Dict:
+    questions = matrix.questions
+    weights = matrix.presented.astype(np.float64)
+    correct = matrix.correct.astype(np.float64)
+
+    difficulty = _masked_mean(correct, weights)
+
+    # point-biserial against the rest score (total without the item itself)
+    rest = correct.sum(axis=1, keepdims=True) - correct
+    mean_r = _masked_mean(rest, weights)
+    dx = (correct - difficulty) * weights
+    dr = (rest - mean_r) * weights
+    with np.errstate(invalid="ignore", divide="ignore"):
+        discrimination = (dx * dr).sum(axis=0) / np.sqrt(
+            (dx * dx).sum(axis=0) * (dr * dr).sum(axis=0)
+        )
+
+    shown = weights.sum(axis=0)
+    picked = matrix.responses.sum(axis=0).astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rates = np.where(shown[:, None] > 0, picked / shown[:, None], np.nan)
+
+    items = []
+    for slot, q in enumerate(questions):
+        items.append(
+            {
+                "id": q["id"],
+                "topic": q.get("topic"),
+                "presented": int(shown[slot]),
+                "difficulty": _value(difficulty[slot]),
+                "discrimination": _value(discrimination[slot]),
+                "optionRates": [_value(v) for v in rates[slot, matrix.options[slot]]],
+                "correctOptions": np.flatnonzero(matrix.key[slot]).tolist(),
+            }
+        )
+
+    topic_names = sorted({str(q.get("topic")) for q in questions})
+    topic_slots = {name: t for t, name in enumerate(topic_names)}
+    topic_of = np.array(
+        [topic_slots[str(q.get("topic"))] for q in questions], dtype=np.int64
+    )
+    onehot = np.zeros((len(questions), len(topic_names)))
+    onehot[np.arange(len(questions)), topic_of] = 1.0
+    topic_correct = correct @ onehot
+    topic_shown = weights @ onehot
+    with np.errstate(invalid="ignore", divide="ignore"):
+        per_attempt = np.where(topic_shown > 0, topic_correct / topic_shown, np.nan)
+    topics = []
+    for t, name in enumerate(topic_names):
+        column = per_attempt[:, t]
+        column = column[~np.isnan(column)]
+        topics.append(
+            {
+                "topic": name,
+                "attempts": int(column.size),
+                "mean": _value(column.mean()) if column.size else None,
+            }
+        )
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        percent = np.where(
+            matrix.totals > 0, matrix.scores / matrix.totals * 100, 0.0
+        )
+    counts, edges = np.histogram(percent, bins=HISTOGRAM_BINS, range=(0, 100))
+    distribution = {
+        "attempts": int(percent.size),
+        "mean": round(float(percent.mean()), 2) if percent.size else None,
+        "median": round(float(np.median(percent)), 2) if percent.size else None,
+        "std": round(float(percent.std()), 2) if percent.size else None,
+        "histogram": {
+            "edges": [round(float(e), 2) for e in edges],
+            "counts": counts.tolist(),
+        },
+    }
+
+    return {"items": items, "topics": topics, "scores": distribution}
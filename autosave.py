@@ -0,0 +1,137 @@
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+import codec
+from writer import GroupCommitWriter
+
+
+@dataclass
+class Progress:
+    user_id: int
+    deadline_at: str
+    answers: List[Dict]
+    current_index: int
+    updated_at: str
+    touched: float = field(default_factory=time.monotonic)
+
+    def answer_map(self) -> codec.AnswerMap:
+        return {a["questionId"]: a["selectedIndexes"] for a in self.answers}
+
+
+class ProgressBuffer:
+    """Write-behind buffer of in-progress answers.
+
+    Autosaves replace the attempt's entry in memory; ``flush()`` writes every
+    changed entry in one writer batch, so a burst of clicks costs one commit
+    per flush interval instead of one per click. Clean entries stay cached
+    for reads until they have been idle for ``idle_seconds``.
+    """
+
+    def __init__(self, writer: GroupCommitWriter, idle_seconds: float = 600):
+        self.writer = writer
+        self.idle = idle_seconds
+        self._entries: Dict[int, Progress] = {}
+        self._dirty: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def cached(self, attempt_id: int) -> Optional[Progress]:
+        return self._entries.get(attempt_id)
+
+    def put(self, attempt_id: int, progress: Progress):
+        with self._lock:
+            self._entries[attempt_id] = progress
+            self._dirty.add(attempt_id)
+
+    def get(self, conn: sqlite3.Connection, attempt_id: int) -> Optional[Progress]:
+        """Latest progress: the buffer first, then the last flushed copy."""
+        progress = self._entries.get(attempt_id)
+        if progress is not None:
+            return progress
+        row = conn.execute(
+            """
+            SELECT a.user_id, a.deadline_at, p.answers_json, p.current_index, p.updated_at
+            FROM attempt_progress p
+            JOIN attempts a ON a.id = p.attempt_id
+            WHERE p.attempt_id = ?
+            """,
+            (attempt_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return Progress(
+            row["user_id"],
+            row["deadline_at"],
+            codec.loads(row["answers_json"]),
+            row["current_index"],
+            row["updated_at"],
+        )
+
+    def discard(self, attempt_id: int):
+        with self._lock:
+            self._entries.pop(attempt_id, None)
+            self._dirty.discard(attempt_id)
+
+    def flush(self) -> int:
+        """Write changed entries in one transaction; returns how many."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            rows = []
+            for attempt_id in dirty:
+                progress = self._entries.get(attempt_id)
+                if progress is not None:
+                    rows.append(
+                        (
+                            attempt_id,
+                            codec.dumps_text(progress.answers),
+                            progress.current_index,
+                            progress.updated_at,
+                            attempt_id,
+                        )
+                    )
+            self._evict_idle()
+        if not rows:
+            return 0
+
+        def write(conn: sqlite3.Connection):
+            # finished attempts are skipped: submit may have won the race;
+            # with several workers another one may hold a newer copy already
+            conn.executemany(
+                """
+                INSERT INTO attempt_progress (attempt_id, answers_json, current_index, updated_at)
+                SELECT ?, ?, ?, ?
+                WHERE EXISTS (
+                    SELECT 1 FROM attempts WHERE id = ? AND finished_at IS NULL
+                )
+                ON CONFLICT (attempt_id) DO UPDATE SET
+                    answers_json = excluded.answers_json,
+                    current_index = excluded.current_index,
+                    updated_at = excluded.updated_at
+                WHERE excluded.updated_at > attempt_progress.updated_at
+                """,
+                rows,
+            )
+
+        try:
+            self.writer.run(write)
+        except Exception:
+            with self._lock:
+                self._dirty |= dirty & self._entries.keys()
+            raise
+        return len(rows)
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle
+        stale = [
+            attempt_id
+            for attempt_id, progress in self._entries.items()
+            if progress.touched < cutoff and attempt_id not in self._dirty
+        ]
+        for attempt_id in stale:
+            del self._entries[attempt_id]
+
@@ -0,0 +1,307 @@
+import hashlib
+import heapq
+import os
+import random
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from codec import dumps, loads
+from grading import AnswerKey
+
+OptionMapping = Dict[int, List[int]]
+
+PERMUTATION_CACHE_SIZE = 4096
+
+
+def shuffle(order: List[int], rng: random.Random):
+    """Fisher-Yates with rejection sampling on ``getrandbits``, spelled out.
+
+    ``random.shuffle`` makes no promise across Python versions, and seed-mode
+    attempts rebuild their option order from the seed on every read. This is
+    the algorithm it has used since 3.2, so stored seeds keep their order;
+    ``getrandbits`` is read straight off the Mersenne Twister stream.
+    """
+    for i in range(len(order) - 1, 0, -1):
+        n = i + 1
+        k = n.bit_length()
+        j = rng.getrandbits(k)
+        while j >= n:
+            j = rng.getrandbits(k)
+        order[i], order[j] = order[j], order[i]
+
+
+class QuestionBank:
+    """One parsed version of the quiz JSON.
+
+    ``version`` is a content hash, so the same file always maps to the same
+    version and attempts can regenerate their option order from a seed.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.version = hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+        self.raw: Dict = loads(source)
+        validate_bank(self.raw)
+        self.name = self.raw.get("name", "QA Quiz")
+        self.questions: Dict[int, Dict] = {
+            q["id"]: q for q in self.raw.get("questions", [])
+        }
+        self.key = AnswerKey(self.questions)
+        # topic -> questions drawn per attempt; None when every attempt gets the whole bank
+        self.pool = self._pool_counts(self.raw.get("pool"))
+        self.attempt_size = (
+            sum(self.pool.values()) if self.pool is not None else len(self.questions)
+        )
+        self.fragments = self._encode_fragments()
+        self.permutations: Callable[[int], OptionMapping] = lru_cache(
+            maxsize=PERMUTATION_CACHE_SIZE
+        )(self._permutations)
+
+    @classmethod
+    def from_file(cls, path: Path) -> "QuestionBank":
+        return cls(path.read_text(encoding="utf-8"))
+
+    def _pool_counts(self, pool: Optional[Dict]) -> Optional[Dict[str, int]]:
+        if pool is None:
+            return None
+        sizes: Dict[str, int] = {}
+        for q in self.questions.values():
+            topic = str(q.get("topic"))
+            sizes[topic] = sizes.get(topic, 0) + 1
+        per_topic = pool.get("perTopic")
+        overrides = pool.get("topics", {})
+        return {
+            topic: min(size, overrides.get(topic, size if per_topic is None else per_topic))
+            for topic, size in sizes.items()
+        }
+
+    def _encode_fragments(self) -> Dict[int, Tuple[bytes, List[bytes]]]:
+        # static JSON of every question split around its options, so a
+        # shuffled payload is assembled by splicing bytes in permutation order
+        fragments = {}
+        for qid, q in self.questions.items():
+            head = dumps(
+                {
+                    "id": q["id"],
+                    "topic": q.get("topic"),
+                    "text": q["text"],
+                    "multiple": q.get("multiple", False),
+                    "options": [],
+                }
+            )
+            options = [dumps(option) for option in q["options"]]
+            # drop the closing "]}" of the empty options list
+            fragments[qid] = (head[:-2], options)
+        return fragments
+
+    def questions_json(
+        self,
+        option_mapping: Mapping[int, List[int]],
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> bytes:
+        """JSON array of the attempt's questions with options in presented order.
+
+        ``offset``/``limit`` select a page of the attempt's own question list.
+        """
+        parts = []
+        stop = None if limit is None else offset + limit
+        for qid, order in islice(option_mapping.items(), offset, stop):
+            head, options = self.fragments[qid]
+            parts.append(
+                head + b",".join([options[idx] for idx in order]) + b"]}"
+            )
+        return b"[" + b",".join(parts) + b"]"
+
+    def _select(self, rng: random.Random) -> Sequence[int]:
+        """Question ids drawn for one attempt, in bank order.
+
+        Each topic contributes its pool count; inside a topic questions are
+        drawn without replacement with probability proportional to their
+        ``weight`` (Efraimidis-Spirakis keys).
+        """
+        by_topic: Dict[str, List[Tuple[int, float]]] = {}
+        for qid, q in self.questions.items():
+            by_topic.setdefault(str(q.get("topic")), []).append(
+                (qid, float(q.get("weight", 1)))
+            )
+        chosen = set()
+        for topic, items in by_topic.items():
+            keyed = [(rng.random() ** (1.0 / weight), qid) for qid, weight in items]
+            chosen.update(qid for _, qid in heapq.nlargest(self.pool[topic], keyed))
+        return [qid for qid in self.questions if qid in chosen]
+
+    def _mapping(
+        self, qids: Sequence[int], rng: random.Random
+    ) -> OptionMapping:
+        mapping = {}
+        for qid in qids:
+            order = list(range(len(self.questions[qid]["options"])))
+            shuffle(order, rng)
+            mapping[qid] = order
+        return mapping
+
+    def random_mapping(self) -> OptionMapping:
+        rng = random.Random()
+        qids = self._select(rng) if self.pool is not None else list(self.questions)
+        return self._mapping(qids, rng)
+
+    def _permutations(self, seed: int) -> OptionMapping:
+        # depends only on seed and question order, both fixed by the version;
+        # the pool draw has its own stream so unpooled banks shuffle exactly
+        # as before pools existed
+        if self.pool is None:
+            return self._mapping(list(self.questions), random.Random(seed))
+        qids = self._select(random.Random(f"pool:{seed}"))
+        return self._mapping(qids, random.Random(seed))
+
+
+def validate_bank(raw: Dict):
+    if not isinstance(raw, dict) or not isinstance(raw.get("questions"), list):
+        raise ValueError("Quiz JSON must be an object with a 'questions' list")
+    seen = set()
+    for pos, q in enumerate(raw["questions"]):
+        qid = q.get("id") if isinstance(q, dict) else None
+        if not isinstance(qid, int):
+            raise ValueError(f"Question #{pos}: integer 'id' is required")
+        if qid in seen:
+            raise ValueError(f"Question {qid}: duplicate id")
+        seen.add(qid)
+        if not isinstance(q.get("text"), str):
+            raise ValueError(f"Question {qid}: 'text' is required")
+        options = q.get("options")
+        if not isinstance(options, list) or not options:
+            raise ValueError(f"Question {qid}: 'options' must be a non-empty list")
+        if q.get("multiple"):
+            correct = q.get("correctIndexes")
+            if not isinstance(correct, list):
+                raise ValueError(f"Question {qid}: 'correctIndexes' list is required")
+        else:
+            correct = [q.get("correctIndex")]
+        for idx in correct:
+            if not isinstance(idx, int) or not 0 <= idx < len(options):
+                raise ValueError(f"Question {qid}: correct index {idx!r} out of range")
+        weight = q.get("weight", 1)
+        if not isinstance(weight, (int, float)) or weight <= 0:
+            raise ValueError(f"Question {qid}: 'weight' must be a positive number")
+
+    pool = raw.get("pool")
+    if pool is None:
+        return
+    if not isinstance(pool, dict):
+        raise ValueError("'pool' must be an object")
+    per_topic = pool.get("perTopic")
+    if per_topic is not None and (not isinstance(per_topic, int) or per_topic < 0):
+        raise ValueError("pool: 'perTopic' must be a non-negative integer")
+    topics = pool.get("topics", {})
+    if not isinstance(topics, dict) or not all(
+        isinstance(n, int) and n >= 0 for n in topics.values()
+    ):
+        raise ValueError("pool: 'topics' must map topic names to non-negative integers")
+
+
+def save_bank(conn: sqlite3.Connection, bank: QuestionBank, created_at: str):
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO question_banks (version, source, created_at)
+        VALUES (?, ?, ?)
+        """,
+        (bank.version, bank.source, created_at),
+    )
+
+
+class BankVersions:
+    """Question bank versions referenced by attempts, loaded from the DB on demand."""
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], default: QuestionBank):
+        self.connect = connect
+        # bank for legacy attempts that do not record a version
+        self.default = default
+        self._banks: Dict[str, QuestionBank] = {default.version: default}
+
+    def add(self, bank: QuestionBank):
+        self._banks[bank.version] = bank
+
+    def get(self, version: str) -> QuestionBank:
+        bank = self._banks.get(version)
+        if bank is None:
+            row = self.connect().execute(
+                "SELECT source FROM question_banks WHERE version = ?", (version,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(f"Unknown question bank version {version}")
+            bank = self._banks.setdefault(version, QuestionBank(row[0]))
+        return bank
+
+    def for_attempt(self, attempt: Mapping) -> QuestionBank:
+        version = attempt["bank_version"]
+        return self.get(version) if version else self.default
+
+    def option_mapping(self, attempt: Mapping) -> OptionMapping:
+        # legacy rows carry the full permutation dict
+        if attempt["option_mapping_json"]:
+            return {
+                int(qid): order
+                for qid, order in loads(attempt["option_mapping_json"]).items()
+            }
+        return self.get(attempt["bank_version"]).permutations(attempt["option_seed"])
+
+
+class BankManager:
+    """Current question bank of a quiz file, swapped atomically on reload.
+
+    Requests read ``current`` once and keep that bank for their whole
+    lifetime, so a reload never blocks or changes an in-flight request.
+    """
+
+    def __init__(self, path: Path, connect: Callable[[], sqlite3.Connection]):
+        self.path = path
+        self.connect = connect
+        self._lock = threading.Lock()
+        self._stamp = self._file_stamp()
+        self.current = QuestionBank.from_file(path)
+        self.versions = BankVersions(connect, self.current)
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def persist(self):
+        save_bank(self.connect(), self.current, datetime.now(timezone.utc).isoformat())
+
+    def reload(self) -> bool:
+        """Parse and validate the file again; returns True if the bank changed.
+
+        Raises ValueError and keeps the current bank when the file is invalid,
+        OSError when it cannot be read (mid-save, briefly deleted); the stamp
+        is kept then, so ``check`` tries again on the next tick.
+        """
+        with self._lock:
+            stamp = self._file_stamp()
+            try:
+                bank = QuestionBank.from_file(self.path)
+            except ValueError:
+                # read but invalid: wait for the next edit
+                self._stamp = stamp
+                raise
+            self._stamp = stamp
+            if bank.version == self.current.version:
+                return False
+            save_bank(self.connect(), bank, datetime.now(timezone.utc).isoformat())
+            self.versions.add(bank)
+            self.current = bank
+            return True
+
+    def check(self) -> bool:
+        """Reload if the file's mtime or size changed since the last load."""
+        if self._file_stamp() == self._stamp:
+            return False
+        return self.reload()
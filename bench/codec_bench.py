@@ -0,0 +1,96 @@
+"""Per-submit cost of parsing a request body and grading it.
+
+Compares the model path (stdlib json + SubmitAttemptRequest model, the
+fallback for lax input) with the codec fast path; both then grade the
+answer map against the key, as submit does before writing attempt_answers.
+
+    uv run python bench/codec_bench.py --questions 60 --rounds 2000
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from pydantic import BaseModel
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import codec  # noqa: E402
+from grading import AnswerKey  # noqa: E402
+
+
+class AnswerPayload(BaseModel):
+    questionId: int
+    selectedIndexes: List[int]
+
+
+class SubmitAttemptRequest(BaseModel):
+    answers: List[AnswerPayload]
+    userId: int
+
+
+def model_path(body: bytes, key: AnswerKey, mapping: Dict[str, List[int]]):
+    payload = SubmitAttemptRequest.model_validate(json.loads(body))
+    answer_map = {a.questionId: a.selectedIndexes for a in payload.answers}
+    return key.grade_answers(mapping, answer_map)
+
+
+def codec_path(body: bytes, key: AnswerKey, mapping: Dict[str, List[int]]):
+    _, answer_map = codec.parse_submission(codec.loads(body))
+    return key.grade_answers(mapping, answer_map)
+
+
+def measure(fn, body: bytes, key, mapping, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(body, key, mapping)
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=60)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    body = json.dumps(
+        {
+            "userId": 1,
+            "answers": [
+                {"questionId": qid, "selectedIndexes": [qid % 4]}
+                for qid in range(1, args.questions + 1)
+            ],
+        }
+    ).encode()
+    key = AnswerKey(
+        {
+            qid: {"options": ["a", "b", "c", "d"], "correctIndex": 0}
+            for qid in range(1, args.questions + 1)
+        }
+    )
+    mapping = {str(qid): [3, 2, 1, 0] for qid in range(1, args.questions + 1)}
+    assert model_path(body, key, mapping) == codec_path(body, key, mapping)
+
+    before = measure(model_path, body, key, mapping, args.rounds)
+    after = measure(codec_path, body, key, mapping, args.rounds)
+    print(
+        json.dumps(
+            {
+                "backend": codec.BACKEND,
+                "questions": args.questions,
+                "model_us": round(before, 1),
+                "codec_us": round(after, 1),
+                "saved_us": round(before - after, 1),
+                "speedup": round(before / after, 2),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""Load test: a whole exam cohort against a locally launched uvicorn.
+
+Seeds users straight into a fresh DB, starts the app (and a fake GitHub)
+and runs three phases:
+
+- flow:   every user does start -> submit, ``--concurrency`` at a time
+- storm:  every user holds an open attempt, then all submit at once
+          (the last seconds before the deadline)
+- oauth:  a burst of logins (login -> callback) against the fake GitHub
+
+Prints one JSON document with throughput and p50/p95/p99 latency per
+route, so runs can be diffed between commits. Admission is configured from
+the flags, not the caller's environment, and 429s are reported as
+``rejected``, apart from real errors:
+
+    uv run python bench/load.py --users 300 -o bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+for path in (ROOT, ROOT / "tests"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from db import connect  # noqa: E402
+from fake_github import serve  # noqa: E402
+from schema import migrate  # noqa: E402
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        # 429 from admission control: load shed on purpose, not a failure
+        self.rejected: Dict[str, int] = defaultdict(int)
+
+    async def call(
+        self, route: str, request, expected: Tuple[int, ...] = (200,)
+    ) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            res = await request
+        except httpx.HTTPError:
+            res = None
+        self.samples[route].append(time.perf_counter() - started)
+        if res is not None and res.status_code == 429:
+            self.rejected[route] += 1
+            return None
+        if res is None or res.status_code not in expected:
+            self.errors[route] += 1
+            return None
+        return res
+
+    def report(self, seconds: float) -> Dict:
+        routes = {}
+        total = 0
+        for route, samples in sorted(self.samples.items()):
+            ms = np.array(samples) * 1000
+            total += ms.size
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            routes[route] = {
+                "count": int(ms.size),
+                "errors": self.errors[route],
+                "rejected": self.rejected[route],
+                "rps": round(ms.size / seconds, 1),
+                "mean_ms": round(float(ms.mean()), 2),
+                "p50_ms": round(float(p50), 2),
+                "p95_ms": round(float(p95), 2),
+                "p99_ms": round(float(p99), 2),
+                "max_ms": round(float(ms.max()), 2),
+            }
+        return {
+            "seconds": round(seconds, 3),
+            "requests": total,
+            "errors": sum(self.errors.values()),
+            "rejected": sum(self.rejected.values()),
+            "rps": round(total / seconds, 1),
+            "routes": routes,
+        }
+
+
+def make_quiz(path: Path, n_questions: int):
+    rng = random.Random(0)
+    questions = []
+    for qid in range(1, n_questions + 1):
+        q = {
+            "id": qid,
+            "topic": f"Topic {qid % 5}",
+            "text": f"Question {qid}?",
+            "options": [f"Option {qid}.{i}" for i in range(4)],
+        }
+        if qid % 4 == 0:
+            q["multiple"] = True
+            q["correctIndexes"] = sorted(rng.sample(range(4), 2))
+        else:
+            q["correctIndex"] = rng.randrange(4)
+        questions.append(q)
+    path.write_text(json.dumps({"name": "Bench", "questions": questions}))
+
+
+def seed_users(db_path: Path, n_users: int) -> List[int]:
+    conn = connect(db_path)
+    migrate(conn)
+    now = datetime.now(timezone.utc).isoformat()
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO users (github_username, created_at) VALUES (?, ?)",
+        [(f"student{i}", now) for i in range(n_users)],
+    )
+    conn.execute("COMMIT")
+    ids = [row[0] for row in conn.execute("SELECT id FROM users ORDER BY id")]
+    conn.close()
+    return ids
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def launch(port: int, workers: int, env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1",
+            "--port", str(port),
+            "--workers", str(workers),
+            "--log-level", "warning",
+            "--no-access-log",
+        ],
+        cwd=ROOT,
+        env=env,
+    )
+
+
+def wait_ready(base_url: str, proc: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {proc.returncode}")
+        try:
+            if httpx.get(f"{base_url}/api/config", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("uvicorn did not start in time")
+
+
+def random_answers(questions: List[Dict], rng: random.Random) -> List[Dict]:
+    return [
+        {
+            "questionId": q["id"],
+            "selectedIndexes": [rng.randrange(len(q["options"]))],
+        }
+        for q in questions
+    ]
+
+
+async def start(client: httpx.AsyncClient, rec: Recorder, user_id: int):
+    res = await rec.call(
+        "POST /api/attempts/start",
+        client.post("/api/attempts/start", json={"userId": user_id}),
+    )
+    return res.json() if res is not None else None
+
+
+async def submit(
+    client: httpx.AsyncClient, rec: Recorder, user_id: int, attempt: Dict, rng
+):
+    await rec.call(
+        "POST /api/attempts/{id}/submit",
+        client.post(
+            f"/api/attempts/{attempt['attemptId']}/submit",
+            json={"userId": user_id, "answers": random_answers(attempt["questions"], rng)},
+        ),
+    )
+
+
+async def phase_flow(client, user_ids: List[int], concurrency: int) -> Dict:
+    rec = Recorder()
+    gate = asyncio.Semaphore(concurrency)
+    rng = random.Random(1)
+
+    async def one(user_id: int):
+        async with gate:
+            attempt = await start(client, rec, user_id)
+            if attempt is not None:
+                await submit(client, rec, user_id, attempt, rng)
+
+    began = time.perf_counter()
+    await asyncio.gather(*(one(uid) for uid in user_ids))
+    return rec.report(time.perf_counter() - began)
+
+
+async def phase_storm(client, user_ids: List[int], concurrency: int) -> Dict:
+    opened = Recorder()
+    gate = asyncio.Semaphore(concurrency)
+
+    async def open_attempt(user_id: int):
+        async with gate:
+            return user_id, await start(client, opened, user_id)
+
+    attempts = await asyncio.gather(*(open_attempt(uid) for uid in user_ids))
+
+    # every submit is fired at once, no client-side throttling
+    rec = Recorder()
+    rng = random.Random(2)
+    began = time.perf_counter()
+    await asyncio.gather(
+        *(
+            submit(client, rec, uid, attempt, rng)
+            for uid, attempt in attempts
+            if attempt is not None
+        )
+    )
+    return rec.report(time.perf_counter() - began)
+
+
+async def phase_oauth(client, n_logins: int, concurrency: int) -> Dict:
+    rec = Recorder()
+    gate = asyncio.Semaphore(concurrency)
+
+    async def login(i: int):
+        async with gate:
+            res = await rec.call(
+                "GET /api/auth/github/login", client.get("/api/auth/github/login")
+            )
+            if res is None:
+                return
+            state = res.json()["url"].split("state=")[1]
+            await rec.call(
+                "GET /api/auth/github/callback",
+                client.get(
+                    "/api/auth/github/callback",
+                    params={"code": f"login{i}", "state": state},
+                ),
+            )
+
+    began = time.perf_counter()
+    await asyncio.gather(*(login(i) for i in range(n_logins)))
+    return rec.report(time.perf_counter() - began)
+
+
+async def drive(base_url: str, user_ids: List[int], args) -> Dict:
+    limits = httpx.Limits(max_connections=args.users + args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=args.timeout
+    ) as client:
+        phases = {}
+        if "flow" in args.phases:
+            phases["flow"] = await phase_flow(client, user_ids, args.concurrency)
+        if "storm" in args.phases:
+            phases["storm"] = await phase_storm(client, user_ids, args.concurrency)
+        if "oauth" in args.phases:
+            phases["oauth"] = await phase_oauth(client, args.logins, args.concurrency)
+        return phases
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exam cohort load test")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--quiz", type=Path, help="Quiz JSON instead of a generated one")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--github-delay-ms", type=float, default=30)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument(
+        "--admission-concurrency",
+        type=int,
+        default=16,
+        help="QUIZ_ADMISSION_CONCURRENCY of the server (0 = no gate)",
+    )
+    parser.add_argument(
+        "--user-burst", type=int, default=5, help="QUIZ_USER_BURST (0 = no bucket)"
+    )
+    parser.add_argument(
+        "--login-burst", type=int, default=0, help="QUIZ_LOGIN_BURST (0 = no bucket)"
+    )
+    parser.add_argument(
+        "--phases", default="flow,storm,oauth", type=lambda s: s.split(",")
+    )
+    parser.add_argument("-o", "--out", type=Path, help="Also write the JSON here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="quiz-bench-") as tmp, serve(
+        args.github_delay_ms
+    ) as github:
+        quiz_path = Path(tmp) / "bench.json"
+        if args.quiz:
+            quiz_path.write_bytes(args.quiz.read_bytes())
+        else:
+            make_quiz(quiz_path, args.questions)
+        user_ids = seed_users(quiz_path.with_suffix(".db"), args.users)
+
+        port = free_port()
+        env = {
+            **os.environ,
+            "QUIZ_FILE": str(quiz_path),
+            # flow + storm start two attempts per user
+            "QUIZ_ATTEMPT_LIMIT": "1000",
+            "QUIZ_BANK_POLL_SECONDS": "0",
+            # pinned, so a local .env does not change what is measured
+            "QUIZ_ADMISSION_CONCURRENCY": str(args.admission_concurrency),
+            "QUIZ_USER_BURST": str(args.user_burst),
+            "QUIZ_LOGIN_BURST": str(args.login_burst),
+            "GITHUB_CLIENT_ID": "bench",
+            "GITHUB_CLIENT_SECRET": "bench",
+            "GITHUB_OAUTH_URL": github.url,
+            "GITHUB_API_URL": github.url,
+            "GITHUB_REDIRECT_URL": f"http://127.0.0.1:{port}/api/auth/github/callback",
+        }
+        proc = launch(port, args.workers, env)
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            wait_ready(base_url, proc)
+            phases = asyncio.run(drive(base_url, user_ids, args))
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+        github_connections = github.connections
+
+    result = {
+        "revision": git_revision(),
+        "config": {
+            "users": args.users,
+            "questions": args.questions if not args.quiz else str(args.quiz),
+            "concurrency": args.concurrency,
+            "logins": args.logins,
+            "workers": args.workers,
+            "githubDelayMs": args.github_delay_ms,
+            "admissionConcurrency": args.admission_concurrency,
+            "userBurst": args.user_burst,
+            "loginBurst": args.login_burst,
+        },
+        "githubConnections": github_connections,
+        "phases": phases,
+    }
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.out:
+        args.out.write_text(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import json
+from typing import Any, Dict, List, Tuple
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+# questionId -> selectedIndexes
+AnswerMap = Dict[int, List[int]]
+
+
+if orjson is not None:
+
+    def loads(data) -> Any:
+        return orjson.loads(data)
+
+    def dumps(value: Any) -> bytes:
+        # int question ids are used as keys of option mappings
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+else:
+
+    def loads(data) -> Any:
+        return json.loads(data)
+
+    def dumps(value: Any) -> bytes:
+        return json.dumps(
+            value, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+
+
+def dumps_text(value: Any) -> str:
+    """JSON as str, for TEXT columns."""
+    return dumps(value).decode("utf-8")
+
+
+def _is_int(value: Any) -> bool:
+    return type(value) is int
+
+
+def _body(data: Any) -> Tuple[int, List[Any]]:
+    if type(data) is not dict:
+        raise ValueError("body must be an object")
+    user_id = data.get("userId")
+    raw_answers = data.get("answers")
+    if not _is_int(user_id) or type(raw_answers) is not list:
+        raise ValueError("userId and answers are required")
+    return user_id, raw_answers
+
+
+def _answer(item: Any) -> Tuple[int, List[int]]:
+    if type(item) is not dict:
+        raise ValueError("answer must be an object")
+    qid = item.get("questionId")
+    selected = item.get("selectedIndexes")
+    if not _is_int(qid) or type(selected) is not list:
+        raise ValueError("questionId and selectedIndexes are required")
+    for idx in selected:
+        if not _is_int(idx) or idx < 0:
+            raise ValueError("selectedIndexes must be non-negative integers")
+    return qid, selected
+
+
+def parse_submission(data: Any) -> Tuple[int, AnswerMap]:
+    """Validate a decoded submit body without building a model per answer.
+
+    Returns ``(userId, answer_map)``. Raises ValueError when the body does
+    not have exactly the expected shape; callers fall back to the Pydantic
+    model then, which coerces lax input or reports precise errors.
+    """
+    user_id, raw_answers = _body(data)
+    answer_map: AnswerMap = {}
+    for item in raw_answers:
+        qid, selected = _answer(item)
+        answer_map[qid] = selected
+    return user_id, answer_map
+
+
+def parse_progress(data: Any) -> Tuple[int, List[Dict[str, Any]], int]:
+    """Validate a decoded autosave body, like ``parse_submission``.
+
+    Returns ``(userId, answers, currentIndex)``; ``answers`` keeps only
+    ``questionId``/``selectedIndexes``, the form stored and served back.
+    """
+    user_id, raw_answers = _body(data)
+    current_index = data.get("currentIndex", 0)
+    if not _is_int(current_index):
+        raise ValueError("currentIndex must be an integer")
+    answers = []
+    for item in raw_answers:
+        qid, selected = _answer(item)
+        answers.append({"questionId": qid, "selectedIndexes": selected})
+    return user_id, answers, current_index
@@ -0,0 +1,73 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Type
+
+
+def connect(
+    path: Path,
+    busy_timeout_ms: int = 5000,
+    cache_size_kib: int = 16384,
+    synchronous: str = "NORMAL",
+    factory: Type[sqlite3.Connection] = sqlite3.Connection,
+) -> sqlite3.Connection:
+    # autocommit mode: writes are grouped explicitly with transaction()
+    conn = sqlite3.connect(
+        path,
+        timeout=busy_timeout_ms / 1000,
+        isolation_level=None,
+        check_same_thread=False,
+        factory=factory,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+    conn.execute(f"PRAGMA cache_size=-{int(cache_size_kib)}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+@contextmanager
+def transaction(
+    conn: sqlite3.Connection, mode: str = "DEFERRED"
+) -> Iterator[sqlite3.Connection]:
+    conn.execute(f"BEGIN {mode}")
+    try:
+        yield conn
+        # a failed COMMIT (busy, I/O, deferred constraint) leaves the
+        # transaction open on a pooled connection: roll it back too
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+
+
+class ConnectionPool:
+    """Long-lived SQLite connections, one per worker thread."""
+
+    def __init__(self, path: Path, **options):
+        self.path = Path(path)
+        self.options = options
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path, **self.options)
+            with self._lock:
+                self._connections.append(conn)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+            # drop references held by worker threads so they reconnect lazily
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
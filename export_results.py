@@ -1,13 +1,24 @@
 import argparse
+import hashlib
 import json
 import os
+import pickle
 import sqlite3
+from datetime import datetime, timedelta
+from itertools import groupby
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from dotenv import load_dotenv
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, NamedStyle, PatternFill
+from openpyxl.worksheet.hyperlink import Hyperlink
+
+import codec
+from analytics import ResponseMatrix, item_analysis, mask_indexes
+from bank import BankVersions, QuestionBank
+from schema import database_id, migrate
 
 BASE_DIR = Path(__file__).resolve().parent
 load_dotenv()
@@ -15,6 +26,13 @@ load_dotenv()
 default_quiz = os.getenv("QUIZ_FILE", "test.json")
 DEFAULT_JSON = (BASE_DIR / default_quiz).resolve()
 DEFAULT_DB = DEFAULT_JSON.with_suffix(".db")
+CORRECT_STYLE = "answer_correct"
+INCORRECT_STYLE = "answer_incorrect"
+# finished_at is stamped before the row commits: a submit that waited on the
+# writer can land below a watermark already taken, so each run re-reads this
+# far back (the merge by id makes that harmless)
+REREAD_WINDOW = timedelta(minutes=5)
+SNAPSHOT_VERSION = 4
 
 
 def load_questions(path: Path) -> Tuple[List[Dict], Dict[int, int]]:
@@ -27,53 +45,163 @@ def load_questions(path: Path) -> Tuple[List[Dict], Dict[int, int]]:
     return questions, row_map
 
 
-def load_attempts(db_path: Path) -> List[sqlite3.Row]:
+def iter_attempts(
+    db_path: Path, finished_since: Optional[str] = None
+) -> Iterator[sqlite3.Row]:
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
-    cur = conn.execute(
-        """
-        SELECT attempts.*, users.github_username AS username
-        FROM attempts
-        JOIN users ON users.id = attempts.user_id
-        ORDER BY attempt_number ASC, started_at ASC
-        """
-    )
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+    where, params = "", ()
+    if finished_since is not None:
+        where, params = "WHERE attempts.finished_at >= ?", (finished_since,)
+    try:
+        # rows are pulled from the cursor one by one, never fetched as a whole
+        yield from conn.execute(
+            f"""
+            SELECT attempts.*, users.github_username AS username,
+                   (
+                       SELECT json_group_array(
+                           json_array(question_id, selected_mask, is_correct)
+                       )
+                       FROM attempt_answers WHERE attempt_id = attempts.id
+                   ) AS answer_rows
+            FROM attempts
+            JOIN users ON users.id = attempts.user_id
+            {where}
+            ORDER BY attempt_number ASC, started_at ASC
+            """,
+            params,
+        )
+    finally:
+        conn.close()
 
 
 def decode_answers(
     attempt: sqlite3.Row, questions: Dict[int, Dict]
-) -> Dict[int, Dict[str, List]]:
-    mapping = json.loads(attempt["option_mapping_json"])
-    answers_json = attempt["answers_json"]
-    if not answers_json:
-        return {}
-    answers = {
-        int(item["questionId"]): item["selectedIndexes"]
-        for item in json.loads(answers_json)
-    }
-
+) -> Tuple[List[int], Dict[int, Dict]]:
+    """Presented question ids and the answered ones, from ``attempt_answers``."""
+    presented = []
     decoded = {}
-    for qid, selected in answers.items():
+    for qid, mask, correct in codec.loads(attempt["answer_rows"] or "[]"):
+        presented.append(qid)
         q = questions.get(qid)
-        if not q:
+        if not q or not mask:
+            continue
+        indexes = mask_indexes(mask)
+        texts = [q["options"][i] for i in indexes if i < len(q["options"])]
+        decoded[qid] = {"indexes": indexes, "texts": texts, "correct": bool(correct)}
+    return presented, decoded
+
+
+def attempt_record(attempt: sqlite3.Row, banks: BankVersions) -> Dict:
+    # option texts come from the bank version the attempt used
+    questions = banks.for_attempt(attempt).questions
+    presented, answers = decode_answers(attempt, questions)
+    return {
+        "id": attempt["id"],
+        "attempt_number": attempt["attempt_number"],
+        "started_at": attempt["started_at"],
+        "finished_at": attempt["finished_at"],
+        "username": attempt["username"],
+        "score": attempt["score"],
+        "total": attempt["total_questions"],
+        "presented": presented,
+        "answers": answers,
+    }
+
+
+def questions_digest(json_path: Path) -> str:
+    return hashlib.sha256(json_path.read_bytes()).hexdigest()
+
+
+def empty_snapshot(digest: str, database: str) -> Dict:
+    return {
+        "version": SNAPSHOT_VERSION,
+        "questions": digest,
+        "database": database,
+        "watermark": None,
+        "attempts": {},
+    }
+
+
+def load_snapshot(path: Path, digest: str, database: str) -> Dict:
+    empty = empty_snapshot(digest, database)
+    if not path.exists():
+        return empty
+    try:
+        with path.open("rb") as f:
+            snapshot = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return empty
+    # a changed question file invalidates every decoded answer, a recreated
+    # DB (just rmdb) every cached attempt
+    if (
+        snapshot.get("version") != SNAPSHOT_VERSION
+        or snapshot.get("questions") != digest
+        or snapshot.get("database") != database
+    ):
+        return empty
+    return snapshot
+
+
+def cached_attempts_present(conn: sqlite3.Connection, snapshot: Dict) -> bool:
+    """Whether the DB still has every cached attempt (restored from a backup, say)."""
+    cached = snapshot["attempts"]
+    if not cached:
+        return True
+    present = conn.execute(
+        "SELECT COUNT(*) FROM attempts WHERE id BETWEEN ? AND ? AND finished_at IS NOT NULL",
+        (min(cached), max(cached)),
+    ).fetchone()[0]
+    return present >= len(cached)
+
+
+def save_snapshot(path: Path, snapshot: Dict):
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def update_snapshot(db_path: Path, snapshot: Dict, banks: BankVersions) -> int:
+    """Decode attempts finished since the watermark into the snapshot."""
+    added = 0
+    watermark = snapshot["watermark"]
+    since = ""
+    if watermark is not None:
+        since = (datetime.fromisoformat(watermark) - REREAD_WINDOW).isoformat()
+    for row in iter_attempts(db_path, finished_since=since):
+        if not row["total_questions"]:
             continue
-        presented_order = mapping.get(str(qid)) or mapping.get(qid)
-        original_idxs = []
-        if presented_order:
-            for idx in selected:
-                if idx < len(presented_order):
-                    original_idxs.append(presented_order[idx])
-        texts = [q["options"][i] for i in original_idxs if i < len(q["options"])]
-        decoded[qid] = {"indexes": original_idxs, "texts": texts}
-    return decoded
+        added += row["id"] not in snapshot["attempts"]
+        snapshot["attempts"][row["id"]] = attempt_record(row, banks)
+        if watermark is None or row["finished_at"] > watermark:
+            watermark = row["finished_at"]
+    snapshot["watermark"] = watermark
+    return added
+
+
+def register_styles(wb: Workbook):
+    # shared named styles: each answer cell references one instead of
+    # carrying its own fill/font objects
+    white_font = Font(color="FFFFFF")
+    wb.add_named_style(
+        NamedStyle(
+            name=CORRECT_STYLE,
+            fill=PatternFill("solid", fgColor="2E7D32"),
+            font=white_font,
+        )
+    )
+    wb.add_named_style(
+        NamedStyle(
+            name=INCORRECT_STYLE,
+            fill=PatternFill("solid", fgColor="C62828"),
+            font=white_font,
+        )
+    )
 
 
 def build_questions_sheet(wb: Workbook, questions: List[Dict], row_map: Dict[int, int]):
-    ws = wb.active
-    ws.title = "questions"
+    ws = wb.create_sheet(title="questions")
     ws.append(
         [
             "number",
@@ -102,82 +230,173 @@ def build_questions_sheet(wb: Workbook, questions: List[Dict], row_map: Dict[int
 def build_attempt_sheet(
     wb: Workbook,
     sheet_name: str,
-    attempts: List[sqlite3.Row],
+    attempts: Iterable[Dict],
     questions: List[Dict],
     row_map: Dict[int, int],
 ):
     ws = wb.create_sheet(title=sheet_name)
     question_ids = [q["id"] for q in questions]
-    header_labels = [f"{q['id']}. {q['text']}" for q in questions]
-    header = ["github", "positive", "negative", "percent"] + header_labels
+    # answer cells link to the question's correct answer
+    answer_rows = {qid: f"questions!E{row}" for qid, row in row_map.items()}
+    header = ["github", "positive", "negative", "percent"]
+    # headers link to the questions sheet
+    for q in questions:
+        cell = WriteOnlyCell(ws, value=f"{q['id']}. {q['text']}")
+        cell.hyperlink = f"#questions!A{row_map[q['id']]}"
+        cell.style = "Hyperlink"
+        header.append(cell)
     ws.append(header)
 
-    qid_to_row = {qid: row_map[qid] for qid in question_ids}
-    # add hyperlinks from headers to questions sheet
-    for col_idx, qid in enumerate(question_ids, start=5):
-        ws.cell(row=1, column=col_idx).hyperlink = f"#questions!A{qid_to_row[qid]}"
-        ws.cell(row=1, column=col_idx).style = "Hyperlink"
-
-    questions_map = {q["id"]: q for q in questions}
-    green_fill = PatternFill("solid", fgColor="2E7D32")
-    red_fill = PatternFill("solid", fgColor="C62828")
-    white_font = Font(color="FFFFFF")
-
-    def is_correct(selected_idxs: List[int], q: Dict) -> bool:
-        if q.get("multiple"):
-            return set(selected_idxs) == set(q.get("correctIndexes", []))
-        return len(selected_idxs) == 1 and selected_idxs[0] == q.get("correctIndex")
-
     for attempt in attempts:
-        if attempt["total_questions"] in (None, 0):
+        if attempt["total"] in (None, 0):
             continue
-        decoded = decode_answers(attempt, questions_map)
-        total = attempt["total_questions"]
+        decoded = attempt["answers"]
+        total = attempt["total"]
         score = attempt["score"] or 0
-        positive = score
-        negative = total - score
         percent = round((score / total) * 100, 2) if total else 0.0
-        row = [attempt["username"], positive, negative, percent]
+        row = [attempt["username"], score, total - score, percent]
+        presented = set(attempt["presented"])
+        # answers: correct green, incorrect red; questions outside the
+        # attempt's pool stay blank, skipped ones are marked wrong
         for qid in question_ids:
             ans = decoded.get(qid)
-            if ans:
-                row.append(", ".join(ans["texts"]))
-            else:
-                row.append("")
-        ws.append(row)
-
-        # style answers: correct green, incorrect red, and link to correct answer cell
-        current_row = ws.max_row
-        for idx, qid in enumerate(question_ids, start=5):
-            q = questions_map[qid]
-            ans = decoded.get(qid)
-            cell = ws.cell(row=current_row, column=idx)
-            cell.hyperlink = f"#questions!E{qid_to_row[qid]}"
             if not ans:
+                if qid in presented:
+                    cell = WriteOnlyCell(ws, value="—")
+                    cell.style = INCORRECT_STYLE
+                    cell.hyperlink = Hyperlink(ref="", location=answer_rows[qid])
+                    row.append(cell)
+                else:
+                    row.append(None)
                 continue
-            if is_correct(ans["indexes"], q):
-                cell.fill = green_fill
-                cell.font = white_font
+            cell = WriteOnlyCell(ws, value=", ".join(ans["texts"]))
+            cell.hyperlink = Hyperlink(ref="", location=answer_rows[qid])
+            if ans["correct"]:
+                cell.style = CORRECT_STYLE
             else:
-                cell.fill = red_fill
-                cell.font = white_font
+                cell.style = INCORRECT_STYLE
+            row.append(cell)
+        ws.append(row)
+    return ws
+
+
+def build_analytics_sheet(wb: Workbook, matrix: ResponseMatrix):
+    ws = wb.create_sheet(title="analytics")
+    report = item_analysis(matrix)
+
+    max_options = matrix.n_options
+    ws.append(
+        ["number", "topic", "presented", "difficulty", "discrimination"]
+        + [f"option_{i}" for i in range(max_options)]
+        + ["correct_numbers"]
+    )
+    for item in report["items"]:
+        rates = item["optionRates"] + [None] * (max_options - len(item["optionRates"]))
+        ws.append(
+            [
+                item["id"],
+                item["topic"],
+                item["presented"],
+                item["difficulty"],
+                item["discrimination"],
+            ]
+            + rates
+            + [", ".join(str(i) for i in item["correctOptions"])]
+        )
 
+    ws.append([])
+    ws.append(["topic", "attempts", "mean"])
+    for topic in report["topics"]:
+        ws.append([topic["topic"], topic["attempts"], topic["mean"]])
+
+    scores = report["scores"]
+    ws.append([])
+    ws.append(["percent_from", "percent_to", "attempts"])
+    edges = scores["histogram"]["edges"]
+    for lo, hi, count in zip(edges, edges[1:], scores["histogram"]["counts"]):
+        ws.append([lo, hi, count])
+    ws.append(["mean", scores["mean"]])
+    ws.append(["median", scores["median"]])
+    ws.append(["std", scores["std"]])
+    return ws
 
-def export(db_path: Path, json_path: Path, out_path: Path):
+
+def render(
+    records: Iterable[Dict],
+    questions: List[Dict],
+    row_map: Dict[int, int],
+    out_path: Path,
+):
+    wb = Workbook(write_only=True)
+    register_styles(wb)
+    build_questions_sheet(wb, questions, row_map)
+
+    # analytics are accumulated from the same records that are streamed
+    # into the per-attempt sheets
+    matrix = ResponseMatrix(questions)
+
+    def collect(records: Iterable[Dict]) -> Iterator[Dict]:
+        for record in records:
+            if record["finished_at"] and record["total"]:
+                matrix.add_decoded(
+                    record["score"],
+                    record["total"],
+                    record["presented"],
+                    {qid: ans["indexes"] for qid, ans in record["answers"].items()},
+                )
+            yield record
+
+    for attempt_number, rows in groupby(
+        collect(records), key=lambda r: r["attempt_number"]
+    ):
+        build_attempt_sheet(wb, f"attempt{attempt_number}", rows, questions, row_map)
+    build_analytics_sheet(wb, matrix)
+
+    wb.save(out_path)
+
+
+def export(
+    db_path: Path,
+    json_path: Path,
+    out_path: Path,
+    incremental: bool = False,
+    cache_path: Optional[Path] = None,
+):
     if db_path is None:
         db_path = json_path.with_suffix(".db")
     questions, row_map = load_questions(json_path)
-    attempts = load_attempts(db_path)
-    wb = Workbook()
-    build_questions_sheet(wb, questions, row_map)
+    # option texts come from the bank version each attempt was started
+    # against, read from the quiz DB when it is not this file
+    banks_conn = sqlite3.connect(db_path)
+    # a DB the server has not opened since the upgrade still has the blobs
+    migrate(banks_conn)
+    banks = BankVersions(lambda: banks_conn, QuestionBank.from_file(json_path))
 
-    for attempt_number in sorted({row["attempt_number"] for row in attempts}):
-        filtered = [row for row in attempts if row["attempt_number"] == attempt_number]
-        build_attempt_sheet(
-            wb, f"attempt{attempt_number}", filtered, questions, row_map
+    if incremental:
+        if cache_path is None:
+            cache_path = db_path.with_name(db_path.name + ".export.pickle")
+        digest = questions_digest(json_path)
+        database = database_id(banks_conn)
+        snapshot = load_snapshot(cache_path, digest, database)
+        if not cached_attempts_present(banks_conn, snapshot):
+            print("Snapshot has attempts the database lacks, decoding all")
+            snapshot = empty_snapshot(digest, database)
+        added = update_snapshot(db_path, snapshot, banks)
+        save_snapshot(cache_path, snapshot)
+        print(f"Decoded {added} new attempts ({len(snapshot['attempts'])} cached)")
+        records = sorted(
+            snapshot["attempts"].values(),
+            key=lambda r: (r["attempt_number"], r["started_at"]),
+        )
+    else:
+        records = (
+            attempt_record(row, banks) for row in iter_attempts(db_path)
         )
 
-    wb.save(out_path)
+    try:
+        render(records, questions, row_map, out_path)
+    finally:
+        banks_conn.close()
     print(f"Saved report to {out_path}")
 
 
@@ -198,9 +417,20 @@ def main():
         default=BASE_DIR / "quiz_results.xlsx",
         help="Output XLSX path",
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Decode only attempts finished since the last run",
+    )
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        default=None,
+        help="Snapshot path for --incremental (defaults to <db>.export.pickle)",
+    )
     args = parser.parse_args()
 
-    export(args.db, args.json, args.out)
+    export(args.db, args.json, args.out, args.incremental, args.cache)
 
 
 if __name__ == "__main__":
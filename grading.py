@@ -0,0 +1,122 @@
+from array import array
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+# questionId -> selected indexes in presented (shuffled) order
+AnswerMap = Mapping[int, Sequence[int]]
+GradeResult = Tuple[int, int, List[Dict]]
+# question id, selected original options as a bitmask, correct
+AnswerRow = Tuple[int, int, bool]
+
+
+class AnswerKey:
+    """Question bank compiled for grading.
+
+    Questions are addressed by slot (their position in the bank) and the
+    correct options of each slot are stored as an integer bitmask, so a
+    submission is graded by OR-ing the selected options into a mask and
+    comparing it with the key.
+    """
+
+    def __init__(self, questions: Mapping[int, Dict]):
+        self.total = len(questions)
+        self.ids = array("q", questions.keys())
+        self.slots = {qid: slot for slot, qid in enumerate(questions)}
+        self.correct_masks: List[int] = []
+        self.multiple = bytearray(self.total)
+        self.correct_texts: List[List[str]] = []
+        self.questions = list(questions.values())
+
+        for slot, q in enumerate(self.questions):
+            if q.get("multiple"):
+                self.multiple[slot] = 1
+                correct = q.get("correctIndexes", [])
+                mask = 0
+                for idx in correct:
+                    mask |= 1 << idx
+            else:
+                correct = [q.get("correctIndex")]
+                # a single-choice question without a key never scores
+                mask = 1 << correct[0] if correct[0] is not None else -1
+            self.correct_masks.append(mask)
+            self.correct_texts.append(
+                [q["options"][i] for i in correct] if mask != -1 else []
+            )
+
+    def mapping_table(
+        self, option_mapping: Mapping
+    ) -> List[Optional[Sequence[int]]]:
+        # JSON turns question ids into strings; normalise once per attempt
+        table: List[Optional[Sequence[int]]] = [None] * self.total
+        slots = self.slots
+        for key, order in option_mapping.items():
+            slot = slots.get(int(key))
+            if slot is not None and order:
+                table[slot] = order
+        return table
+
+    def grade_answers(
+        self, option_mapping: Mapping, answer_map: AnswerMap
+    ) -> List[AnswerRow]:
+        """One ``(question id, selected mask, correct)`` row per presented question.
+
+        The mask holds original (unshuffled) option indexes, the form stored
+        in ``attempt_answers``.
+        """
+        table = self.mapping_table(option_mapping)
+        ids = self.ids
+        masks = self.correct_masks
+        multiple = self.multiple
+        rows = []
+
+        # questions outside the attempt's mapping (pooled banks) are not graded
+        for slot, order in enumerate(table):
+            if order is None:
+                continue
+            selected = answer_map.get(ids[slot])
+            mask = 0
+            picked = 0
+            if selected:
+                n = len(order)
+                for idx in selected:
+                    # negative indexes would wrap around to the last options
+                    if 0 <= idx < n:
+                        mask |= 1 << order[idx]
+                        picked += 1
+            correct = mask == masks[slot] and (multiple[slot] or picked == 1)
+            rows.append((ids[slot], mask, correct))
+        return rows
+
+    def incorrect_details(self, rows: Iterable[AnswerRow]) -> List[Dict]:
+        """Review cards for the wrong rows, rebuilt from the bank's texts."""
+        details = []
+        for qid, mask, correct in rows:
+            if correct:
+                continue
+            slot = self.slots.get(qid)
+            if slot is None:
+                continue
+            q = self.questions[slot]
+            options = q["options"]
+            details.append(
+                {
+                    "id": qid,
+                    "text": q["text"],
+                    "topic": q.get("topic"),
+                    "correct": list(self.correct_texts[slot]),
+                    "selected": [
+                        text for i, text in enumerate(options) if mask >> i & 1
+                    ],
+                }
+            )
+        return details
+
+    def grade(self, option_mapping: Mapping, answer_map: AnswerMap) -> GradeResult:
+        rows = self.grade_answers(option_mapping, answer_map)
+        score = sum(1 for _, _, correct in rows if correct)
+        return score, len(rows), self.incorrect_details(rows)
+
+    def grade_many(
+        self, submissions: Iterable[Tuple[Mapping, AnswerMap]]
+    ) -> List[GradeResult]:
+        grade = self.grade
+        return [grade(mapping, answers) for mapping, answers in submissions]
@@ -0,0 +1,206 @@
+import asyncio
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import codec
+
+
+class Subscriber:
+    """One dashboard connection: a bounded queue on its event loop.
+
+    A subscriber that lets ``maxsize`` events pile up is cut off rather than
+    buffered without limit: its queue is emptied and ``None`` tells the
+    stream to end, the browser reconnects and starts from a fresh snapshot.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.loop = loop
+        self.queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(maxsize)
+        self.dropped = False
+        self.done = False
+
+    def _deliver(self, frame: Optional[bytes]):
+        if self.done:
+            return
+        if frame is not None:
+            if not self.queue.full():
+                self.queue.put_nowait(frame)
+                return
+            self.dropped = True
+        self.done = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+def frame(event: str, data: Dict) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + codec.dumps(data) + b"\n\n"
+
+
+class LiveFeed:
+    """Attempt events of one quiz, fanned out to every watching lector.
+
+    Handlers publish from worker threads; the running aggregates are folded
+    in under a lock and one encoded frame is handed to each subscriber's
+    loop, so viewers share the work and never query the DB. Open attempts
+    and the totals are read once in ``load()``. Per process: with
+    ``--workers N`` a dashboard sees the attempts its worker served.
+    """
+
+    def __init__(self, queue_size: int = 256):
+        self.queue_size = queue_size
+        self._subscribers: List[Subscriber] = []
+        self._open: Dict[int, Dict] = {}
+        self._submitted = 0
+        self._score_sum = 0
+        self._percent_sum = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def load(self, conn: sqlite3.Connection):
+        now = datetime.now(timezone.utc).isoformat()
+        totals = conn.execute(
+            "SELECT attempts, score_sum, percent_sum FROM quiz_results WHERE id = 1"
+        ).fetchone()
+        rows = conn.execute(
+            """
+            SELECT a.id, a.user_id, u.github_username AS username, a.started_at,
+                   a.deadline_at, p.answers_json
+            FROM attempts a
+            JOIN users u ON u.id = a.user_id
+            LEFT JOIN attempt_progress p ON p.attempt_id = a.id
+            WHERE a.finished_at IS NULL AND a.deadline_at > ?
+            """,
+            (now,),
+        ).fetchall()
+        with self._lock:
+            if totals is not None:
+                self._submitted = totals["attempts"]
+                self._score_sum = totals["score_sum"]
+                self._percent_sum = totals["percent_sum"]
+            self._open = {
+                row["id"]: {
+                    "attemptId": row["id"],
+                    "userId": row["user_id"],
+                    "username": row["username"],
+                    "startedAt": row["started_at"],
+                    "deadline": row["deadline_at"],
+                    "answered": len(codec.loads(row["answers_json"]))
+                    if row["answers_json"]
+                    else 0,
+                }
+                for row in rows
+            }
+
+    def _stats(self) -> Dict:
+        submitted = self._submitted
+        return {
+            "active": len(self._open),
+            "submitted": submitted,
+            "meanScore": round(self._score_sum / submitted, 2) if submitted else None,
+            "meanPercent": round(self._percent_sum / submitted, 2) if submitted else None,
+        }
+
+    def _expire(self):
+        # attempts nobody submitted leave the table once their time is up
+        now = datetime.now(timezone.utc).isoformat()
+        for attempt_id in [k for k, v in self._open.items() if v["deadline"] <= now]:
+            del self._open[attempt_id]
+
+    def subscribe(self, maxsize: Optional[int] = None) -> Tuple[Subscriber, bytes]:
+        """Register the running loop's connection; returns it and the snapshot frame."""
+        subscriber = Subscriber(asyncio.get_running_loop(), maxsize or self.queue_size)
+        with self._lock:
+            self._expire()
+            snapshot = frame(
+                "snapshot",
+                {"attempts": list(self._open.values()), "stats": self._stats()},
+            )
+            self._subscribers.append(subscriber)
+        return subscriber, snapshot
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def started(
+        self, attempt_id: int, user_id: int, username: str, started_at: str, deadline: str
+    ):
+        attempt = {
+            "attemptId": attempt_id,
+            "userId": user_id,
+            "username": username,
+            "startedAt": started_at,
+            "deadline": deadline,
+            "answered": 0,
+        }
+        with self._lock:
+            self._open[attempt_id] = attempt
+            self._publish("started", attempt)
+
+    def progress(self, attempt_id: int, answered: int, current_index: int):
+        with self._lock:
+            attempt = self._open.get(attempt_id)
+            if attempt is None:
+                return
+            attempt["answered"] = answered
+            self._publish(
+                "progress",
+                {
+                    "attemptId": attempt_id,
+                    "username": attempt["username"],
+                    "answered": answered,
+                    "currentIndex": current_index,
+                },
+            )
+
+    def submitted(self, attempt_id: int, user_id: int, score: int, total: int):
+        with self._lock:
+            attempt = self._open.pop(attempt_id, None)
+            if total:
+                self._submitted += 1
+                self._score_sum += score
+                self._percent_sum += score / total * 100
+            self._publish(
+                "submitted",
+                {
+                    "attemptId": attempt_id,
+                    "userId": user_id,
+                    "username": attempt and attempt["username"],
+                    "score": score,
+                    "total": total,
+                },
+            )
+
+    def _publish(self, event: str, data: Dict):
+        # caller holds the lock; without viewers nothing is encoded
+        if not self._subscribers:
+            return
+        encoded = frame(event, {**data, "stats": self._stats()})
+        for subscriber in list(self._subscribers):
+            self._send(subscriber, encoded)
+
+    def _send(self, subscriber: Subscriber, encoded: Optional[bytes]):
+        if subscriber.done:
+            self._subscribers.remove(subscriber)
+            return
+        try:
+            subscriber.loop.call_soon_threadsafe(subscriber._deliver, encoded)
+        except RuntimeError:
+            # the connection's loop is gone
+            self._subscribers.remove(subscriber)
+
+    def close(self):
+        """End every stream (shutdown or the quiz being closed)."""
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, []
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber._deliver, None)
+            except RuntimeError:
+                pass
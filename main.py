@@ -1,43 +1,168 @@
+import asyncio
+import hashlib
 import json
+import logging
+import math
 import os
 import random
+import re
 import secrets
 import sqlite3
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, TypeVar
 
 import httpx
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError, conint
+from starlette.concurrency import run_in_threadpool
+
+from admission import ConcurrencyGate, TokenBuckets
+from analytics import item_analysis, load_responses
+import codec
+import summaries
+from autosave import Progress, ProgressBuffer
+from bank import BankManager, QuestionBank
+from grading import AnswerRow
+from db import ConnectionPool, transaction
+from live import LiveFeed
+from metrics import MetricsMiddleware, QuizMetrics
+from profiling import Profiler, ProfilerMiddleware, track_thread
+from quizzes import Quiz, QuizMiddleware, QuizRegistry
+from state_store import make_state_store
+from writer import GroupCommitWriter
 
 load_dotenv()
 
+logger = logging.getLogger("quiz")
+
 BASE_DIR = Path(__file__).resolve().parent
 TEST_FILE = os.getenv("QUIZ_FILE", "test.json")
 QUESTIONS_PATH = BASE_DIR / TEST_FILE
 DB_PATH = QUESTIONS_PATH.with_suffix(".db")
 ATTEMPT_LIMIT = int(os.getenv("QUIZ_ATTEMPT_LIMIT", "3"))
 ATTEMPT_DURATION_SECONDS = int(os.getenv("QUIZ_ATTEMPT_MINUTES", "60")) * 60
-STATE_TTL_SECONDS = 600
+STATE_TTL_SECONDS = int(os.getenv("QUIZ_STATE_TTL_SECONDS", "600"))
+# "sqlite": OAuth states live in the quiz DB (works with --workers N), "memory": per process
+STATE_STORE = os.getenv("QUIZ_STATE_STORE", "sqlite")
 LECTOR = os.getenv("LECTOR", "").strip().lower()
 UNLIMITED_ATTEMPTS = 10**9
+DB_BUSY_TIMEOUT_MS = int(os.getenv("QUIZ_DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KIB = int(os.getenv("QUIZ_DB_CACHE_KIB", "16384"))
+DB_SYNCHRONOUS = os.getenv("QUIZ_DB_SYNCHRONOUS", "NORMAL")
+# "seed": store a shuffle seed per attempt, "stored": store the full permutation JSON
+SHUFFLE_MODE = os.getenv("QUIZ_SHUFFLE_MODE", "seed")
+BANK_POLL_SECONDS = float(os.getenv("QUIZ_BANK_POLL_SECONDS", "2"))
+WRITER_MAX_BATCH = int(os.getenv("QUIZ_WRITER_MAX_BATCH", "128"))
+WRITER_WINDOW_MS = int(os.getenv("QUIZ_WRITER_WINDOW_MS", "2"))
+# questions sent with start/resume; the rest is fetched page by page (0 = all at once)
+QUESTION_PAGE_SIZE = int(os.getenv("QUIZ_QUESTION_PAGE_SIZE", "0"))
+PROGRESS_FLUSH_SECONDS = float(os.getenv("QUIZ_PROGRESS_FLUSH_SECONDS", "2"))
+PROGRESS_IDLE_SECONDS = float(os.getenv("QUIZ_PROGRESS_IDLE_SECONDS", "600"))
+# <QUIZ_DIR>/<slug>.json is served under /q/<slug>/ (unset: only QUIZ_FILE)
+QUIZ_DIR = os.getenv("QUIZ_DIR") and (BASE_DIR / os.getenv("QUIZ_DIR"))
+QUIZ_MAX_OPEN = int(os.getenv("QUIZ_MAX_OPEN", "16"))
+QUIZ_IDLE_SECONDS = float(os.getenv("QUIZ_IDLE_SECONDS", "900"))
+LEADERBOARD_SIZE = int(os.getenv("QUIZ_LEADERBOARD_SIZE", "20"))
+# events a dashboard may fall behind before its stream is cut off
+LIVE_QUEUE_SIZE = int(os.getenv("QUIZ_LIVE_QUEUE", "256"))
+LIVE_PING_SECONDS = float(os.getenv("QUIZ_LIVE_PING_SECONDS", "15"))
+# expired unfinished attempts are graded from their autosave (0 = never)
+SWEEP_SECONDS = float(os.getenv("QUIZ_SWEEP_SECONDS", "30"))
+SWEEP_BATCH = int(os.getenv("QUIZ_SWEEP_BATCH", "100"))
+# how long past the deadline an attempt is left to a submit that arrived in
+# time but is still queued (on another worker, or behind the writer)
+SWEEP_GRACE_SECONDS = float(os.getenv("QUIZ_SWEEP_GRACE_SECONDS", "120"))
+# start/submit served at once, queued beyond that and for how long (0 = no limit);
+# submits are never turned away, they wait for a slot
+ADMISSION_CONCURRENCY = int(os.getenv("QUIZ_ADMISSION_CONCURRENCY", "16"))
+ADMISSION_QUEUE = int(os.getenv("QUIZ_ADMISSION_QUEUE", "64"))
+ADMISSION_WAIT_SECONDS = float(os.getenv("QUIZ_ADMISSION_WAIT_SECONDS", "5"))
+# per user on start/submit: a burst, then a steady rate (0 = off)
+USER_RATE_PER_SECOND = float(os.getenv("QUIZ_USER_RATE_PER_SECOND", "1"))
+USER_BURST = int(os.getenv("QUIZ_USER_BURST", "5"))
+# OAuth logins per client address; off by default, a class behind NAT shares one
+LOGIN_RATE_PER_SECOND = float(os.getenv("QUIZ_LOGIN_RATE_PER_SECOND", "1"))
+LOGIN_BURST = int(os.getenv("QUIZ_LOGIN_BURST", "0"))
 
 GITHUB_CLIENT_ID = os.getenv("GITHUB_CLIENT_ID")
 GITHUB_CLIENT_SECRET = os.getenv("GITHUB_CLIENT_SECRET")
 GITHUB_REDIRECT_URL = os.getenv("GITHUB_REDIRECT_URL")  # optional override
+# overridable so logins can be exercised against a local fake (tests/fake_github.py)
+GITHUB_OAUTH_URL = os.getenv("GITHUB_OAUTH_URL", "https://github.com").rstrip("/")
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+HTTP_MAX_CONNECTIONS = int(os.getenv("QUIZ_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("QUIZ_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("QUIZ_HTTP_KEEPALIVE_SECONDS", "30"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("QUIZ_HTTP_TIMEOUT_SECONDS", "15"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("QUIZ_HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+METRICS_ENABLED = os.getenv("QUIZ_METRICS", "1") == "1"
+PROFILE_DIR = Path(os.getenv("QUIZ_PROFILE_DIR", str(BASE_DIR / "profiles")))
+PROFILE_INTERVAL_MS = float(os.getenv("QUIZ_PROFILE_INTERVAL_MS", "1"))
+# requests carrying X-Profile-Token with this value may be profiled (besides LECTOR)
+PROFILE_TOKEN = os.getenv("QUIZ_PROFILE_TOKEN") or None
+
+metrics = QuizMetrics()
+
+connection_class = (
+    metrics.connection_factory() if METRICS_ENABLED else sqlite3.Connection
+)
 
-state_store: Dict[str, datetime] = {}
 
+def open_quiz(slug: str, path: Path) -> Quiz:
+    pool = ConnectionPool(
+        path.with_suffix(".db"),
+        busy_timeout_ms=DB_BUSY_TIMEOUT_MS,
+        cache_size_kib=DB_CACHE_SIZE_KIB,
+        synchronous=DB_SYNCHRONOUS,
+        factory=connection_class,
+    )
+    writer = GroupCommitWriter(
+        pool, max_batch=WRITER_MAX_BATCH, window_ms=WRITER_WINDOW_MS
+    )
+    return Quiz(
+        slug,
+        path,
+        pool,
+        writer,
+        ProgressBuffer(writer, idle_seconds=PROGRESS_IDLE_SECONDS),
+        BankManager(path, pool.connection),
+        make_state_store(STATE_STORE, pool.connection, STATE_TTL_SECONDS),
+        LiveFeed(LIVE_QUEUE_SIZE),
+    )
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+
+quizzes = QuizRegistry(
+    open_quiz("", QUESTIONS_PATH),
+    QUIZ_DIR,
+    open_quiz,
+    max_open=QUIZ_MAX_OPEN,
+    idle_seconds=QUIZ_IDLE_SECONDS,
+)
+# the quiz served outside /q/<slug>/
+pool = quizzes.default.pool
+writer = quizzes.default.writer
+progress = quizzes.default.progress
+banks = quizzes.default.banks
+state_store = quizzes.default.state_store
+
+
+def get_db() -> sqlite3.Connection:
+    track_thread()
+    return quizzes.current().connection()
 
 
 def is_lector(username: Optional[str]) -> bool:
@@ -50,54 +175,128 @@ def attempts_left(username: str, attempts_done: int) -> int:
     return max(0, ATTEMPT_LIMIT - attempts_done)
 
 
-def ensure_schema():
-    DB_PATH.touch(exist_ok=True)
-    with get_db() as conn:
-        conn.executescript(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                github_username TEXT UNIQUE NOT NULL,
-                created_at TEXT NOT NULL
-            );
-
-            CREATE TABLE IF NOT EXISTS attempts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                attempt_number INTEGER NOT NULL,
-                started_at TEXT NOT NULL,
-                deadline_at TEXT NOT NULL,
-                finished_at TEXT,
-                score INTEGER,
-                total_questions INTEGER,
-                answers_json TEXT,
-                option_mapping_json TEXT NOT NULL,
-                incorrect_json TEXT,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            );
-            """
-        )
-        conn.commit()
+def is_lector_id(user_id: int) -> bool:
+    row = get_db().execute(
+        "SELECT github_username FROM users WHERE id = ?", (user_id,)
+    ).fetchone()
+    return row is not None and is_lector(row[0])
+
+
+profiler = Profiler(PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_TOKEN, is_lector_id)
+
+gate = ConcurrencyGate(ADMISSION_CONCURRENCY, ADMISSION_QUEUE, ADMISSION_WAIT_SECONDS)
+user_buckets = TokenBuckets(USER_RATE_PER_SECOND, USER_BURST)
+login_buckets = TokenBuckets(LOGIN_RATE_PER_SECOND, LOGIN_BURST)
+for name, value in (
+    ("concurrency", ADMISSION_CONCURRENCY),
+    ("queue", ADMISSION_QUEUE),
+    ("user_rate", USER_RATE_PER_SECOND),
+    ("user_burst", USER_BURST),
+    ("login_rate", LOGIN_RATE_PER_SECOND),
+    ("login_burst", LOGIN_BURST),
+):
+    metrics.admission_limit.set(value, name)
 
+USER_ID_RE = re.compile(rb'"userId"\s*:\s*(\d+)')
 
-def load_questions() -> Dict:
-    with QUESTIONS_PATH.open("r", encoding="utf-8") as f:
-        data = json.load(f)
-    return data
+
+def too_many_requests(reason: str, retry_after: float) -> HTTPException:
+    metrics.admission_rejected.inc(reason)
+    return HTTPException(
+        status_code=429,
+        detail="Too many requests",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def admit_login(request: Request):
+    """Per-address bucket on starting OAuth.
+
+    The callback is not limited: its state is single-use, and a popup that
+    got a 429 would not retry.
+    """
+    host = request.client.host if request.client else ""
+    wait = login_buckets.take(f"{quizzes.current().slug}/{host}")
+    if wait:
+        raise too_many_requests("rate_limited", wait)
+
+
+@asynccontextmanager
+async def gate_slot(patient: bool):
+    if ADMISSION_CONCURRENCY <= 0:
+        yield
+        return
+    # jittered, so a turned-away room does not come back as one wave
+    retry_after = ADMISSION_WAIT_SECONDS * random.uniform(1, 2)
+    if gate.full() and not patient:
+        raise too_many_requests("queue_full", retry_after)
+    started = time.perf_counter()
+    if not await gate.enter(patient):
+        raise too_many_requests("timeout", retry_after)
+    metrics.admission_wait.observe(time.perf_counter() - started)
+    try:
+        yield
+    finally:
+        gate.leave()
+
+
+def admission(patient: bool = False):
+    """Admission control for start/submit: the user's bucket, then the gate."""
+
+    async def admit(request: Request):
+        quiz = quizzes.current()
+        # the deadline is checked against this, not the end of the wait
+        request.state.received_at = datetime.now(timezone.utc)
+        raw_id = request.path_params.get("attempt_id", "")
+        attempt_id = int(raw_id) if raw_id.isdigit() else None
+        if attempt_id is not None:
+            # the sweeper leaves an attempt alone while its submit is in flight
+            quiz.submit_started(attempt_id)
+        try:
+            # the body names the user (read once, cached for the handler)
+            match = USER_ID_RE.search(await request.body())
+            if match:
+                caller = match.group(1).decode()
+            else:
+                caller = "ip:" + (request.client.host if request.client else "")
+            wait = user_buckets.take(f"{quiz.slug}/{caller}")
+            if wait:
+                raise too_many_requests("rate_limited", wait)
+            async with gate_slot(patient):
+                yield
+        finally:
+            if attempt_id is not None:
+                quiz.submit_finished(attempt_id)
+
+    return admit
+
+
+admit_start = admission()
+# a submit turned away near the deadline would come back after it
+admit_submit = admission(patient=True)
 
 
-RAW_TEST = load_questions()
-TEST_NAME = RAW_TEST.get("name", "QA Quiz")
-QUESTIONS = {q["id"]: q for q in RAW_TEST.get("questions", [])}
+def ensure_schema():
+    quizzes.default.ensure_schema()
 
 
 class StartAttemptRequest(BaseModel):
     userId: int
 
 
+class LectorRequest(BaseModel):
+    userId: int
+
+
+class ProfileRequest(BaseModel):
+    userId: int
+    route: str
+    count: int = 1
+
+
 class AnswerPayload(BaseModel):
     questionId: int
-    selectedIndexes: List[int]
+    selectedIndexes: List[conint(ge=0)]
 
 
 class SubmitAttemptRequest(BaseModel):
@@ -105,7 +304,112 @@ class SubmitAttemptRequest(BaseModel):
     userId: int
 
 
-app = FastAPI(title="Quiz Runner", version="1.0")
+class ProgressRequest(BaseModel):
+    answers: List[AnswerPayload]
+    userId: int
+    currentIndex: int = 0
+
+
+async def watch_bank():
+    while True:
+        await asyncio.sleep(BANK_POLL_SECONDS)
+        # held: eviction cannot close a quiz in the middle of its reload
+        held = quizzes.hold_all()
+        try:
+            for quiz in held:
+                try:
+                    if await asyncio.to_thread(quiz.banks.check):
+                        logger.info(
+                            "Question bank reloaded: %s %s",
+                            quiz.slug or "(default)",
+                            quiz.banks.current.version,
+                        )
+                except (OSError, ValueError) as exc:
+                    # keep serving the previous bank until the file is fixed or
+                    # back; an unreadable file is retried on the next tick
+                    logger.warning("Question bank reload failed: %s", exc)
+        finally:
+            quizzes.release_all(held)
+
+
+async def flush_progress():
+    while True:
+        await asyncio.sleep(PROGRESS_FLUSH_SECONDS)
+        held = quizzes.hold_all()
+        try:
+            for quiz in held:
+                try:
+                    await asyncio.to_thread(quiz.progress.flush)
+                except Exception:
+                    # entries stay dirty and are retried on the next tick
+                    logger.exception("Progress flush failed")
+        finally:
+            quizzes.release_all(held)
+        # idle quizzes are flushed and closed on the same cadence
+        await asyncio.to_thread(quizzes.evict)
+
+
+async def sweep_attempts():
+    while True:
+        await asyncio.sleep(SWEEP_SECONDS)
+        held = quizzes.hold_all()
+        try:
+            for quiz in held:
+                try:
+                    # a full batch means more may be waiting: keep going, one
+                    # transaction per batch so submits interleave
+                    cursor = None
+                    while True:
+                        _, cursor = await asyncio.to_thread(
+                            sweep_expired, quiz, SWEEP_BATCH, cursor
+                        )
+                        if cursor is None:
+                            break
+                except Exception:
+                    # the other quizzes are still swept
+                    logger.exception(
+                        "Sweeping expired attempts of %s failed", quiz.slug or "(default)"
+                    )
+        finally:
+            quizzes.release_all(held)
+
+
+def make_http_client() -> httpx.AsyncClient:
+    # one pooled client per process: logins reuse keep-alive TLS connections
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+        ),
+        timeout=httpx.Timeout(
+            HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS
+        ),
+        headers={"Accept": "application/json"},
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ensure_schema()
+    app.state.http = make_http_client()
+    # best-effort cleanup
+    state_store.purge()
+    watcher = asyncio.create_task(watch_bank()) if BANK_POLL_SECONDS > 0 else None
+    flusher = asyncio.create_task(flush_progress())
+    sweeper = asyncio.create_task(sweep_attempts()) if SWEEP_SECONDS > 0 else None
+    yield
+    if sweeper is not None:
+        sweeper.cancel()
+    if watcher is not None:
+        watcher.cancel()
+    flusher.cancel()
+    await app.state.http.aclose()
+    # flushes every open quiz's autosaves, then closes writers and pools
+    await asyncio.to_thread(quizzes.close)
+
+
+app = FastAPI(title="Quiz Runner", version="1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -114,49 +418,43 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ProfilerMiddleware, profiler=profiler)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+# outermost: the middlewares above see quiz-relative paths
+app.add_middleware(QuizMiddleware, registry=quizzes)
 
 static_dir = BASE_DIR / "static"
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
 
-@app.on_event("startup")
-def startup():
-    ensure_schema()
-    # best-effort cleanup
-    clean_state()
-
-
 def get_user(conn: sqlite3.Connection, username: str) -> Optional[sqlite3.Row]:
     cur = conn.execute(
-        "SELECT id, github_username AS username, created_at FROM users WHERE github_username = ?",
+        """
+        SELECT id, github_username AS username, created_at, attempts_count
+        FROM users WHERE github_username = ?
+        """,
         (username,),
     )
     return cur.fetchone()
 
 
-def clean_state():
-    now = datetime.now(timezone.utc)
-    stale = [
-        k
-        for k, v in state_store.items()
-        if (now - v).total_seconds() > STATE_TTL_SECONDS
-    ]
-    for key in stale:
-        state_store.pop(key, None)
-
-
-@app.get("/api/auth/github/login")
+@app.get("/api/auth/github/login", dependencies=[Depends(admit_login)])
 def github_login(request: Request):
     if not (GITHUB_CLIENT_ID and GITHUB_CLIENT_SECRET):
         raise HTTPException(status_code=500, detail="GitHub OAuth not configured")
 
-    clean_state()
+    quiz = quizzes.current()
+    # the slug travels in the state: a fixed GITHUB_REDIRECT_URL brings
+    # every quiz's callback back to the root
     state = secrets.token_urlsafe(32)
-    state_store[state] = datetime.now(timezone.utc)
+    if quiz.slug:
+        state = f"{quiz.slug}.{state}"
+    quiz.state_store.issue(state)
 
     redirect_uri = GITHUB_REDIRECT_URL or str(request.url_for("github_callback"))
     url = (
-        "https://github.com/login/oauth/authorize"
+        f"{GITHUB_OAUTH_URL}/login/oauth/authorize"
         f"?client_id={GITHUB_CLIENT_ID}"
         f"&redirect_uri={redirect_uri}"
         "&scope=read:user"
@@ -165,18 +463,40 @@ def github_login(request: Request):
     return {"url": url}
 
 
+def register_user(username: str) -> Tuple[sqlite3.Row, int]:
+    now = datetime.now(timezone.utc).isoformat()
+    with get_db() as conn:
+        user = get_user(conn, username)
+        if user is None:
+            conn.execute(
+                "INSERT OR IGNORE INTO users (github_username, created_at) VALUES (?, ?)",
+                (username, now),
+            )
+            user = get_user(conn, username)
+    return user, user["attempts_count"]
+
+
 @app.get("/api/auth/github/callback", name="github_callback")
 async def github_callback(code: str, state: str, request: Request):
-    clean_state()
-    issued = state_store.pop(state, None)
-    if issued is None:
+    slug = state.rpartition(".")[0]
+    if slug == quizzes.current().slug:
+        return await complete_github_login(code, state, request)
+    if quizzes.path_for(slug) is None:
+        raise HTTPException(status_code=400, detail="Invalid or expired state")
+    async with quizzes.use(slug):
+        return await complete_github_login(code, state, request)
+
+
+async def complete_github_login(code: str, state: str, request: Request):
+    quiz = quizzes.current()
+    if not await run_in_threadpool(quiz.state_store.consume, state):
         raise HTTPException(status_code=400, detail="Invalid or expired state")
 
     redirect_uri = GITHUB_REDIRECT_URL or str(request.url_for("github_callback"))
-    async with httpx.AsyncClient() as client:
+    client: httpx.AsyncClient = request.app.state.http
+    try:
         token_res = await client.post(
-            "https://github.com/login/oauth/access_token",
-            headers={"Accept": "application/json"},
+            f"{GITHUB_OAUTH_URL}/login/oauth/access_token",
             data={
                 "client_id": GITHUB_CLIENT_ID,
                 "client_secret": GITHUB_CLIENT_SECRET,
@@ -184,7 +504,6 @@ async def github_callback(code: str, state: str, request: Request):
                 "redirect_uri": redirect_uri,
                 "state": state,
             },
-            timeout=15,
         )
         token_res.raise_for_status()
         token_data = token_res.json()
@@ -193,31 +512,21 @@ async def github_callback(code: str, state: str, request: Request):
             raise HTTPException(status_code=400, detail="OAuth token missing")
 
         user_res = await client.get(
-            "https://api.github.com/user",
+            f"{GITHUB_API_URL}/user",
             headers={"Authorization": f"Bearer {access_token}"},
-            timeout=15,
         )
         user_res.raise_for_status()
         gh_user = user_res.json()
+    except httpx.HTTPError as exc:
+        logger.warning("GitHub OAuth request failed: %r", exc)
+        raise HTTPException(status_code=502, detail="GitHub request failed")
 
     username = gh_user.get("login")
     if not username:
         raise HTTPException(status_code=400, detail="GitHub login missing")
 
-    now = datetime.now(timezone.utc).isoformat()
-    with get_db() as conn:
-        user = get_user(conn, username)
-        if user is None:
-            conn.execute(
-                "INSERT INTO users (github_username, created_at) VALUES (?, ?)",
-                (username, now),
-            )
-            conn.commit()
-            user = get_user(conn, username)
-
-        attempts_done = conn.execute(
-            "SELECT COUNT(*) AS cnt FROM attempts WHERE user_id = ?", (user["id"],)
-        ).fetchone()["cnt"]
+    # sqlite3 blocks: keep it off the event loop
+    user, attempts_done = await run_in_threadpool(register_user, username)
 
     is_lector_flag = is_lector(user["username"])
     attempts_left_value = attempts_left(user["username"], attempts_done)
@@ -245,27 +554,9 @@ async def github_callback(code: str, state: str, request: Request):
     return HTMLResponse(content=html)
 
 
-def build_option_mapping_and_questions() -> Dict[str, Dict]:
-    option_mapping: Dict[int, List[int]] = {}
-    questions_payload = []
-    for q in QUESTIONS.values():
-        order = list(range(len(q["options"])))
-        random.shuffle(order)
-        option_mapping[q["id"]] = order
-        questions_payload.append(
-            {
-                "id": q["id"],
-                "topic": q.get("topic"),
-                "text": q["text"],
-                "multiple": q.get("multiple", False),
-                "options": [q["options"][idx] for idx in order],
-            }
-        )
-    return {"option_mapping": option_mapping, "questions": questions_payload}
-
-
-@app.post("/api/attempts/start")
+@app.post("/api/attempts/start", dependencies=[Depends(admit_start)])
 def start_attempt(payload: StartAttemptRequest):
+    quiz = quizzes.current()
     with get_db() as conn:
         user = conn.execute(
             "SELECT id, github_username AS username FROM users WHERE id = ?",
@@ -274,146 +565,533 @@ def start_attempt(payload: StartAttemptRequest):
         if user is None:
             raise HTTPException(status_code=404, detail="User not found")
 
-        attempts_done = conn.execute(
-            "SELECT COUNT(*) AS cnt FROM attempts WHERE user_id = ?", (payload.userId,)
-        ).fetchone()["cnt"]
-        if not is_lector(user["username"]) and attempts_done >= ATTEMPT_LIMIT:
-            raise HTTPException(status_code=403, detail="Attempt limit reached")
-
-        attempt_number = attempts_done + 1
+        limit = UNLIMITED_ATTEMPTS if is_lector(user["username"]) else ATTEMPT_LIMIT
         now = datetime.now(timezone.utc)
         deadline = now + timedelta(seconds=ATTEMPT_DURATION_SECONDS)
-        mapping_and_questions = build_option_mapping_and_questions()
+        bank = quiz.banks.current
+        # seeded attempts are regenerated from (seed, bank version) on read
+        if SHUFFLE_MODE == "seed":
+            seed = secrets.randbits(63)
+            option_mapping = bank.permutations(seed)
+            mapping_json = None
+        else:
+            seed = None
+            option_mapping = bank.random_mapping()
+            mapping_json = codec.dumps_text(option_mapping)
+
+        # counter bump + insert under one write lock: concurrent starts cannot
+        # both pass the limit check or reuse an attempt_number
+        with transaction(conn, "IMMEDIATE"):
+            counter = conn.execute(
+                """
+                UPDATE users SET attempts_count = attempts_count + 1
+                WHERE id = ? AND attempts_count < ?
+                RETURNING attempts_count
+                """,
+                (payload.userId, limit),
+            ).fetchall()
+            if not counter:
+                raise HTTPException(status_code=403, detail="Attempt limit reached")
+            attempt_number = counter[0]["attempts_count"]
+
+            attempt_id = conn.execute(
+                """
+                INSERT INTO attempts (
+                    user_id, attempt_number, started_at, deadline_at,
+                    option_mapping_json, option_seed, bank_version
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                RETURNING id
+                """,
+                (
+                    payload.userId,
+                    attempt_number,
+                    now.isoformat(),
+                    deadline.isoformat(),
+                    mapping_json,
+                    seed,
+                    bank.version,
+                ),
+            ).fetchall()[0]["id"]
+
+    quiz.live.started(
+        attempt_id, payload.userId, user["username"], now.isoformat(), deadline.isoformat()
+    )
 
-        conn.execute(
-            """
-            INSERT INTO attempts (
-                user_id, attempt_number, started_at, deadline_at, option_mapping_json
-            ) VALUES (?, ?, ?, ?, ?)
-            """,
-            (
-                payload.userId,
-                attempt_number,
-                now.isoformat(),
-                deadline.isoformat(),
-                json.dumps(mapping_and_questions["option_mapping"]),
-            ),
-        )
-        conn.commit()
-        attempt_id = conn.execute("SELECT last_insert_rowid() AS id").fetchone()["id"]
+    body = attempt_body(
+        {
+            "attemptId": attempt_id,
+            "attemptNumber": attempt_number,
+            "deadline": deadline.isoformat(),
+        },
+        bank,
+        option_mapping,
+    )
+    return Response(content=body, media_type="application/json")
 
-    return {
-        "attemptId": attempt_id,
-        "attemptNumber": attempt_number,
-        "deadline": deadline.isoformat(),
-        "questions": mapping_and_questions["questions"],
-    }
+
+def attempt_body(
+    head: Dict,
+    bank: QuestionBank,
+    option_mapping,
+    offset: int = 0,
+    limit: Optional[int] = None,
+) -> bytes:
+    # question JSON is spliced from fragments pre-encoded at bank load
+    if limit is None and QUESTION_PAGE_SIZE > 0:
+        limit = QUESTION_PAGE_SIZE
+    encoded = codec.dumps({**head, "totalQuestions": len(option_mapping)})
+    questions = bank.questions_json(option_mapping, offset, limit)
+    return encoded[:-1] + b',"questions":' + questions + b"}"
 
 
 def evaluate_attempt(
-    option_mapping: Dict[str, List[int]], answers: List[AnswerPayload]
-):
-    score = 0
-    incorrect_details = []
-    total = len(QUESTIONS)
-    answer_map = {a.questionId: a.selectedIndexes for a in answers}
-
-    for qid, q in QUESTIONS.items():
-        presented_indices = option_mapping.get(str(qid)) or option_mapping.get(qid)
-        if presented_indices is None:
-            continue
+    option_mapping: Dict[str, List[int]],
+    answer_map: codec.AnswerMap,
+    bank: Optional[QuestionBank] = None,
+) -> Tuple[int, int, List[AnswerRow]]:
+    bank = bank or quizzes.current().banks.current
+    started = time.perf_counter()
+    rows = bank.key.grade_answers(option_mapping, answer_map)
+    metrics.grading.observe(time.perf_counter() - started)
+    return sum(1 for _, _, correct in rows if correct), len(rows), rows
 
-        selected = answer_map.get(qid, [])
-        original_selected = [
-            presented_indices[idx] for idx in selected if idx < len(presented_indices)
-        ]
 
-        if q.get("multiple"):
-            correct = set(q.get("correctIndexes", []))
-            is_correct = set(original_selected) == correct
-        else:
-            correct_idx = q.get("correctIndex")
-            is_correct = (
-                len(original_selected) == 1 and original_selected[0] == correct_idx
-            )
+Parsed = TypeVar("Parsed")
 
-        if is_correct:
-            score += 1
-        else:
-            incorrect_details.append(
+
+def parse_body(
+    body: bytes, parse: Callable[[Any], Parsed], model: Type[BaseModel]
+) -> Parsed:
+    """Decode a hot route's body with a ``codec`` parser.
+
+    Input the parser rejects goes through ``model``: lax values are coerced
+    (its dump then has the exact shape the parser wants), invalid ones get
+    the usual 422 with precise errors.
+    """
+    try:
+        data = codec.loads(body)
+    except ValueError as exc:
+        raise RequestValidationError(
+            [
                 {
-                    "id": qid,
-                    "text": q["text"],
-                    "topic": q.get("topic"),
-                    "correct": (
-                        [q["options"][i] for i in q.get("correctIndexes", [])]
-                        if q.get("multiple")
-                        else [q["options"][q["correctIndex"]]]
-                    ),
-                    "selected": [q["options"][i] for i in original_selected],
+                    "type": "json_invalid",
+                    "loc": ("body", 0),
+                    "msg": "JSON decode error",
+                    "input": {},
+                    "ctx": {"error": str(exc)},
                 }
-            )
+            ]
+        )
+    try:
+        return parse(data)
+    except ValueError:
+        pass
+    # slow path: lax coercion and precise error messages from the model
+    try:
+        payload = model.model_validate(data)
+    except ValidationError as exc:
+        raise RequestValidationError(
+            [{**err, "loc": ("body", *err["loc"])} for err in exc.errors()],
+            body=data,
+        )
+    return parse(payload.model_dump())
+
 
-    return score, total, incorrect_details
+# the body is parsed by parse_body (codec fast path) instead of a
+# SubmitAttemptRequest parameter, so no model is built per answer
+@app.post("/api/attempts/{attempt_id}/submit", dependencies=[Depends(admit_submit)])
+async def submit_attempt(attempt_id: int, request: Request):
+    user_id, answer_map = parse_body(
+        await request.body(), codec.parse_submission, SubmitAttemptRequest
+    )
+    return await run_in_threadpool(
+        finish_attempt, attempt_id, user_id, answer_map, request.state.received_at
+    )
+
+
+def record_result(
+    conn: sqlite3.Connection,
+    attempt_id: int,
+    user_id: int,
+    score: int,
+    total: int,
+    rows: List[AnswerRow],
+    finished_at: str,
+) -> bool:
+    """Store a graded attempt; False if it was already finished."""
+    cur = conn.execute(
+        """
+        UPDATE attempts SET finished_at = ?, score = ?, total_questions = ?
+        WHERE id = ? AND finished_at IS NULL
+        """,
+        (finished_at, score, total, attempt_id),
+    )
+    if cur.rowcount == 0:
+        return False
+    conn.executemany(
+        "INSERT INTO attempt_answers VALUES (?, ?, ?, ?)",
+        [(attempt_id, qid, mask, correct) for qid, mask, correct in rows],
+    )
+    conn.execute("DELETE FROM attempt_progress WHERE attempt_id = ?", (attempt_id,))
+    summaries.record(conn, user_id, score, total, finished_at)
+    return True
 
 
-@app.post("/api/attempts/{attempt_id}/submit")
-def submit_attempt(attempt_id: int, payload: SubmitAttemptRequest):
+def finish_attempt(
+    attempt_id: int,
+    user_id: int,
+    answer_map: codec.AnswerMap,
+    received_at: Optional[datetime] = None,
+):
+    quiz = quizzes.current()
     now = datetime.now(timezone.utc)
     with get_db() as conn:
         attempt = conn.execute(
             """
-            SELECT a.*, u.github_username AS username
+            SELECT a.*, u.github_username AS username, u.attempts_count
             FROM attempts a
             JOIN users u ON u.id = a.user_id
             WHERE a.id = ? AND a.user_id = ?
             """,
-            (attempt_id, payload.userId),
+            (attempt_id, user_id),
         ).fetchone()
         if attempt is None:
             raise HTTPException(status_code=404, detail="Attempt not found")
         if attempt["finished_at"]:
             raise HTTPException(status_code=400, detail="Attempt already submitted")
 
+        # a submit that arrived in time counts even if it waited for a slot
         deadline = datetime.fromisoformat(attempt["deadline_at"])
-        if now > deadline:
+        if (received_at or now) > deadline:
             raise HTTPException(status_code=400, detail="Attempt time expired")
 
-        option_mapping = json.loads(attempt["option_mapping_json"])
-        score, total, incorrect_details = evaluate_attempt(
-            option_mapping, payload.answers
-        )
+        # answers autosaved from another device fill in questions the body lacks
+        saved = quiz.progress.get(conn, attempt_id)
+        if saved is not None:
+            answer_map = {**saved.answer_map(), **answer_map}
+
+        # grade against the bank version the attempt was started with
+        bank = quiz.banks.versions.for_attempt(attempt)
+        option_mapping = quiz.banks.versions.option_mapping(attempt)
+        score, total, rows = evaluate_attempt(option_mapping, answer_map, bank)
+
+    finished_at = now.isoformat()
+
+    def finalize(conn: sqlite3.Connection):
+        # a concurrent submit (or the sweeper) finished the attempt first
+        if not record_result(
+            conn, attempt_id, user_id, score, total, rows, finished_at
+        ):
+            raise HTTPException(status_code=400, detail="Attempt already submitted")
+
+    quiz.writer.run(finalize)
+    quiz.progress.discard(attempt_id)
+    quiz.live.submitted(attempt_id, user_id, score, total)
+
+    attempts_left_value = attempts_left(attempt["username"], attempt["attempts_count"])
+    body = codec.dumps(
+        {
+            "score": score,
+            "total": total,
+            "attemptsLeft": attempts_left_value,
+            "incorrect": bank.key.incorrect_details(rows),
+        }
+    )
+    return Response(content=body, media_type="application/json")
+
+
+SweepCursor = Tuple[str, int]
+
+
+def sweep_expired(
+    quiz: Quiz, limit: int = SWEEP_BATCH, after: Optional[SweepCursor] = None
+) -> Tuple[int, Optional[SweepCursor]]:
+    """Grade up to ``limit`` expired unfinished attempts in one transaction.
 
-        conn.execute(
+    Answers come from the autosave (none saved: graded as empty). An
+    attempt is swept ``SWEEP_GRACE_SECONDS`` after its deadline, and not
+    while a submit for it is in flight: a submit that arrived in time wins.
+    The attempts are stamped with the sweep time, not their deadline, so
+    incremental exports past the deadline still pick them up.
+
+    Returns how many were finished and, after a full batch, the
+    ``(deadline_at, id)`` to continue from. Attempts that fail to grade are
+    logged and left open; the cursor moves past them, so one bad attempt
+    cannot hold back the ones behind it.
+    """
+    now_dt = datetime.now(timezone.utc)
+    now = now_dt.isoformat()
+    cutoff = (now_dt - timedelta(seconds=SWEEP_GRACE_SECONDS)).isoformat()
+    conn = quiz.connection()
+    expired = conn.execute(
+        """
+        SELECT id, user_id, deadline_at, option_mapping_json, option_seed, bank_version
+        FROM attempts
+        WHERE finished_at IS NULL AND deadline_at <= ?
+          AND (deadline_at, id) > (?, ?)
+        ORDER BY deadline_at, id
+        LIMIT ?
+        """,
+        (cutoff, *(after or ("", 0)), limit),
+    ).fetchall()
+    if not expired:
+        return 0, None
+    cursor = (expired[-1]["deadline_at"], expired[-1]["id"])
+
+    graded = []
+    for attempt in expired:
+        if attempt["id"] in quiz.submits:
+            continue
+        try:
+            saved = quiz.progress.get(conn, attempt["id"])
+            score, total, rows = evaluate_attempt(
+                quiz.banks.versions.option_mapping(attempt),
+                saved.answer_map() if saved is not None else {},
+                quiz.banks.versions.for_attempt(attempt),
+            )
+        except Exception:
+            logger.exception("Grading expired attempt %s failed", attempt["id"])
+            continue
+        graded.append((attempt["id"], attempt["user_id"], score, total, rows))
+
+    def finalize(conn: sqlite3.Connection):
+        finished = []
+        for item in graded:
+            conn.execute("SAVEPOINT sweep_item")
+            try:
+                stored = record_result(conn, *item, now)
+            except sqlite3.Error:
+                conn.execute("ROLLBACK TO sweep_item")
+                logger.exception("Finalizing expired attempt %s failed", item[0])
+                stored = False
+            conn.execute("RELEASE sweep_item")
+            if stored:
+                finished.append(item)
+        return finished
+
+    finished = quiz.writer.run(finalize) if graded else []
+    for attempt_id, user_id, score, total, _ in finished:
+        quiz.progress.discard(attempt_id)
+        quiz.live.submitted(attempt_id, user_id, score, total)
+    return len(finished), cursor if len(expired) == limit else None
+
+
+@app.get("/api/attempts/{attempt_id}")
+def get_attempt(attempt_id: int, userId: int, request: Request):
+    quiz = quizzes.current()
+    with get_db() as conn:
+        attempt = conn.execute(
             """
-            UPDATE attempts
-            SET finished_at = ?, score = ?, total_questions = ?, answers_json = ?, incorrect_json = ?
-            WHERE id = ?
+            SELECT a.id, a.user_id, a.attempt_number, a.deadline_at, a.finished_at,
+                   a.option_mapping_json, a.option_seed, a.bank_version,
+                   p.answers_json, p.current_index, p.updated_at
+            FROM attempts a
+            LEFT JOIN attempt_progress p ON p.attempt_id = a.id
+            WHERE a.id = ?
             """,
-            (
-                now.isoformat(),
-                score,
-                total,
-                json.dumps([a.dict() for a in payload.answers]),
-                json.dumps(incorrect_details),
-                attempt_id,
-            ),
+            (attempt_id,),
+        ).fetchone()
+    if attempt is None or attempt["user_id"] != userId:
+        raise HTTPException(status_code=404, detail="Attempt not found")
+    if attempt["finished_at"]:
+        raise HTTPException(status_code=400, detail="Attempt already submitted")
+
+    saved = quiz.progress.cached(attempt_id)
+    if saved is not None:
+        answers, current_index, saved_at = (
+            saved.answers,
+            saved.current_index,
+            saved.updated_at,
+        )
+    elif attempt["answers_json"] is not None:
+        answers, current_index, saved_at = (
+            codec.loads(attempt["answers_json"]),
+            attempt["current_index"],
+            attempt["updated_at"],
         )
-        conn.commit()
+    else:
+        answers, current_index, saved_at = [], 0, None
+
+    # the payload only changes with the shuffle or the saved progress, so the
+    # tag is checked before any question JSON is assembled
+    etag = '"%s"' % hashlib.blake2b(
+        "|".join(
+            str(v)
+            for v in (
+                attempt_id,
+                attempt["bank_version"],
+                attempt["option_seed"],
+                attempt["option_mapping_json"],
+                attempt["deadline_at"],
+                saved_at,
+            )
+        ).encode("utf-8"),
+        digest_size=12,
+    ).hexdigest()
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    body = attempt_body(
+        {
+            "attemptId": attempt_id,
+            "attemptNumber": attempt["attempt_number"],
+            "deadline": attempt["deadline_at"],
+            "progress": {
+                "answers": answers,
+                "currentIndex": current_index,
+                "savedAt": saved_at,
+            },
+        },
+        quiz.banks.versions.for_attempt(attempt),
+        quiz.banks.versions.option_mapping(attempt),
+    )
+    return Response(content=body, media_type="application/json", headers=headers)
+
 
-        attempts_done = conn.execute(
-            "SELECT COUNT(*) AS cnt FROM attempts WHERE user_id = ?", (payload.userId,)
-        ).fetchone()["cnt"]
+@app.get("/api/attempts/{attempt_id}/result")
+def get_attempt_result(attempt_id: int, userId: int):
+    quiz = quizzes.current()
+    with get_db() as conn:
+        attempt = conn.execute(
+            """
+            SELECT user_id, finished_at, score, total_questions, bank_version
+            FROM attempts WHERE id = ?
+            """,
+            (attempt_id,),
+        ).fetchone()
+        if attempt is None or attempt["user_id"] != userId:
+            raise HTTPException(status_code=404, detail="Attempt not found")
+        if not attempt["finished_at"]:
+            raise HTTPException(status_code=400, detail="Attempt not submitted yet")
+        # review cards are rebuilt from the bank instead of stored per attempt
+        wrong = conn.execute(
+            """
+            SELECT question_id, selected_mask, is_correct FROM attempt_answers
+            WHERE attempt_id = ? AND is_correct = 0
+            """,
+            (attempt_id,),
+        ).fetchall()
 
-    attempts_left_value = attempts_left(attempt["username"], attempts_done)
+    key = quiz.banks.versions.for_attempt(attempt).key
     return {
-        "score": score,
-        "total": total,
-        "attemptsLeft": attempts_left_value,
-        "incorrect": incorrect_details,
+        "attemptId": attempt_id,
+        "finishedAt": attempt["finished_at"],
+        "score": attempt["score"],
+        "total": attempt["total_questions"],
+        "incorrect": key.incorrect_details(wrong),
+    }
+
+
+@app.get("/api/attempts/{attempt_id}/questions")
+def get_attempt_questions(
+    attempt_id: int, userId: int, offset: int = 0, limit: Optional[int] = None
+):
+    quiz = quizzes.current()
+    with get_db() as conn:
+        attempt = conn.execute(
+            """
+            SELECT user_id, finished_at, option_mapping_json, option_seed, bank_version
+            FROM attempts WHERE id = ?
+            """,
+            (attempt_id,),
+        ).fetchone()
+    if attempt is None or attempt["user_id"] != userId:
+        raise HTTPException(status_code=404, detail="Attempt not found")
+    if attempt["finished_at"]:
+        raise HTTPException(status_code=400, detail="Attempt already submitted")
+    if offset < 0 or (limit is not None and limit <= 0):
+        raise HTTPException(status_code=400, detail="Invalid page")
+
+    body = attempt_body(
+        {"attemptId": attempt_id, "offset": offset},
+        quiz.banks.versions.for_attempt(attempt),
+        quiz.banks.versions.option_mapping(attempt),
+        offset,
+        limit,
+    )
+    return Response(content=body, media_type="application/json")
+
+
+# the most frequent write: parsed like submit, without a model per answer
+@app.put("/api/attempts/{attempt_id}/progress")
+async def save_progress(attempt_id: int, request: Request):
+    user_id, answers, current_index = parse_body(
+        await request.body(), codec.parse_progress, ProgressRequest
+    )
+    return await run_in_threadpool(
+        store_progress, attempt_id, user_id, answers, current_index
+    )
+
+
+def store_progress(
+    attempt_id: int, user_id: int, answers: List[Dict], current_index: int
+):
+    quiz = quizzes.current()
+    now = datetime.now(timezone.utc)
+    # autosaves arrive per click: the ownership/deadline check is served
+    # from the buffered entry, the DB is only read for the first save
+    known = quiz.progress.cached(attempt_id)
+    if known is not None:
+        owner, deadline_at = known.user_id, known.deadline_at
+    else:
+        with get_db() as conn:
+            attempt = conn.execute(
+                "SELECT user_id, deadline_at, finished_at FROM attempts WHERE id = ?",
+                (attempt_id,),
+            ).fetchone()
+        if attempt is None:
+            raise HTTPException(status_code=404, detail="Attempt not found")
+        if attempt["finished_at"]:
+            raise HTTPException(status_code=400, detail="Attempt already submitted")
+        owner, deadline_at = attempt["user_id"], attempt["deadline_at"]
+
+    if owner != user_id:
+        raise HTTPException(status_code=404, detail="Attempt not found")
+    if now > datetime.fromisoformat(deadline_at):
+        raise HTTPException(status_code=400, detail="Attempt time expired")
+
+    saved_at = now.isoformat()
+    quiz.progress.put(
+        attempt_id,
+        Progress(owner, deadline_at, answers, current_index, saved_at),
+    )
+    quiz.live.progress(attempt_id, len(answers), current_index)
+    return {"savedAt": saved_at}
+
+
+@app.get("/api/attempts/{attempt_id}/progress")
+def get_progress(attempt_id: int, userId: int):
+    quiz = quizzes.current()
+    with get_db() as conn:
+        saved = quiz.progress.get(conn, attempt_id)
+        if saved is None:
+            owner = conn.execute(
+                "SELECT user_id FROM attempts WHERE id = ?", (attempt_id,)
+            ).fetchone()
+            if owner is None or owner[0] != userId:
+                raise HTTPException(status_code=404, detail="Attempt not found")
+            return {"answers": [], "currentIndex": 0, "savedAt": None}
+    if saved.user_id != userId:
+        raise HTTPException(status_code=404, detail="Attempt not found")
+    return {
+        "answers": saved.answers,
+        "currentIndex": saved.current_index,
+        "savedAt": saved.updated_at,
     }
 
 
+@app.get("/metrics")
+def metrics_endpoint():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    metrics.admission_active.set(gate.active)
+    metrics.admission_waiting.set(gate.waiting)
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 @app.get("/")
 def root():
     index = static_dir / "index.html"
@@ -422,45 +1100,168 @@ def root():
     return FileResponse(index)
 
 
+@app.get("/live")
+def live_dashboard():
+    return FileResponse(static_dir / "live.html")
+
+
 @app.get("/api/attempts/status/{user_id}")
 def attempt_status(user_id: int):
+    # counters and scores come from users/user_results; only the open
+    # attempt (if any) is read from attempts, via UNIQUE(user_id, attempt_number)
     with get_db() as conn:
         user_row = conn.execute(
-            "SELECT github_username AS username FROM users WHERE id = ?", (user_id,)
+            "SELECT github_username AS username, attempts_count FROM users WHERE id = ?",
+            (user_id,),
         ).fetchone()
         if user_row is None:
             raise HTTPException(status_code=404, detail="User not found")
 
-        attempts = conn.execute(
+        open_attempt = conn.execute(
             """
-            SELECT id, attempt_number, started_at, finished_at, deadline_at, score, total_questions
-            FROM attempts WHERE user_id = ?
-            ORDER BY attempt_number DESC
+            SELECT id, attempt_number, started_at, deadline_at
+            FROM attempts WHERE user_id = ? AND finished_at IS NULL
+            ORDER BY attempt_number DESC LIMIT 1
             """,
             (user_id,),
-        ).fetchall()
+        ).fetchone()
+        summary = summaries.user_summary(conn, user_id)
 
-    attempts_left_value = attempts_left(user_row["username"], len(attempts))
-    is_lector_flag = is_lector(user_row["username"])
     return {
-        "attempts": [dict(row) for row in attempts],
-        "attemptsLeft": attempts_left_value,
-        "isLector": is_lector_flag,
+        "attemptsUsed": user_row["attempts_count"],
+        "attemptsLeft": attempts_left(user_row["username"], user_row["attempts_count"]),
+        "isLector": is_lector(user_row["username"]),
+        "openAttempt": dict(open_attempt) if open_attempt else None,
+        "summary": summary,
+    }
+
+
+def require_lector(conn: sqlite3.Connection, user_id: int):
+    user_row = conn.execute(
+        "SELECT github_username AS username FROM users WHERE id = ?", (user_id,)
+    ).fetchone()
+    if user_row is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    if not is_lector(user_row["username"]):
+        raise HTTPException(status_code=403, detail="Lector only")
+
+
+@app.get("/api/analytics")
+def analytics(userId: int):
+    quiz = quizzes.current()
+    bank = quiz.banks.current
+    with get_db() as conn:
+        require_lector(conn, userId)
+        matrix = load_responses(conn, list(bank.questions.values()))
+
+    return item_analysis(matrix)
+
+
+def check_lector(user_id: int):
+    with get_db() as conn:
+        require_lector(conn, user_id)
+
+
+@app.get("/api/live")
+async def live_events(userId: int):
+    quiz = quizzes.current()
+    await run_in_threadpool(check_lector, userId)
+
+    async def stream():
+        subscriber, snapshot = quiz.live.subscribe()
+        metrics.live_subscribers.inc()
+        try:
+            yield snapshot
+            while True:
+                try:
+                    frame = await asyncio.wait_for(
+                        subscriber.queue.get(), LIVE_PING_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    # a comment line keeps proxies from closing an idle stream
+                    yield b": ping\n\n"
+                    continue
+                if frame is None:
+                    # cut off (too slow) or shutting down: EventSource reconnects
+                    break
+                yield frame
+        finally:
+            quiz.live.unsubscribe(subscriber)
+            metrics.live_subscribers.dec()
+            if subscriber.dropped:
+                metrics.live_dropped.inc()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/overview")
+def quiz_overview(userId: int, limit: int = LEADERBOARD_SIZE):
+    with get_db() as conn:
+        require_lector(conn, userId)
+        return summaries.overview(conn, max(0, limit), LECTOR)
+
+
+@app.post("/api/profile")
+def arm_profiler(payload: ProfileRequest):
+    with get_db() as conn:
+        require_lector(conn, payload.userId)
+    if payload.count > 0 and payload.route not in {
+        getattr(route, "path", None) for route in app.routes
+    }:
+        raise HTTPException(status_code=400, detail="Unknown route")
+    profiler.arm(payload.route, payload.count)
+    return profiler.status()
+
+
+@app.post("/api/questions/reload")
+def reload_questions(payload: LectorRequest):
+    quiz = quizzes.current()
+    with get_db() as conn:
+        require_lector(conn, payload.userId)
+    try:
+        changed = quiz.banks.reload()
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid quiz file: {exc}")
+    except OSError as exc:
+        raise HTTPException(status_code=400, detail=f"Cannot read quiz file: {exc}")
+
+    bank = quiz.banks.current
+    return {
+        "changed": changed,
+        "version": bank.version,
+        "name": bank.name,
+        "total": len(bank.questions),
     }
 
 
 @app.get("/api/questions/sample")
 def sample_question():
+    quiz = quizzes.current()
+    questions = quiz.banks.current.questions
     return {
-        "topics": list({q["topic"] for q in QUESTIONS.values()}),
-        "total": len(QUESTIONS),
+        "topics": list({q["topic"] for q in questions.values()}),
+        "total": len(questions),
     }
 
 
 @app.get("/api/config")
 def get_config():
+    quiz = quizzes.current()
+    bank = quiz.banks.current
     return {
         "attemptLimit": ATTEMPT_LIMIT,
         "attemptMinutes": ATTEMPT_DURATION_SECONDS // 60,
-        "name": TEST_NAME,
+        "questionsPerAttempt": bank.attempt_size,
+        "questionPageSize": QUESTION_PAGE_SIZE,
+        "name": bank.name,
+        "quiz": quiz.slug or None,
     }
+
+
+@app.get("/api/quizzes")
+def list_quizzes():
+    return {"quizzes": quizzes.available(), "open": len(quizzes)}
@@ -0,0 +1,294 @@
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+DB_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0, 5.0,
+)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            lines.append(
+                f"{self.name}{_format_labels(self.label_names, labels)} {_number(value)}"
+            )
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # per label set: [per-bucket counts..., +Inf count], sum
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str):
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][slot] += 1
+            series[1][0] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = [(k, list(c), s[0]) for k, (c, s) in self._series.items()]
+        names = self.label_names + ("le",)
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(names, labels + (le,))} {cumulative}"
+                )
+            suffix = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{suffix} {_number(total)}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class QuizMetrics:
+    """Metrics of one server process, exposed on ``/metrics``."""
+
+    def __init__(self):
+        self.registry = registry = Registry()
+        self.requests = registry.counter(
+            "quiz_http_requests_total", "HTTP requests by route and status",
+            ("method", "route", "status"),
+        )
+        self.latency = registry.histogram(
+            "quiz_http_request_duration_seconds", "HTTP request latency by route",
+            ("method", "route"),
+        )
+        self.in_flight = registry.gauge(
+            "quiz_http_requests_in_flight", "HTTP requests being served"
+        )
+        self.grading = registry.histogram(
+            "quiz_grading_duration_seconds", "Time spent in evaluate_attempt",
+            buckets=DB_BUCKETS,
+        )
+        self.db_query = registry.histogram(
+            "quiz_db_query_duration_seconds", "SQLite statement execution time",
+            ("statement",), DB_BUCKETS,
+        )
+        self.db_commit = registry.histogram(
+            "quiz_db_commit_duration_seconds", "SQLite COMMIT time", buckets=DB_BUCKETS
+        )
+        self.db_lock_wait = registry.histogram(
+            "quiz_db_lock_wait_seconds",
+            "Time to take the write lock (BEGIN IMMEDIATE/EXCLUSIVE), busy retries included",
+            buckets=DB_BUCKETS,
+        )
+        self.db_busy = registry.counter(
+            "quiz_db_busy_timeouts_total",
+            "Statements that gave up with 'database is locked' after busy_timeout",
+        )
+        self.live_subscribers = registry.gauge(
+            "quiz_live_subscribers", "Open /api/live dashboard streams"
+        )
+        self.live_dropped = registry.counter(
+            "quiz_live_dropped_total",
+            "Dashboard streams cut off for falling QUIZ_LIVE_QUEUE events behind",
+        )
+        self.admission_limit = registry.gauge(
+            "quiz_admission_limit",
+            "Configured admission limits: concurrency, queue, user_rate, user_burst",
+            ("limit",),
+        )
+        self.admission_active = registry.gauge(
+            "quiz_admission_active", "Write requests admitted and being served"
+        )
+        self.admission_waiting = registry.gauge(
+            "quiz_admission_waiting", "Write requests queued for admission"
+        )
+        self.admission_wait = registry.histogram(
+            "quiz_admission_wait_seconds", "Time write requests spent queued for admission"
+        )
+        self.admission_rejected = registry.counter(
+            "quiz_admission_rejected_total",
+            "Requests answered 429 by reason: queue_full, timeout, rate_limited",
+            ("reason",),
+        )
+
+    def render(self) -> str:
+        return self.registry.render()
+
+    def connection_factory(self):
+        """sqlite3.Connection subclass timing every ``execute``."""
+        metrics = self
+
+        class InstrumentedConnection(sqlite3.Connection):
+            def execute(self, sql, *args):
+                started = time.perf_counter()
+                try:
+                    return super().execute(sql, *args)
+                except sqlite3.OperationalError as exc:
+                    if "locked" in str(exc) or "busy" in str(exc):
+                        metrics.db_busy.inc()
+                    raise
+                finally:
+                    metrics.observe_statement(sql, time.perf_counter() - started)
+
+            def executemany(self, sql, *args):
+                started = time.perf_counter()
+                try:
+                    return super().executemany(sql, *args)
+                finally:
+                    metrics.observe_statement(sql, time.perf_counter() - started)
+
+        return InstrumentedConnection
+
+    def observe_statement(self, sql: str, seconds: float):
+        verb = sql.lstrip()[:16].split(None, 1)[0].upper() if sql.strip() else ""
+        if verb in ("COMMIT", "END"):
+            self.db_commit.observe(seconds)
+        elif verb == "BEGIN" and ("IMMEDIATE" in sql or "EXCLUSIVE" in sql):
+            # returns once the write lock is held, busy_timeout retries included
+            self.db_lock_wait.observe(seconds)
+        else:
+            self.db_query.observe(seconds, verb.lower() or "other")
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests and timing them per route template."""
+
+    def __init__(self, app, metrics: QuizMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = self.metrics
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        metrics.in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.in_flight.dec()
+            # templates, not raw paths, keep the label set bounded
+            route = scope.get("route")
+            path = getattr(route, "path", None) or (
+                "static" if scope.get("root_path", "").endswith("/static") else "unmatched"
+            )
+            method = scope["method"]
+            metrics.requests.inc(method, path, str(status[0]))
+            metrics.latency.observe(elapsed, method, path)
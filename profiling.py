@@ -0,0 +1,250 @@
+import os
+import re
+import secrets
+import sys
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from types import FrameType
+from typing import Callable, Dict, Optional, Set
+
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
+
+MODES = ("store", "return")
+
+_active: ContextVar[Optional["Sampler"]] = ContextVar("quiz_profile", default=None)
+
+
+def track_thread():
+    """Let the active request profile sample the calling worker thread.
+
+    Called from ``get_db()``: sync handlers and threadpool work touch the DB
+    first thing, and the profiling context is copied into worker threads.
+    """
+    sampler = _active.get()
+    if sampler is not None:
+        sampler.threads.add(threading.get_ident())
+
+
+def _label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Sampler:
+    """Stack sampler for the threads working on one request.
+
+    The event-loop thread is only counted while the request's own coroutine
+    is on its stack; worker threads are counted once they called
+    ``track_thread()``. Stacks are folded (``a;b;c count``), the format
+    flamegraph.pl, speedscope and inferno read.
+    """
+
+    def __init__(self, interval: float, root: FrameType):
+        self.interval = interval
+        self.loop_thread = threading.get_ident()
+        self.root = root
+        self.threads: Set[int] = {self.loop_thread}
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="quiz-profiler", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        frames = sys._current_frames()
+        self.samples += 1
+        for ident in list(self.threads):
+            frame = frames.get(ident)
+            keep = ident != self.loop_thread
+            stack = []
+            while frame is not None:
+                if frame is self.root:
+                    keep = True
+                stack.append(_label(frame))
+                frame = frame.f_back
+            if keep and stack:
+                thread = "event-loop" if ident == self.loop_thread else "worker"
+                stack.append(thread)
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+class Profiler:
+    """Opt-in request profiling, honoured for the lector or the admin token.
+
+    A request asks for a profile with ``X-Profile: store|return`` (or the
+    ``profile`` query parameter) and proves it may with ``X-Profile-Token``
+    or ``X-Profile-User: <lector userId>``. ``arm()`` profiles the next N
+    requests to a route template without any flag.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        interval_ms: float,
+        token: Optional[str],
+        is_lector_id: Callable[[int], bool],
+    ):
+        self.directory = Path(directory)
+        self.interval = interval_ms / 1000
+        self.token = token
+        self.is_lector_id = is_lector_id
+        self._lock = threading.Lock()
+        self.armed_route: Optional[str] = None
+        self.remaining = 0
+
+    def arm(self, route: str, count: int):
+        with self._lock:
+            self.armed_route = route if count > 0 else None
+            self.remaining = max(0, count)
+
+    def status(self) -> Dict:
+        return {
+            "route": self.armed_route,
+            "remaining": self.remaining,
+            "directory": str(self.directory),
+        }
+
+    def _take_armed(self, scope) -> bool:
+        route = self.armed_route
+        if route is None or _route_path(scope) != route:
+            return False
+        with self._lock:
+            if self.armed_route != route or self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            if self.remaining == 0:
+                self.armed_route = None
+        return True
+
+    async def _authorized(self, headers: Dict[bytes, bytes]) -> bool:
+        token = headers.get(b"x-profile-token")
+        if token and self.token and secrets.compare_digest(
+            token.decode("latin-1"), self.token
+        ):
+            return True
+        user = headers.get(b"x-profile-user", b"")
+        if user.isdigit():
+            return await run_in_threadpool(self.is_lector_id, int(user))
+        return False
+
+    async def mode(self, scope) -> Optional[str]:
+        headers = dict(scope["headers"])
+        mode = headers.get(b"x-profile", b"").decode("latin-1")
+        if not mode and b"profile=" in scope["query_string"]:
+            mode = _query_flag(scope["query_string"].decode("latin-1"))
+        if mode:
+            mode = "store" if mode == "1" else mode
+            if mode in MODES and await self._authorized(headers):
+                return mode
+        if self.armed_route is not None and self._take_armed(scope):
+            return "store"
+        return None
+
+    def report_path(self, scope) -> Path:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%f")
+        route = re.sub(r"[^A-Za-z0-9]+", "-", _route_path(scope) or "unmatched")
+        return self.directory / f"{stamp}-{scope['method']}-{route.strip('-')}.folded"
+
+    def save(self, path: Path, sampler: Sampler):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path.write_text(sampler.folded(), encoding="utf-8")
+
+
+def _query_flag(query: str) -> str:
+    for pair in query.split("&"):
+        name, _, value = pair.partition("=")
+        if name == "profile":
+            return value
+    return ""
+
+
+def _route_path(scope) -> Optional[str]:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # before routing: match the way the router will
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return None
+
+
+class ProfilerMiddleware:
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        mode = await self.profiler.mode(scope)
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        sampler = Sampler(self.profiler.interval, sys._getframe())
+        report = self.profiler.report_path(scope) if mode == "store" else None
+        status = [500]
+
+        async def send_wrapper(message):
+            if mode == "return":
+                # the report replaces the response; keep only the status
+                if message["type"] == "http.response.start":
+                    status[0] = message["status"]
+                return
+            if message["type"] == "http.response.start":
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-report", report.name.encode())
+                ]
+            await send(message)
+
+        token = _active.set(sampler)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            _active.reset(token)
+
+        if report is not None:
+            await run_in_threadpool(self.profiler.save, report, sampler)
+            return
+
+        body = sampler.folded().encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"x-profile-status", str(status[0]).encode()),
+                    (b"x-profile-samples", str(sampler.samples).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,278 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from autosave import ProgressBuffer
+from bank import BankManager
+from db import ConnectionPool
+from live import LiveFeed
+from schema import migrate
+from state_store import StateStore
+from writer import GroupCommitWriter
+
+logger = logging.getLogger("quiz")
+
+SLUG_RE = re.compile(r"[a-z0-9][a-z0-9_-]{0,63}")
+PREFIX = "/q/"
+
+_current: ContextVar[Optional["Quiz"]] = ContextVar("quiz", default=None)
+
+
+class Quiz:
+    """Everything one quiz file needs: its bank, DB pool, writer, autosave buffer and live feed."""
+
+    def __init__(
+        self,
+        slug: str,
+        path: Path,
+        pool: ConnectionPool,
+        writer: GroupCommitWriter,
+        progress: ProgressBuffer,
+        banks: BankManager,
+        state_store: StateStore,
+        live: LiveFeed,
+    ):
+        self.slug = slug
+        self.path = path
+        self.db_path = pool.path
+        self.pool = pool
+        self.writer = writer
+        self.progress = progress
+        self.banks = banks
+        self.state_store = state_store
+        self.live = live
+        self.leases = 0
+        self.last_used = time.monotonic()
+        # attempt id -> submits admitted and not yet answered; changed on the
+        # event loop, the sweeper only checks membership
+        self.submits: "Counter[int]" = Counter()
+
+    def submit_started(self, attempt_id: int):
+        self.submits[attempt_id] += 1
+
+    def submit_finished(self, attempt_id: int):
+        self.submits[attempt_id] -= 1
+        if self.submits[attempt_id] <= 0:
+            del self.submits[attempt_id]
+
+    def connection(self):
+        return self.pool.connection()
+
+    def ensure_schema(self):
+        self.db_path.touch(exist_ok=True)
+        migrate(self.connection())
+        self.banks.persist()
+        self.live.load(self.connection())
+
+    def close(self):
+        self.live.close()
+        try:
+            self.progress.flush()
+        finally:
+            self.writer.close()
+            self.pool.close()
+
+
+QuizFactory = Callable[[str, Path], Quiz]
+
+
+class QuizRegistry:
+    """Quizzes served by one process: the default one plus ``/q/<slug>/`` ones.
+
+    Slugged quizzes are ``<directory>/<slug>.json`` files, opened on first
+    use and kept in an LRU of at most ``max_open`` entries. A quiz is only
+    closed while no request holds a lease on it: when it falls off the LRU
+    or has been idle for ``idle_seconds`` (see ``evict()``).
+    """
+
+    def __init__(
+        self,
+        default: Quiz,
+        directory: Optional[Path],
+        factory: QuizFactory,
+        max_open: int = 16,
+        idle_seconds: float = 900,
+    ):
+        self.default = default
+        self.directory = Path(directory) if directory else None
+        self.factory = factory
+        self.max_open = max_open
+        self.idle = idle_seconds
+        self._open: "OrderedDict[str, Quiz]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+
+    def __len__(self) -> int:
+        return len(self._open)
+
+    def path_for(self, slug: str) -> Optional[Path]:
+        if self.directory is None or not SLUG_RE.fullmatch(slug):
+            return None
+        path = self.directory / f"{slug}.json"
+        return path if path.is_file() else None
+
+    def available(self) -> List[str]:
+        if self.directory is None:
+            return []
+        return sorted(
+            p.stem for p in self.directory.glob("*.json") if SLUG_RE.fullmatch(p.stem)
+        )
+
+    def hold_all(self) -> List[Quiz]:
+        """Every open quiz, held until ``release_all`` but not marked as used.
+
+        For background work: a quiz cannot be closed under it, yet still
+        goes idle when no requests come.
+        """
+        with self._lock:
+            held = [self.default, *self._open.values()]
+            for quiz in held:
+                quiz.leases += 1
+        return held
+
+    def _lease(self, quiz: Quiz) -> Quiz:
+        quiz.leases += 1
+        quiz.last_used = time.monotonic()
+        return quiz
+
+    def acquire(self, slug: str) -> Quiz:
+        """Open (or reuse) a quiz and hold it until ``release``; KeyError if unknown."""
+        with self._lock:
+            quiz = self._open.get(slug)
+            if quiz is not None:
+                self._open.move_to_end(slug)
+                return self._lease(quiz)
+        path = self.path_for(slug)
+        if path is None:
+            raise KeyError(slug)
+        if path.resolve() == self.default.path.resolve():
+            with self._lock:
+                return self._lease(self.default)
+
+        # one loader per slug; other quizzes keep being served meanwhile
+        with self._lock:
+            loading = self._loading.setdefault(slug, threading.Lock())
+        try:
+            with loading:
+                with self._lock:
+                    quiz = self._open.get(slug)
+                    if quiz is not None:
+                        self._open.move_to_end(slug)
+                        return self._lease(quiz)
+                quiz = self.factory(slug, path)
+                quiz.ensure_schema()
+                with self._lock:
+                    self._open[slug] = quiz
+                    self._lease(quiz)
+        finally:
+            with self._lock:
+                self._loading.pop(slug, None)
+        self.evict()
+        return quiz
+
+    def release_all(self, held: List[Quiz]):
+        with self._lock:
+            for quiz in held:
+                quiz.leases -= 1
+
+    def release(self, quiz: Quiz):
+        with self._lock:
+            quiz.leases -= 1
+            quiz.last_used = time.monotonic()
+
+    def evict(self) -> int:
+        """Close idle quizzes and those beyond ``max_open``; returns how many."""
+        cutoff = time.monotonic() - self.idle
+        with self._lock:
+            victims = []
+            excess = len(self._open) - self.max_open
+            # oldest first; leased quizzes stay open even past the limit
+            for slug, quiz in list(self._open.items()):
+                if quiz.leases:
+                    continue
+                if excess > 0 or quiz.last_used < cutoff:
+                    victims.append(self._open.pop(slug))
+                    excess -= 1
+        for quiz in victims:
+            try:
+                quiz.close()
+            except Exception:
+                logger.exception("Closing quiz %s failed", quiz.slug)
+        return len(victims)
+
+    def close(self):
+        with self._lock:
+            quizzes, self._open = [*self._open.values(), self.default], OrderedDict()
+        for quiz in quizzes:
+            quiz.close()
+
+    def current(self) -> Quiz:
+        """The quiz of the request being served (the default one outside ``/q/``)."""
+        return _current.get() or self.default
+
+    @asynccontextmanager
+    async def use(self, slug: str) -> AsyncIterator[Quiz]:
+        """Serve the enclosed code (and the threads it spawns) from quiz ``slug``."""
+        quiz = await run_in_threadpool(self.acquire, slug)
+        token = _current.set(quiz)
+        try:
+            yield quiz
+        finally:
+            _current.reset(token)
+            self.release(quiz)
+
+
+class QuizMiddleware:
+    """Route ``/q/<slug>/...`` to quiz ``slug``.
+
+    The prefix moves into ``root_path``, so the usual routes match and
+    ``url_for`` keeps it. Must be the outermost middleware: the others
+    then see the quiz-relative route templates.
+    """
+
+    def __init__(self, app, registry: QuizRegistry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith(PREFIX):
+            await self.app(scope, receive, send)
+            return
+        slug = path[len(PREFIX):].partition("/")[0]
+        try:
+            quiz = await run_in_threadpool(self.registry.acquire, slug)
+        except KeyError:
+            body = b'{"detail":"Quiz not found"}'
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 404,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode()),
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        prefix = PREFIX + slug
+        scope = dict(scope, root_path=scope.get("root_path", "") + prefix)
+        if path == prefix:
+            # /q/<slug> serves the index like /q/<slug>/
+            scope["path"] = prefix + "/"
+        token = _current.set(quiz)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
+            self.registry.release(quiz)
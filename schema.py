@@ -0,0 +1,375 @@
+import secrets
+import sqlite3
+from typing import Callable, List
+
+import codec
+from bank import QuestionBank
+from db import transaction
+from summaries import rebuild as rebuild_summaries
+
+BASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    github_username TEXT UNIQUE NOT NULL,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    attempt_number INTEGER NOT NULL,
+    started_at TEXT NOT NULL,
+    deadline_at TEXT NOT NULL,
+    finished_at TEXT,
+    score INTEGER,
+    total_questions INTEGER,
+    answers_json TEXT,
+    option_mapping_json TEXT NOT NULL,
+    incorrect_json TEXT,
+    FOREIGN KEY (user_id) REFERENCES users (id)
+);
+"""
+
+
+def rebuild_table(conn: sqlite3.Connection, name: str, ddl: str, copy_sql: str):
+    # SQLite cannot add table constraints in place: copy into a new table and swap
+    conn.execute(f"DROP TABLE IF EXISTS {name}_new")
+    conn.execute(ddl.format(name=f"{name}_new"))
+    conn.execute(f"INSERT INTO {name}_new {copy_sql}")
+    conn.execute(f"DROP TABLE {name}")
+    conn.execute(f"ALTER TABLE {name}_new RENAME TO {name}")
+
+
+def _attempt_counter(conn: sqlite3.Connection):
+    # renumber legacy duplicates left by the old COUNT(*)+1 race
+    rebuild_table(
+        conn,
+        "attempts",
+        """
+        CREATE TABLE {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            attempt_number INTEGER NOT NULL,
+            started_at TEXT NOT NULL,
+            deadline_at TEXT NOT NULL,
+            finished_at TEXT,
+            score INTEGER,
+            total_questions INTEGER,
+            answers_json TEXT,
+            option_mapping_json TEXT NOT NULL,
+            incorrect_json TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            UNIQUE (user_id, attempt_number)
+        )
+        """,
+        """
+        SELECT
+            id,
+            user_id,
+            ROW_NUMBER() OVER (
+                PARTITION BY user_id ORDER BY attempt_number, started_at, id
+            ),
+            started_at,
+            deadline_at,
+            finished_at,
+            score,
+            total_questions,
+            answers_json,
+            option_mapping_json,
+            incorrect_json
+        FROM attempts
+        """,
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_attempts_number_started "
+        "ON attempts (attempt_number, started_at)"
+    )
+    conn.execute(
+        "ALTER TABLE users ADD COLUMN attempts_count INTEGER NOT NULL DEFAULT 0"
+    )
+    conn.execute(
+        """
+        UPDATE users SET attempts_count = (
+            SELECT COUNT(*) FROM attempts WHERE attempts.user_id = users.id
+        )
+        """
+    )
+
+
+def _finished_index(conn: sqlite3.Connection):
+    # incremental exports read attempts finished since a watermark
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_attempts_finished ON attempts (finished_at)"
+    )
+
+
+def _seeded_options(conn: sqlite3.Connection):
+    # seeded attempts store (option_seed, bank_version) instead of the
+    # permutation JSON, so option_mapping_json becomes nullable
+    rebuild_table(
+        conn,
+        "attempts",
+        """
+        CREATE TABLE {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            attempt_number INTEGER NOT NULL,
+            started_at TEXT NOT NULL,
+            deadline_at TEXT NOT NULL,
+            finished_at TEXT,
+            score INTEGER,
+            total_questions INTEGER,
+            answers_json TEXT,
+            option_mapping_json TEXT,
+            incorrect_json TEXT,
+            option_seed INTEGER,
+            bank_version TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            UNIQUE (user_id, attempt_number)
+        )
+        """,
+        """
+        SELECT
+            id,
+            user_id,
+            attempt_number,
+            started_at,
+            deadline_at,
+            finished_at,
+            score,
+            total_questions,
+            answers_json,
+            option_mapping_json,
+            incorrect_json,
+            NULL,
+            NULL
+        FROM attempts
+        """,
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_attempts_number_started "
+        "ON attempts (attempt_number, started_at)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_attempts_finished ON attempts (finished_at)"
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS question_banks (
+            version TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+
+
+def _oauth_states(conn: sqlite3.Connection):
+    # pending logins shared by all uvicorn workers (state_store.SQLiteStateStore)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS oauth_states (
+            state TEXT PRIMARY KEY,
+            expires_at REAL NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_oauth_states_expires "
+        "ON oauth_states (expires_at)"
+    )
+
+
+def _attempt_progress(conn: sqlite3.Connection):
+    # autosaved answers of unfinished attempts, flushed by autosave.ProgressBuffer
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS attempt_progress (
+            attempt_id INTEGER PRIMARY KEY,
+            answers_json TEXT NOT NULL,
+            current_index INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY (attempt_id) REFERENCES attempts (id)
+        )
+        """
+    )
+
+
+def _result_summaries(conn: sqlite3.Connection):
+    # maintained by summaries.record() in the submit transaction
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_results (
+            user_id INTEGER PRIMARY KEY,
+            attempts_finished INTEGER NOT NULL,
+            best_score INTEGER NOT NULL,
+            best_total INTEGER NOT NULL,
+            best_percent REAL NOT NULL,
+            best_at TEXT NOT NULL,
+            last_score INTEGER NOT NULL,
+            last_total INTEGER NOT NULL,
+            last_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_user_results_best "
+        "ON user_results (best_percent DESC, best_at)"
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS quiz_results (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            attempts INTEGER NOT NULL,
+            score_sum INTEGER NOT NULL,
+            total_sum INTEGER NOT NULL,
+            percent_sum REAL NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS score_histogram (
+            bucket INTEGER PRIMARY KEY,
+            attempts INTEGER NOT NULL
+        )
+        """
+    )
+    rebuild_summaries(conn)
+
+
+def _attempt_answers(conn: sqlite3.Connection):
+    # one row per presented question of a finished attempt; selected_mask
+    # holds original option indexes, so readers need no shuffle to decode it
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS attempt_answers (
+            attempt_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            selected_mask INTEGER NOT NULL,
+            is_correct INTEGER NOT NULL,
+            PRIMARY KEY (attempt_id, question_id),
+            FOREIGN KEY (attempt_id) REFERENCES attempts (id)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_attempt_answers_question "
+        "ON attempt_answers (question_id, is_correct)"
+    )
+
+    # backfill from the blobs: correctness is taken from incorrect_json as
+    # graded at the time, options are unshuffled with the attempt's mapping
+    banks = {}
+
+    def option_mapping(row):
+        if row["option_mapping_json"]:
+            return codec.loads(row["option_mapping_json"])
+        version = row["bank_version"]
+        if version not in banks:
+            source = conn.execute(
+                "SELECT source FROM question_banks WHERE version = ?", (version,)
+            ).fetchone()
+            banks[version] = QuestionBank(source[0]) if source else None
+        bank = banks[version]
+        return bank.permutations(row["option_seed"]) if bank else None
+
+    done = []
+    rows = conn.execute(
+        """
+        SELECT id, answers_json, incorrect_json, option_mapping_json,
+               option_seed, bank_version
+        FROM attempts
+        WHERE finished_at IS NOT NULL
+        """
+    ).fetchall()
+    for row in rows:
+        mapping = option_mapping(row)
+        if mapping is None:
+            continue  # bank version lost: keep the blobs
+        wrong = {int(item["id"]) for item in codec.loads(row["incorrect_json"] or "[]")}
+        selected = {
+            int(item["questionId"]): item["selectedIndexes"]
+            for item in codec.loads(row["answers_json"] or "[]")
+        }
+        answers = []
+        for qid, order in mapping.items():
+            if not order:
+                continue
+            qid = int(qid)
+            mask = 0
+            for idx in selected.get(qid, ()):
+                if 0 <= idx < len(order):
+                    mask |= 1 << order[idx]
+            answers.append((row["id"], qid, mask, int(qid not in wrong)))
+        conn.executemany(
+            "INSERT OR REPLACE INTO attempt_answers VALUES (?, ?, ?, ?)", answers
+        )
+        done.append((row["id"],))
+    conn.executemany(
+        "UPDATE attempts SET answers_json = NULL, incorrect_json = NULL WHERE id = ?",
+        done,
+    )
+
+
+def _deadline_index(conn: sqlite3.Connection):
+    # (finished_at, deadline_at) serves both the export watermark and the
+    # sweeper's "finished_at IS NULL AND deadline_at <= now" range, so it
+    # replaces the finished_at-only index instead of competing with it
+    conn.execute("DROP INDEX IF EXISTS idx_attempts_finished")
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_attempts_finished_deadline
+        ON attempts (finished_at, deadline_at)
+        """
+    )
+
+
+def _database_id(conn: sqlite3.Connection):
+    # random per DB file: a cache built from one (the export snapshot) can
+    # tell it was deleted and recreated, which restarts attempt ids
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS quiz_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO quiz_meta VALUES ('database_id', ?)",
+        (secrets.token_hex(16),),
+    )
+
+
+# index + 1 is the PRAGMA user_version the migration upgrades to
+MIGRATIONS: List[Callable[[sqlite3.Connection], None]] = [
+    _attempt_counter,
+    _finished_index,
+    _seeded_options,
+    _oauth_states,
+    _attempt_progress,
+    _result_summaries,
+    _attempt_answers,
+    _deadline_index,
+    _database_id,
+]
+
+
+def database_id(conn: sqlite3.Connection) -> str:
+    return conn.execute(
+        "SELECT value FROM quiz_meta WHERE key = 'database_id'"
+    ).fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection):
+    conn.executescript(BASE_SCHEMA)
+    for version, step in enumerate(MIGRATIONS, start=1):
+        # re-check under the write lock: several workers may start at once
+        with transaction(conn, "IMMEDIATE"):
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            if current >= version:
+                continue
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
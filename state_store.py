@@ -0,0 +1,124 @@
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable
+
+
+class StateStore(ABC):
+    """Pending OAuth ``state`` values, each valid once until its TTL runs out."""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl = ttl_seconds
+
+    @abstractmethod
+    def issue(self, state: str):
+        """Remember ``state`` until the TTL runs out."""
+
+    @abstractmethod
+    def consume(self, state: str) -> bool:
+        """Remove ``state``; True if it was issued and has not expired."""
+
+    @abstractmethod
+    def purge(self) -> int:
+        """Drop expired states, returns how many were removed."""
+
+
+class MemoryStateStore(StateStore):
+    """Process-local store; only correct with a single worker.
+
+    Every state gets the same TTL, so insertion order is expiry order and
+    expired entries are popped from the front of an OrderedDict: purge
+    touches only what actually expired.
+    """
+
+    def __init__(self, ttl_seconds: float, clock: Callable[[], float] = time.monotonic):
+        super().__init__(ttl_seconds)
+        self.clock = clock
+        self._expires: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    def _purge(self, now: float) -> int:
+        expires = self._expires
+        removed = 0
+        while expires:
+            state, deadline = next(iter(expires.items()))
+            if deadline > now:
+                break
+            del expires[state]
+            removed += 1
+        return removed
+
+    def issue(self, state: str):
+        now = self.clock()
+        with self._lock:
+            self._purge(now)
+            self._expires[state] = now + self.ttl
+
+    def consume(self, state: str) -> bool:
+        now = self.clock()
+        with self._lock:
+            deadline = self._expires.pop(state, None)
+        return deadline is not None and deadline > now
+
+    def purge(self) -> int:
+        with self._lock:
+            return self._purge(self.clock())
+
+
+class SQLiteStateStore(StateStore):
+    """States in the quiz DB's ``oauth_states`` table, shared by all workers.
+
+    Expiry is a range delete over ``idx_oauth_states_expires``; consume is a
+    single ``DELETE ... RETURNING``, so a state is accepted at most once even
+    when two workers race on it.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], sqlite3.Connection],
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.time,
+    ):
+        super().__init__(ttl_seconds)
+        self.connect = connect
+        # wall clock: deadlines are compared across processes
+        self.clock = clock
+
+    def issue(self, state: str):
+        now = self.clock()
+        conn = self.connect()
+        self._purge(conn, now)
+        conn.execute(
+            "INSERT OR REPLACE INTO oauth_states (state, expires_at) VALUES (?, ?)",
+            (state, now + self.ttl),
+        )
+
+    def consume(self, state: str) -> bool:
+        rows = self.connect().execute(
+            "DELETE FROM oauth_states WHERE state = ? RETURNING expires_at",
+            (state,),
+        ).fetchall()
+        return bool(rows) and rows[0][0] > self.clock()
+
+    def _purge(self, conn: sqlite3.Connection, now: float) -> int:
+        return conn.execute(
+            "DELETE FROM oauth_states WHERE expires_at <= ?", (now,)
+        ).rowcount
+
+    def purge(self) -> int:
+        return self._purge(self.connect(), self.clock())
+
+
+def make_state_store(
+    kind: str, connect: Callable[[], sqlite3.Connection], ttl_seconds: float
+) -> StateStore:
+    if kind == "memory":
+        return MemoryStateStore(ttl_seconds)
+    if kind == "sqlite":
+        return SQLiteStateStore(connect, ttl_seconds)
+    raise ValueError(f"Unknown state store {kind!r} (expected 'memory' or 'sqlite')")
@@ -1,4 +1,6 @@
-const apiBase = ''
+// квиз из QUIZ_DIR открывается по /q/<slug>/ — API и localStorage у него свои
+const apiBase = (location.pathname.match(/^\/q\/[^/]+/) || [''])[0]
+const USER_KEY = `quizUser${apiBase}`
 const oauthButton = document.getElementById('oauthButton')
 const statusUser = document.getElementById('statusUser')
 const statusAttempts = document.getElementById('statusAttempts')
@@ -22,6 +24,7 @@ const quizScreen = document.getElementById('quizScreen')
 const logoutButton = document.getElementById('logoutButton')
 const logoutButtonTop = document.getElementById('logoutButtonTop')
 const questionProgress = document.getElementById('questionProgress')
+const liveLink = document.getElementById('liveLink')
 
 const state = {
   config: {
@@ -33,6 +36,7 @@ const state = {
   timer: null,
   deadline: null,
   questions: [],
+  totalQuestions: 0,
   answers: {},
   currentIndex: 0,
 }
@@ -48,9 +52,12 @@ function updateLimitTexts() {
   if (attemptLimitHint) attemptLimitHint.textContent = label
 }
 
-const ACTIVE_ATTEMPT_KEY = 'quizActiveAttempt'
+const ACTIVE_ATTEMPT_KEY = `quizActiveAttempt${apiBase}`
+// автосейв на сервер: не чаще одного PUT за это время
+const PROGRESS_SYNC_MS = 800
+let progressTimer = null
 
-const savedUser = localStorage.getItem('quizUser')
+const savedUser = localStorage.getItem(USER_KEY)
 if (savedUser) {
   state.user = JSON.parse(savedUser)
   updateAuthUI()
@@ -72,7 +79,7 @@ window.addEventListener('message', event => {
   if (!event.data || event.data.type !== 'github-auth') return
   const payload = event.data.payload
   state.user = payload
-  localStorage.setItem('quizUser', JSON.stringify(payload))
+  localStorage.setItem(USER_KEY, JSON.stringify(payload))
   showStatus(`Привет, ${payload.username}!`, payload.attemptsLeft)
   updateAuthUI()
   updateLimitTexts()
@@ -99,9 +106,21 @@ async function loadConfig() {
   }
 }
 
+// сервер занят (429): ждём, сколько просит Retry-After, и повторяем — не чаще
+const MAX_BUSY_RETRIES = 5
+
+async function fetchAdmitted(url, options) {
+  for (let retry = 0; ; retry++) {
+    const res = await fetch(url, options)
+    if (res.status !== 429 || retry >= MAX_BUSY_RETRIES) return res
+    const seconds = Number(res.headers.get('Retry-After')) || 1
+    await new Promise(resolve => setTimeout(resolve, seconds * 1000))
+  }
+}
+
 async function startOAuth() {
   try {
-    const res = await fetch(`${apiBase}/api/auth/github/login`)
+    const res = await fetchAdmitted(`${apiBase}/api/auth/github/login`)
     if (!res.ok) throw new Error(await res.text())
     const data = await res.json()
     updateAuthUI()
@@ -115,15 +134,27 @@ async function startOAuth() {
 async function refreshStatus() {
   if (!state.user) return
   try {
-    const res = await fetch(`/api/attempts/status/${state.user.userId}`)
+    const res = await fetch(`${apiBase}/api/attempts/status/${state.user.userId}`)
     if (res.ok) {
       const data = await res.json()
       state.user.attemptsLeft = data.attemptsLeft
       if (typeof data.isLector !== 'undefined') {
         state.user.isLector = data.isLector
       }
-      localStorage.setItem('quizUser', JSON.stringify(state.user))
+      localStorage.setItem(USER_KEY, JSON.stringify(state.user))
       showStatus(`Привет, ${state.user.username}!`, data.attemptsLeft)
+      // незавершённая попытка, начатая на другом устройстве
+      const open = data.openAttempt
+      if (open && new Date(open.deadline_at) > new Date() && !state.attempt && !localStorage.getItem(ACTIVE_ATTEMPT_KEY)) {
+        localStorage.setItem(
+          ACTIVE_ATTEMPT_KEY,
+          JSON.stringify({
+            attempt: { attemptId: open.id },
+            userId: state.user.userId,
+          })
+        )
+        restoreActiveAttempt()
+      }
     } else if (res.status === 404) {
       clearUser()
       showStatus('Не залогинен', '—')
@@ -142,8 +173,10 @@ async function startAttempt() {
     return
   }
   stopTimer()
+  // второй клик, пока ждём ответа, не создаёт вторую попытку
+  startButton.disabled = true
   try {
-    const res = await fetch(`${apiBase}/api/attempts/start`, {
+    const res = await fetchAdmitted(`${apiBase}/api/attempts/start`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({ userId: state.user.userId }),
@@ -160,6 +193,7 @@ async function startAttempt() {
     const data = await res.json()
     state.attempt = data
     state.questions = data.questions || []
+    state.totalQuestions = data.totalQuestions ?? state.questions.length
     state.answers = {}
     state.currentIndex = 0
     state.deadline = new Date(data.deadline)
@@ -173,6 +207,7 @@ async function startAttempt() {
     saveActiveAttempt()
   } catch (err) {
     console.error(err)
+    startButton.disabled = false
     alert('Не удалось начать попытку: ' + err.message)
   }
 }
@@ -185,7 +220,7 @@ function renderCurrentQuestion() {
   }
   const q = state.questions[state.currentIndex]
   questionProgress.textContent = `Вопрос: ${state.currentIndex + 1} / ${
-    state.questions.length
+    state.totalQuestions
   }`
   questionsContainer.innerHTML = ''
   const node = questionTemplate.content.cloneNode(true)
@@ -243,17 +278,16 @@ function gatherAnswers() {
 async function submitAttempt(auto) {
   if (!state.attempt || !state.user) return
   const answers = gatherAnswers()
-  const unanswered = (state.questions || []).filter(
-    q => !answers.find(a => a.questionId === q.id)
-  )
-  if (!auto && unanswered.length) {
+  // вопросы могут приходить страницами: считаем по общему числу
+  const unanswered = state.totalQuestions - answers.length
+  if (!auto && unanswered > 0) {
     alert(
-      `Осталось неотвеченных вопросов: ${unanswered.length}. Заполни всё и отправь.`
+      `Осталось неотвеченных вопросов: ${unanswered}. Заполни всё и отправь.`
     )
     return
   }
   try {
-    const res = await fetch(
+    const res = await fetchAdmitted(
       `${apiBase}/api/attempts/${state.attempt.attemptId}/submit`,
       {
         method: 'POST',
@@ -265,7 +299,7 @@ async function submitAttempt(auto) {
     const data = await res.json()
     showResults(data)
     state.user.attemptsLeft = data.attemptsLeft
-    localStorage.setItem('quizUser', JSON.stringify(state.user))
+    localStorage.setItem(USER_KEY, JSON.stringify(state.user))
     stopTimer()
     startButton.disabled = state.user.attemptsLeft <= 0
     submitButton.disabled = true
@@ -296,8 +330,9 @@ function clearUser() {
   state.answers = {}
   state.attempt = null
   state.questions = []
+  state.totalQuestions = 0
   state.currentIndex = 0
-  localStorage.removeItem('quizUser')
+  localStorage.removeItem(USER_KEY)
   clearActiveAttempt()
   updateAuthUI()
   startButton.disabled = true
@@ -317,6 +352,10 @@ function updateAuthUI() {
     quizScreen?.classList.remove('hidden')
     logoutButton?.classList.remove('hidden')
     logoutButtonTop?.classList.remove('hidden')
+    if (liveLink) {
+      liveLink.href = `${apiBase}/live`
+      liveLink.classList.toggle('hidden', !state.user.isLector)
+    }
   } else {
     if (oauthBlock) {
       oauthBlock.style.display = 'block'
@@ -327,6 +366,7 @@ function updateAuthUI() {
     quizScreen?.classList.add('hidden')
     logoutButton?.classList.add('hidden')
     logoutButtonTop?.classList.add('hidden')
+    liveLink?.classList.add('hidden')
     startButton.disabled = true
     submitButton.disabled = true
     stopTimer()
@@ -413,18 +453,45 @@ function saveActiveAttempt() {
       attemptNumber: state.attempt.attemptNumber,
       deadline: state.deadline?.toISOString(),
     },
-    questions: state.questions,
     answers: state.answers,
     currentIndex: state.currentIndex,
+    savedAt: new Date().toISOString(),
     userId: state.user?.userId,
   }
   localStorage.setItem(ACTIVE_ATTEMPT_KEY, JSON.stringify(payload))
+  scheduleProgressSync()
 }
 
 function clearActiveAttempt() {
+  clearTimeout(progressTimer)
+  progressTimer = null
   localStorage.removeItem(ACTIVE_ATTEMPT_KEY)
 }
 
+function scheduleProgressSync() {
+  clearTimeout(progressTimer)
+  progressTimer = setTimeout(syncProgress, PROGRESS_SYNC_MS)
+}
+
+async function syncProgress() {
+  progressTimer = null
+  if (!state.attempt || !state.user) return
+  try {
+    await fetch(`${apiBase}/api/attempts/${state.attempt.attemptId}/progress`, {
+      method: 'PUT',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        userId: state.user.userId,
+        answers: gatherAnswers(),
+        currentIndex: state.currentIndex,
+      }),
+    })
+  } catch (err) {
+    // локальная копия остаётся, следующий клик повторит попытку
+    console.error('syncProgress', err)
+  }
+}
+
 async function restoreActiveAttempt() {
   const raw = localStorage.getItem(ACTIVE_ATTEMPT_KEY)
   if (!raw) return
@@ -434,38 +501,48 @@ async function restoreActiveAttempt() {
       clearActiveAttempt()
       return
     }
-    if (!data.attempt || !data.questions) return
-    const deadline = data.attempt.deadline
-      ? new Date(data.attempt.deadline)
-      : null
-    if (deadline && deadline < new Date()) {
+    if (!data.attempt) return
+    // вопросы и автосейв приходят с сервера; повторный запрос браузер
+    // ревалидирует по ETag и получает 304
+    const res = await fetch(
+      `${apiBase}/api/attempts/${data.attempt.attemptId}?userId=${state.user.userId}`,
+      { cache: 'no-cache' }
+    )
+    if (!res.ok) {
       clearActiveAttempt()
       return
     }
-    // проверить, что попытка ещё есть в БД и пользователь существует
-    const statusRes = await fetch(`/api/attempts/status/${state.user.userId}`)
-    if (!statusRes.ok) {
-      clearUser()
-      return
-    }
-    const statusData = await statusRes.json()
-    const exists = (statusData.attempts || []).some(
-      a => a.id === data.attempt.attemptId
-    )
-    if (!exists) {
-      clearUser()
+    const attempt = await res.json()
+    const deadline = new Date(attempt.deadline)
+    if (deadline < new Date()) {
+      clearActiveAttempt()
       return
     }
 
     state.attempt = {
-      attemptId: data.attempt.attemptId,
-      attemptNumber: data.attempt.attemptNumber,
+      attemptId: attempt.attemptId,
+      attemptNumber: attempt.attemptNumber,
+    }
+    state.questions = attempt.questions
+    state.totalQuestions = attempt.totalQuestions ?? attempt.questions.length
+    // берём более свежую копию: локальную или сохранённую на сервере (с другого устройства)
+    const server = attempt.progress
+    const localIsNewer =
+      data.savedAt &&
+      (!server.savedAt || new Date(data.savedAt) >= new Date(server.savedAt))
+    if (localIsNewer) {
+      state.answers = data.answers || {}
+      state.currentIndex = data.currentIndex || 0
+    } else {
+      state.answers = {}
+      server.answers.forEach(a => {
+        state.answers[a.questionId] = a.selectedIndexes
+      })
+      state.currentIndex = server.currentIndex
     }
-    state.questions = data.questions
-    state.answers = data.answers || {}
-    state.currentIndex = data.currentIndex || 0
     state.deadline = deadline
     attemptBadge.textContent = `Попытка: ${state.attempt.attemptNumber} из ${state.config.attemptLimit}`
+    await ensureQuestion(state.currentIndex)
     renderCurrentQuestion()
     if (deadline) renderTimer(deadline)
     submitButton.disabled = false
@@ -478,7 +555,20 @@ async function restoreActiveAttempt() {
   }
 }
 
-function handleAdvance() {
+async function ensureQuestion(index) {
+  // при QUIZ_QUESTION_PAGE_SIZE > 0 вопросы догружаются страницами
+  while (state.attempt && state.questions.length <= index) {
+    const res = await fetch(
+      `${apiBase}/api/attempts/${state.attempt.attemptId}/questions?userId=${state.user.userId}&offset=${state.questions.length}`
+    )
+    if (!res.ok) throw new Error(await res.text())
+    const page = await res.json()
+    if (!page.questions.length) break
+    state.questions = state.questions.concat(page.questions)
+  }
+}
+
+async function handleAdvance() {
   if (!state.attempt) return
   if (!state.questions.length) return
   const q = state.questions[state.currentIndex]
@@ -487,10 +577,17 @@ function handleAdvance() {
     alert('Выбери ответ, прежде чем идти дальше.')
     return
   }
-  const isLast = state.currentIndex >= state.questions.length - 1
+  const isLast = state.currentIndex >= state.totalQuestions - 1
   if (isLast) {
     submitAttempt(false)
   } else {
+    try {
+      await ensureQuestion(state.currentIndex + 1)
+    } catch (err) {
+      console.error(err)
+      alert('Не удалось загрузить вопрос: ' + err.message)
+      return
+    }
     state.currentIndex += 1
     renderCurrentQuestion()
     saveActiveAttempt()
@@ -503,7 +600,7 @@ function updateNavButton() {
     submitButton.disabled = true
     return
   }
-  const isLast = state.currentIndex >= state.questions.length - 1
+  const isLast = state.currentIndex >= state.totalQuestions - 1
   submitButton.textContent = isLast ? 'Отправить' : 'Далее'
   const q = state.questions[state.currentIndex]
   const answered = state.answers[q.id] && state.answers[q.id].length
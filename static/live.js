@@ -0,0 +1,118 @@
+// дашборд лектора: одно SSE-соединение, сервер сам присылает события попыток
+const apiBase = (location.pathname.match(/^\/q\/[^/]+/) || [''])[0]
+const USER_KEY = `quizUser${apiBase}`
+const liveStatus = document.getElementById('liveStatus')
+const openAttemptsBox = document.getElementById('openAttempts')
+const submissionsBox = document.getElementById('submissions')
+const backLink = document.getElementById('backLink')
+const statEls = {
+  active: document.getElementById('statActive'),
+  submitted: document.getElementById('statSubmitted'),
+  meanScore: document.getElementById('statMeanScore'),
+  meanPercent: document.getElementById('statMeanPercent'),
+}
+
+// сколько последних сдач держать в ленте
+const FEED_SIZE = 30
+
+const attempts = new Map()
+const submissions = []
+
+backLink.href = `${apiBase}/`
+
+const user = JSON.parse(localStorage.getItem(USER_KEY) || 'null')
+if (!user || !user.isLector) {
+  liveStatus.textContent = 'Только для лектора: войди через GitHub на странице теста.'
+} else {
+  connect()
+}
+
+function connect() {
+  const source = new EventSource(`${apiBase}/api/live?userId=${user.userId}`)
+  source.addEventListener('open', () => {
+    liveStatus.textContent = `На связи как ${user.username}`
+  })
+  // после обрыва (в том числе если не успевали читать) EventSource
+  // переподключается сам и получает свежий snapshot
+  source.addEventListener('error', () => {
+    liveStatus.textContent = 'Соединение потеряно, переподключаемся…'
+  })
+  source.addEventListener('snapshot', event => {
+    const data = JSON.parse(event.data)
+    attempts.clear()
+    data.attempts.forEach(a => attempts.set(a.attemptId, a))
+    renderStats(data.stats)
+    renderAttempts()
+  })
+  source.addEventListener('started', event => {
+    const data = JSON.parse(event.data)
+    attempts.set(data.attemptId, data)
+    renderStats(data.stats)
+    renderAttempts(data.attemptId)
+  })
+  source.addEventListener('progress', event => {
+    const data = JSON.parse(event.data)
+    const attempt = attempts.get(data.attemptId)
+    if (attempt) {
+      attempt.answered = data.answered
+    }
+    renderStats(data.stats)
+    renderAttempts(data.attemptId)
+  })
+  source.addEventListener('submitted', event => {
+    const data = JSON.parse(event.data)
+    attempts.delete(data.attemptId)
+    data.at = new Date().toLocaleTimeString()
+    submissions.unshift(data)
+    submissions.length = Math.min(submissions.length, FEED_SIZE)
+    renderStats(data.stats)
+    renderAttempts()
+    renderSubmissions()
+  })
+}
+
+function renderStats(stats) {
+  statEls.active.textContent = stats.active
+  statEls.submitted.textContent = stats.submitted
+  statEls.meanScore.textContent = stats.meanScore ?? '—'
+  statEls.meanPercent.textContent =
+    stats.meanPercent === null ? '—' : `${stats.meanPercent}%`
+}
+
+function row(cells, fresh) {
+  const el = document.createElement('div')
+  el.className = fresh ? 'live-row fresh' : 'live-row'
+  cells.forEach(text => {
+    const cell = document.createElement('span')
+    cell.textContent = text
+    el.appendChild(cell)
+  })
+  return el
+}
+
+function renderAttempts(freshId) {
+  openAttemptsBox.innerHTML = ''
+  if (!attempts.size) {
+    openAttemptsBox.innerHTML = '<p class="muted">Пока никто не решает.</p>'
+    return
+  }
+  const now = Date.now()
+  attempts.forEach(a => {
+    const left = Math.max(0, Math.round((new Date(a.deadline) - now) / 60000))
+    openAttemptsBox.appendChild(
+      row(
+        [a.username, `ответов: ${a.answered}`, `осталось ${left} мин`],
+        a.attemptId === freshId
+      )
+    )
+  })
+}
+
+function renderSubmissions() {
+  submissionsBox.innerHTML = ''
+  submissions.forEach((s, i) => {
+    submissionsBox.appendChild(
+      row([s.username || `#${s.userId}`, `${s.score} / ${s.total}`, s.at], i === 0)
+    )
+  })
+}
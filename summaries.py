@@ -0,0 +1,224 @@
+"""Per-user and per-quiz result summaries kept next to the attempts.
+
+``record()`` runs inside the submit transaction, so the summaries never
+disagree with ``attempts``; ``rebuild()`` recomputes them from scratch for
+DBs that predate the tables or were edited by hand:
+
+    uv run python summaries.py --db test.db
+"""
+
+import argparse
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+from analytics import HISTOGRAM_BINS
+from db import connect, transaction
+
+BASE_DIR = Path(__file__).resolve().parent
+
+
+def bucket(score: int, total: int) -> int:
+    # same bins as analytics.item_analysis: [0, 10), ..., [90, 100]
+    return min(score * HISTOGRAM_BINS // total, HISTOGRAM_BINS - 1)
+
+
+def record(
+    conn: sqlite3.Connection, user_id: int, score: int, total: int, finished_at: str
+):
+    """Fold one finished attempt into the summaries."""
+    if not total:
+        return
+    percent = score / total * 100
+    # the SET expressions see the old row, so best/last compare against it
+    conn.execute(
+        """
+        INSERT INTO user_results (
+            user_id, attempts_finished, best_score, best_total, best_percent,
+            best_at, last_score, last_total, last_at
+        ) VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            attempts_finished = attempts_finished + 1,
+            best_score = CASE WHEN excluded.best_percent > best_percent
+                THEN excluded.best_score ELSE best_score END,
+            best_total = CASE WHEN excluded.best_percent > best_percent
+                THEN excluded.best_total ELSE best_total END,
+            best_at = CASE WHEN excluded.best_percent > best_percent
+                THEN excluded.best_at ELSE best_at END,
+            best_percent = MAX(best_percent, excluded.best_percent),
+            last_score = CASE WHEN excluded.last_at >= last_at
+                THEN excluded.last_score ELSE last_score END,
+            last_total = CASE WHEN excluded.last_at >= last_at
+                THEN excluded.last_total ELSE last_total END,
+            last_at = MAX(last_at, excluded.last_at)
+        """,
+        (user_id, score, total, percent, finished_at, score, total, finished_at),
+    )
+    conn.execute(
+        """
+        INSERT INTO quiz_results (id, attempts, score_sum, total_sum, percent_sum)
+        VALUES (1, 1, ?, ?, ?)
+        ON CONFLICT (id) DO UPDATE SET
+            attempts = attempts + 1,
+            score_sum = score_sum + excluded.score_sum,
+            total_sum = total_sum + excluded.total_sum,
+            percent_sum = percent_sum + excluded.percent_sum
+        """,
+        (score, total, percent),
+    )
+    conn.execute(
+        """
+        INSERT INTO score_histogram (bucket, attempts) VALUES (?, 1)
+        ON CONFLICT (bucket) DO UPDATE SET attempts = attempts + 1
+        """,
+        (bucket(score, total),),
+    )
+
+
+def rebuild(conn: sqlite3.Connection) -> int:
+    """Recompute every summary from ``attempts``; returns the attempts counted.
+
+    Runs inside the caller's transaction.
+    """
+    conn.execute("DELETE FROM user_results")
+    conn.execute("DELETE FROM quiz_results")
+    conn.execute("DELETE FROM score_histogram")
+    graded = """
+        SELECT user_id, score, total_questions AS total, finished_at,
+               score * 100.0 / total_questions AS percent
+        FROM attempts
+        WHERE finished_at IS NOT NULL AND total_questions > 0
+    """
+    conn.execute(
+        f"""
+        INSERT INTO user_results (
+            user_id, attempts_finished, best_score, best_total, best_percent,
+            best_at, last_score, last_total, last_at
+        )
+        SELECT user_id, attempts_finished, best_score, best_total, best_percent,
+               best_at, last_score, last_total, last_at
+        FROM (
+            SELECT
+                user_id,
+                COUNT(*) OVER w AS attempts_finished,
+                FIRST_VALUE(score) OVER best AS best_score,
+                FIRST_VALUE(total) OVER best AS best_total,
+                FIRST_VALUE(percent) OVER best AS best_percent,
+                FIRST_VALUE(finished_at) OVER best AS best_at,
+                FIRST_VALUE(score) OVER last AS last_score,
+                FIRST_VALUE(total) OVER last AS last_total,
+                FIRST_VALUE(finished_at) OVER last AS last_at,
+                ROW_NUMBER() OVER w AS n
+            FROM ({graded})
+            WINDOW
+                w AS (PARTITION BY user_id),
+                best AS (PARTITION BY user_id ORDER BY percent DESC, finished_at),
+                last AS (PARTITION BY user_id ORDER BY finished_at DESC)
+        )
+        WHERE n = 1
+        """
+    )
+    counted = conn.execute(
+        f"""
+        INSERT INTO quiz_results (id, attempts, score_sum, total_sum, percent_sum)
+        SELECT * FROM (
+            SELECT 1, COUNT(*) AS n, SUM(score), SUM(total), SUM(percent)
+            FROM ({graded})
+        )
+        WHERE n > 0
+        RETURNING attempts
+        """
+    ).fetchall()
+    conn.execute(
+        f"""
+        INSERT INTO score_histogram (bucket, attempts)
+        SELECT MIN(score * ? / total, ?), COUNT(*)
+        FROM ({graded})
+        GROUP BY 1
+        """,
+        (HISTOGRAM_BINS, HISTOGRAM_BINS - 1),
+    )
+    return counted[0][0] if counted else 0
+
+
+def user_summary(conn: sqlite3.Connection, user_id: int) -> Optional[Dict]:
+    row = conn.execute(
+        "SELECT * FROM user_results WHERE user_id = ?", (user_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    return {
+        "attemptsFinished": row["attempts_finished"],
+        "best": {"score": row["best_score"], "total": row["best_total"]},
+        "last": {
+            "score": row["last_score"],
+            "total": row["last_total"],
+            "finishedAt": row["last_at"],
+        },
+    }
+
+
+def overview(conn: sqlite3.Connection, limit: int, exclude_username: str = "") -> Dict:
+    """Quiz-wide aggregates and the top ``limit`` students by best percent."""
+    quiz = conn.execute("SELECT * FROM quiz_results WHERE id = 1").fetchone()
+    counts = dict(conn.execute("SELECT bucket, attempts FROM score_histogram"))
+    width = 100 / HISTOGRAM_BINS
+    leaders = conn.execute(
+        """
+        SELECT u.github_username AS username, r.best_score, r.best_total,
+               r.best_percent, r.attempts_finished
+        FROM user_results r
+        JOIN users u ON u.id = r.user_id
+        WHERE lower(u.github_username) != ?
+        ORDER BY r.best_percent DESC, r.best_at
+        LIMIT ?
+        """,
+        (exclude_username, limit),
+    ).fetchall()
+    attempts = quiz["attempts"] if quiz else 0
+    return {
+        "attempts": attempts,
+        "meanScore": round(quiz["score_sum"] / attempts, 2) if attempts else None,
+        "meanPercent": round(quiz["percent_sum"] / attempts, 2) if attempts else None,
+        "histogram": {
+            "edges": [round(i * width, 2) for i in range(HISTOGRAM_BINS + 1)],
+            "counts": [counts.get(i, 0) for i in range(HISTOGRAM_BINS)],
+        },
+        "leaderboard": [
+            {
+                "username": row["username"],
+                "score": row["best_score"],
+                "total": row["best_total"],
+                "percent": round(row["best_percent"], 2),
+                "attempts": row["attempts_finished"],
+            }
+            for row in leaders
+        ],
+    }
+
+
+def main():
+    load_dotenv()
+    default_db = (BASE_DIR / os.getenv("QUIZ_FILE", "test.json")).with_suffix(".db")
+    parser = argparse.ArgumentParser(description="Rebuild result summaries")
+    parser.add_argument(
+        "--db", type=Path, default=default_db, help="Path to DB (defaults to <QUIZ_FILE>.db)"
+    )
+    args = parser.parse_args()
+
+    # schema imports this module for its migration
+    from schema import migrate
+
+    conn = connect(args.db)
+    migrate(conn)
+    with transaction(conn, "IMMEDIATE"):
+        counted = rebuild(conn)
+    conn.close()
+    print(f"Rebuilt summaries from {counted} finished attempts in {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+import pytest
+
+from fake_github import serve
+
+
+@pytest.fixture
+def fake_github(monkeypatch):
+    # main reads these at import time, so set them before reload_main()
+    with serve() as fake:
+        monkeypatch.setenv("GITHUB_CLIENT_ID", "test-client")
+        monkeypatch.setenv("GITHUB_CLIENT_SECRET", "test-secret")
+        monkeypatch.setenv("GITHUB_OAUTH_URL", fake.url)
+        monkeypatch.setenv("GITHUB_API_URL", fake.url)
+        yield fake
@@ -0,0 +1,105 @@
+"""Local stand-in for the GitHub OAuth endpoints used by the login callback.
+
+The authorization ``code`` doubles as the GitHub login, so any number of
+distinct users can log in offline. Point the app at it with
+``GITHUB_OAUTH_URL`` / ``GITHUB_API_URL``:
+
+    uv run python tests/fake_github.py --port 9000 --delay-ms 40
+"""
+
+import argparse
+import asyncio
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Set, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Form, Header, HTTPException, Request
+
+
+class FakeGitHub:
+    def __init__(self, delay_ms: float = 0):
+        # simulated round trip to github.com, applied to every request
+        self.delay = delay_ms / 1000
+        self.requests = 0
+        # distinct client (host, port) pairs = TCP connections opened by the app
+        self.peers: Set[Tuple[str, int]] = set()
+        self.url = ""
+        self.app = self._build_app()
+
+    @property
+    def connections(self) -> int:
+        return len(self.peers)
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.middleware("http")
+        async def track(request: Request, call_next):
+            self.requests += 1
+            if request.client:
+                self.peers.add((request.client.host, request.client.port))
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            return await call_next(request)
+
+        @app.post("/login/oauth/access_token")
+        def access_token(code: str = Form(...), client_id: str = Form("")):
+            if code == "bad":
+                return {"error": "bad_verification_code"}
+            return {"access_token": f"token-{code}", "token_type": "bearer"}
+
+        @app.get("/user")
+        def user(authorization: str = Header("")):
+            prefix = "Bearer token-"
+            if not authorization.startswith(prefix):
+                raise HTTPException(status_code=401, detail="Bad credentials")
+            return {"login": authorization[len(prefix):]}
+
+        return app
+
+
+@contextmanager
+def serve(delay_ms: float = 0, port: int = 0) -> Iterator[FakeGitHub]:
+    """Run a FakeGitHub on 127.0.0.1 in a background thread."""
+    fake = FakeGitHub(delay_ms)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", port))
+    fake.url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+    server = uvicorn.Server(
+        uvicorn.Config(fake.app, log_level="warning", lifespan="off", ws="none")
+    )
+    thread = threading.Thread(
+        target=server.run, kwargs={"sockets": [sock]}, daemon=True
+    )
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield fake
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+        sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake GitHub OAuth server")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--delay-ms", type=float, default=0)
+    args = parser.parse_args()
+    with serve(args.delay_ms, args.port) as fake:
+        print(f"Fake GitHub on {fake.url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import random
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from grading import AnswerKey  # noqa: E402
+
+
+def reference_evaluate(questions, option_mapping, answer_map):
+    # прежняя реализация evaluate_attempt из main.py
+    score = 0
+    incorrect_details = []
+    for qid, q in questions.items():
+        presented_indices = option_mapping.get(str(qid)) or option_mapping.get(qid)
+        if presented_indices is None:
+            continue
+        selected = answer_map.get(qid, [])
+        original_selected = [
+            presented_indices[idx] for idx in selected if idx < len(presented_indices)
+        ]
+        if q.get("multiple"):
+            is_correct = set(original_selected) == set(q.get("correctIndexes", []))
+        else:
+            is_correct = (
+                len(original_selected) == 1
+                and original_selected[0] == q.get("correctIndex")
+            )
+        if is_correct:
+            score += 1
+        else:
+            incorrect_details.append(
+                {
+                    "id": qid,
+                    "text": q["text"],
+                    "topic": q.get("topic"),
+                    "correct": (
+                        [q["options"][i] for i in q.get("correctIndexes", [])]
+                        if q.get("multiple")
+                        else [q["options"][q["correctIndex"]]]
+                    ),
+                    "selected": [q["options"][i] for i in original_selected],
+                }
+            )
+    return score, len(questions), incorrect_details
+
+
+def random_bank(rng, size=30):
+    questions = {}
+    for qid in range(1, size + 1):
+        n = rng.randint(2, 6)
+        q = {
+            "id": qid,
+            "topic": f"t{qid % 4}",
+            "text": f"Q{qid}",
+            "options": [f"o{qid}-{i}" for i in range(n)],
+        }
+        if rng.random() < 0.4:
+            q["multiple"] = True
+            q["correctIndexes"] = rng.sample(range(n), rng.randint(1, n))
+        else:
+            q["correctIndex"] = rng.randrange(n)
+        questions[qid] = q
+    return questions
+
+
+def test_answer_key_matches_reference_grading():
+    # сверка там, где поведение не менялось: выданы все вопросы, варианты
+    # выбраны без повторов и по исходному порядку, индексы неотрицательные
+    rng = random.Random(7)
+    questions = random_bank(rng)
+    key = AnswerKey(questions)
+
+    submissions = []
+    for _ in range(300):
+        mapping = {}
+        answers = {}
+        for qid, q in questions.items():
+            order = list(range(len(q["options"])))
+            rng.shuffle(order)
+            mapping[str(qid)] = order
+            if rng.random() < 0.9:
+                picked = sorted(rng.sample(order, rng.randint(0, len(order))))
+                # плюс индекс за пределами вариантов: обе версии его отбрасывают
+                answers[qid] = [order.index(i) for i in picked] + [len(order)]
+        submissions.append((mapping, answers))
+
+    expected = [reference_evaluate(questions, m, a) for m, a in submissions]
+    assert key.grade_many(submissions) == expected
+    assert sum(score for score, _, _ in expected) > 0
+
+
+def test_total_counts_only_presented_questions():
+    questions = random_bank(random.Random(3), size=4)
+    key = AnswerKey(questions)
+    # пул выдал два вопроса из четырёх: total — выданные, а не весь банк
+    mapping = {str(qid): list(range(len(questions[qid]["options"]))) for qid in (1, 3)}
+    score, total, details = key.grade(mapping, {})
+    assert (score, total) == (0, 2)
+    assert [d["id"] for d in details] == [1, 3]
+
+
+def test_selection_is_a_mask():
+    questions = {
+        1: {
+            "id": 1,
+            "text": "Q",
+            "options": ["a", "b", "c"],
+            "multiple": True,
+            "correctIndexes": [0, 2],
+        },
+    }
+    key = AnswerKey(questions)
+    mapping = {"1": [2, 1, 0]}
+    # повторы и порядок клика не важны: выбор — множество исходных вариантов
+    assert key.grade(mapping, {1: [2, 0, 2]})[0] == 1
+    details = key.grade(mapping, {1: [0, 1, 0]})[2]
+    assert details[0]["selected"] == ["b", "c"]
+
+
+def test_negative_indexes_select_nothing():
+    questions = {
+        1: {"id": 1, "text": "Q", "options": ["a", "b", "c"], "correctIndex": 2},
+    }
+    key = AnswerKey(questions)
+    mapping = {"1": [0, 1, 2]}
+    # -1 не должен означать последний вариант, -10 — ронять проверку
+    assert key.grade_answers(mapping, {1: [-1]}) == [(1, 0, False)]
+    assert key.grade_answers(mapping, {1: [-10, 2]}) == [(1, 0b100, True)]
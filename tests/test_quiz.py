@@ -1,6 +1,7 @@
 import importlib
 import json
 import sys
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 from fastapi.testclient import TestClient
@@ -78,7 +79,7 @@ def test_config_and_attempt_flow(tmp_path, monkeypatch):
     # подобрать правильные ответы с учётом перемешивания
     answers = []
     for q in payload["questions"]:
-        original = main.QUESTIONS[q["id"]]
+        original = main.banks.current.questions[q["id"]]
         correct_idx = original.get("correctIndexes", [original.get("correctIndex")])
         chosen = []
         for idx, text in enumerate(q["options"]):
@@ -117,7 +118,7 @@ def test_export_creates_attempt_sheet(tmp_path, monkeypatch):
     # отвечаем правильно
     answers = []
     for q in start["questions"]:
-        original = main.QUESTIONS[q["id"]]
+        original = main.banks.current.questions[q["id"]]
         correct_idx = original.get("correctIndexes", [original.get("correctIndex")])
         chosen = []
         for idx, text in enumerate(q["options"]):
@@ -146,3 +147,1149 @@ def test_export_creates_attempt_sheet(tmp_path, monkeypatch):
     assert row2[0] == "exporter"
     assert row2[1] == 2  # positive
     assert row2[2] == 0  # negative
+    # потоковая запись сохраняет подсветку и ссылки
+    answer = ws.cell(row=2, column=5)
+    assert answer.fill.fgColor.rgb.endswith("2E7D32")
+    assert answer.hyperlink.location == "questions!E2"
+    assert ws.cell(row=1, column=5).hyperlink.target == "#questions!A2"
+
+
+def test_db_pool_reuses_wal_connection(tmp_path, monkeypatch):
+    quiz_file = make_quiz_file(tmp_path)
+    main = reload_main(quiz_file, monkeypatch)
+    main.ensure_schema()
+
+    conn = main.get_db()
+    assert main.get_db() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    main.pool.close()
+    assert main.get_db() is not conn
+
+
+def test_legacy_db_migrates_and_limit_holds_under_concurrency(tmp_path, monkeypatch):
+    import sqlite3
+    from concurrent.futures import ThreadPoolExecutor
+
+    quiz_file = make_quiz_file(tmp_path)
+    # старая БД: без счётчика и с дублем номера попытки после гонки
+    legacy = sqlite3.connect(quiz_file.with_suffix(".db"))
+    legacy.executescript(
+        """
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            github_username TEXT UNIQUE NOT NULL,
+            created_at TEXT NOT NULL
+        );
+        CREATE TABLE attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            attempt_number INTEGER NOT NULL,
+            started_at TEXT NOT NULL,
+            deadline_at TEXT NOT NULL,
+            finished_at TEXT,
+            score INTEGER,
+            total_questions INTEGER,
+            answers_json TEXT,
+            option_mapping_json TEXT NOT NULL,
+            incorrect_json TEXT
+        );
+        INSERT INTO users (github_username, created_at) VALUES ('old', 'x');
+        INSERT INTO attempts (user_id, attempt_number, started_at, deadline_at, option_mapping_json)
+        VALUES (1, 1, 'a', 'z', '{}'), (1, 1, 'b', 'z', '{}');
+        """
+    )
+    legacy.close()
+
+    monkeypatch.setenv("QUIZ_ATTEMPT_LIMIT", "3")
+    # гонка за лимит попыток, а не rate limit: все 8 запросов влезают в бакет
+    monkeypatch.setenv("QUIZ_USER_BURST", "8")
+    main = reload_main(quiz_file, monkeypatch)
+    main.ensure_schema()
+    main.ensure_schema()  # повторный запуск ничего не ломает
+
+    conn = main.get_db()
+    numbers = [
+        r[0]
+        for r in conn.execute(
+            "SELECT attempt_number FROM attempts WHERE user_id = 1 ORDER BY id"
+        )
+    ]
+    assert numbers == [1, 2]
+    assert conn.execute("SELECT attempts_count FROM users").fetchone()[0] == 2
+
+    client = TestClient(main.app)
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        codes = list(
+            ex.map(
+                lambda _: client.post(
+                    "/api/attempts/start", json={"userId": 1}
+                ).status_code,
+                range(8),
+            )
+        )
+    assert sorted(codes) == [200] + [403] * 7
+    assert conn.execute("SELECT MAX(attempt_number) FROM attempts").fetchone()[0] == 3
+
+
+def test_lector_analytics(tmp_path, monkeypatch):
+    quiz_file = make_quiz_file(tmp_path)
+    monkeypatch.setenv("LECTOR", "prof")
+    main = reload_main(quiz_file, monkeypatch)
+    main.ensure_schema()
+    client = TestClient(main.app)
+
+    with main.get_db() as conn:
+        for name in ("prof", "s1", "s2"):
+            conn.execute(
+                "INSERT INTO users (github_username, created_at) VALUES (?, ?)",
+                (name, "2024-01-01T00:00:00Z"),
+            )
+    lector_id, s1, s2 = 1, 2, 3
+
+    # s1 отвечает на всё правильно, s2 выбирает первый показанный вариант
+    for user_id in (s1, s2):
+        start = client.post("/api/attempts/start", json={"userId": user_id}).json()
+        answers = []
+        for q in start["questions"]:
+            original = main.banks.current.questions[q["id"]]
+            right = original["options"][original["correctIndex"]]
+            chosen = q["options"].index(right) if user_id == s1 else 0
+            answers.append({"questionId": q["id"], "selectedIndexes": [chosen]})
+        client.post(
+            f"/api/attempts/{start['attemptId']}/submit",
+            json={"userId": user_id, "answers": answers},
+        )
+
+    assert client.get("/api/analytics", params={"userId": s1}).status_code == 403
+
+    report = client.get("/api/analytics", params={"userId": lector_id}).json()
+    assert [item["presented"] for item in report["items"]] == [2, 2]
+    for item in report["items"]:
+        assert 0.5 <= item["difficulty"] <= 1.0
+        assert abs(sum(item["optionRates"]) - 1.0) < 1e-9
+    assert report["topics"][0]["topic"] == "Basics"
+    assert report["scores"]["attempts"] == 2
+    assert sum(report["scores"]["histogram"]["counts"]) == 2
+
+    import export_results
+
+    out = tmp_path / "report.xlsx"
+    export_results.export(main.DB_PATH, quiz_file, out)
+    assert "analytics" in load_workbook(out).sheetnames
+
+
+def test_incremental_export_decodes_only_new_attempts(tmp_path, monkeypatch, capsys):
+    quiz_file = make_quiz_file(tmp_path)
+    main = reload_main(quiz_file, monkeypatch)
+    main.ensure_schema()
+    client = TestClient(main.app)
+
+    with main.get_db() as conn:
+        for name in ("a", "b"):
+            conn.execute(
+                "INSERT INTO users (github_username, created_at) VALUES (?, ?)",
+                (name, "2024-01-01T00:00:00Z"),
+            )
+
+    def take_attempt(user_id):
+        start = client.post("/api/attempts/start", json={"userId": user_id}).json()
+        answers = [
+            {"questionId": q["id"], "selectedIndexes": [0]} for q in start["questions"]
+        ]
+        client.post(
+            f"/api/attempts/{start['attemptId']}/submit",
+            json={"userId": user_id, "answers": answers},
+        )
+
+    import export_results
+    import schema
+
+    out = tmp_path / "report.xlsx"
+    cache = tmp_path / "snapshot.pickle"
+    take_attempt(1)
+    export_results.export(main.DB_PATH, quiz_file, out, incremental=True, cache_path=cache)
+    digest = export_results.questions_digest(quiz_file)
+    database = schema.database_id(main.get_db())
+    first_watermark = export_results.load_snapshot(cache, digest, database)["watermark"]
+
+    take_attempt(2)
+    # эта попытка закоммитилась поздно: finished_at ниже уже взятой отметки
+    late = (
+        datetime.fromisoformat(first_watermark) - timedelta(minutes=1)
+    ).isoformat()
+    with main.get_db() as conn:
+        conn.execute("UPDATE attempts SET finished_at = ? WHERE user_id = 2", (late,))
+    take_attempt(1)
+    capsys.readouterr()
+    export_results.export(main.DB_PATH, quiz_file, out, incremental=True, cache_path=cache)
+    # обе новые, в том числе запоздавшая; перечитанная старая не считается
+    assert "Decoded 2 new attempts (3 cached)" in capsys.readouterr().out
+    snapshot = export_results.load_snapshot(cache, digest, database)
+    assert snapshot["watermark"] > first_watermark
+
+    wb = load_workbook(out)
+    assert wb["attempt1"].max_row == 3
+    assert wb["attempt2"].max_row == 2
+
+    # БД из бэкапа без последней попытки: снимок не доверяем, экспорт полный
+    with main.get_db() as conn:
+        conn.execute("DELETE FROM attempts WHERE id = 3")
+    export_results.export(main.DB_PATH, quiz_file, out, incremental=True, cache_path=cache)
+    assert "Decoded 2 new attempts (2 cached)" in capsys.readouterr().out
+
+    # just rmdb: новая БД с тем же путём снимка не подхватывает старые попытки
+    fresh = tmp_path / "fresh.db"
+    export_results.export(fresh, quiz_file, out, incremental=True, cache_path=cache)
+    assert "Decoded 0 new attempts (0 cached)" in capsys.readouterr().out
+
+
+def test_seeded_attempt_regenerates_option_order(tmp_path, monkeypatch):
+    quiz_file = make_quiz_file(tmp_path)
+    main = reload_main(quiz_file, monkeypatch)
+    main.ensure_schema()
+    client = TestClient(main.app)
+
+    with main.get_db() as conn:
+        conn.execute(
+            "INSERT INTO users (github_username, created_at) VALUES (?, ?)",
+            ("seeded", "2024-01-01T00:00:00Z"),
+        )
+    start = client.post("/api/attempts/start", json={"userId": 1}).json()
+
+    row = main.get_db().execute(
+        "SELECT * FROM attempts WHERE id = ?", (start["attemptId"],)
+    ).fetchone()
+    assert row["option_mapping_json"] is None
+    assert row["bank_version"] == main.banks.current.version
+
+    # банк берётся из БД, даже если в памяти его уже нет
+    from bank import BankVersions, QuestionBank
+
+    other = QuestionBank(json.dumps({"questions": []}))
+    mapping = BankVersions(main.get_db, other).option_mapping(row)
+    for q in start["questions"]:
+        original = main.banks.current.questions[q["id"]]["options"]
+        assert q["options"] == [original[i] for i in mapping[q["id"]]]
+
+
+def test_question_bank_hot_reload_keeps_attempt_version(tmp_path, monkeypatch):
+    quiz_file = make_quiz_file(tmp_path)
+    monkeypatch.setenv("LECTOR", "prof")
+    main = reload_main(quiz_file, monkeypatch)
+    main.ensure_schema()
+    client = TestClient(main.app)
+
+    with main.get_db() as conn:
+        for name in ("prof", "student"):
+            conn.execute(
+                "INSERT INTO users (github_username, created_at) VALUES (?, ?)",
+                (name, "2024-01-01T00:00:00Z"),
+            )
+    old_bank = main.banks.current
+    start = client.post("/api/attempts/start", json={"userId": 2}).json()
+
+    # правим файл во время экзамена: другой правильный ответ у первого вопроса
+    quiz = json.loads(quiz_file.read_text(encoding="utf-8"))
+    quiz["questions"][0]["correctIndex"] = 2
+    quiz["name"] = "Fixed Quiz"
+    quiz_file.write_text(json.dumps(quiz, ensure_ascii=False), encoding="utf-8")
+
+    assert client.post("/api/questions/reload", json={"userId": 2}).status_code == 403
+    res = client.post("/api/questions/reload", json={"userId": 1}).json()
+    assert res["changed"] is True
+    assert client.get("/api/config").json()["name"] == "Fixed Quiz"
+    assert main.banks.check() is False
+
+    # старая попытка проверяется по той версии, с которой начиналась
+    answers = []
+    for q in start["questions"]:
+        original = old_bank.questions[q["id"]]
+        right = original["options"][original["correctIndex"]]
+        answers.append(
+            {"questionId": q["id"], "selectedIndexes": [q["options"].index(right)]}
+        )
+    submit = client.post(
+        f"/api/attempts/{start['attemptId']}/submit",
+        json={"userId": 2, "answers": answers},
+    ).json()
+    assert submit["score"] == 2
+
+    # битый файл не подменяет текущий банк
+    quiz_file.write_text("{", encoding="utf-8")
+    assert client.post("/api/questions/reload", json={"userId": 1}).status_code == 400
+    assert main.banks.current.name == "Fixed Quiz"
+
+    # редактор заменяет файл через удаление: наблюдатель не падает и подхватывает его потом
+    quiz_file.unlink()
+    import asyncio
+
+
+    async def tick():
+        watcher = asyncio.create_task(main.watch_bank())
+        await asyncio.sleep(0.05)
+        alive = not watcher.done()
+        watcher.cancel()
+        return alive
+
+    monkeypatch.setattr(main, "BANK_POLL_SECONDS", 0.01)
+    assert asyncio.run(tick())
+    quiz["name"] = "Restored Quiz"
+    quiz_file.write_text(json.dumps(quiz, ensure_ascii=False), encoding="utf-8")
+    assert main.banks.check() is True
+    assert main.banks.current.name == "Restored Quiz"
+
+
+def test_seed_permutations_are_pinned(tmp_path):
+    from bank import QuestionBank
+
+    quiz = {
+        "questions": [
+            {
+                "id": qid,
+                "text": "?",
+                "options": [str(i) for i in range(n)],
+                "correctIndex": 0,
+            }
+            for qid, n in ((1, 2), (2, 4), (3, 5), (4, 8))
+        ]
+    }
+    bank = QuestionBank(json.dumps(quiz))
+    # порядок вариантов восстанавливается из сида при каждом чтении:
+    # смена версии Python не должна его менять
+    assert bank.permutations(12345) == {
+        1: [0, 1],
+        2: [3, 2, 1, 0],
+        3: [0, 4, 3, 2, 1],
+        4: [1, 5, 4, 6, 3, 0, 7, 2],
+    }
+    assert bank.permutations(0) == {
+        1: [0, 1],
+        2: [2, 1, 0, 3],
+        3: [0, 2, 1, 3, 4],
+        4: [6, 0, 3, 5, 1, 4, 2, 7],
+    }
+
+
+def test_questions_json_matches_dict_payload(tmp_path):
+    from bank import QuestionBank
+
+    bank = QuestionBank(make_quiz_file(tmp_path).read_text(encoding="utf-8"))
+    mapping = bank.permutations(12345)
+    expected = [
+        {
+            "id": q["id"],
+            "topic": q.get("topic"),
+            "text": q["text"],
+            "multiple": q.get("multiple", False),
+            "options": [q["options"][idx] for idx in mapping[q["id"]]],
+        }
+        for q in bank.questions.values()
+    ]
+    assert json.loads(bank.questions_json(mapping)) == expected
+
+
+def test_submit_body_fast_path_and_fallback(tmp_path, monkeypatch):
+    quiz_file = make_quiz_file(tmp_path)
+    monkeypatch.setenv("QUIZ_SHUFFLE_MODE", "stored")
+    main = reload_main(quiz_file, monkeypatch)
+    main.ensure_schema()
+    client = TestClient(main.app)
+
+    with main.get_db() as conn:
+        conn.execute(
+            "INSERT INTO users (github_username, created_at) VALUES (?, ?)",
+            ("codec", "2024-01-01T00:00:00Z"),
+        )
+
+    import codec
+
+    assert codec.parse_submission(
+        {"userId": 1, "answers": [{"questionId": 2, "selectedIndexes": [1], "x": 0}]}
+    ) == (1, {2: [1]})
+
+    start = client.post("/api/attempts/start", json={"userId": 1}).json()
+    stored = main.get_db().execute("SELECT option_mapping_json FROM attempts").fetchone()[0]
+    assert set(json.loads(stored)) == {"1", "2"}
+
+    bad = client.post(
+        f"/api/attempts/{start['attemptId']}/submit",
+        json={"userId": 1, "answers": [{"questionId": "x", "selectedIndexes": [0]}]},
+    )
+    assert bad.status_code == 422
+    assert bad.json()["detail"][0]["loc"][:3] == ["body", "answers", 0]
+    assert (
+        client.post(
+            f"/api/attempts/{start['attemptId']}/submit", content=b"{"
+        ).status_code
+        == 422
+    )
+    # отрицательные индексы отсекаются на входе: и в сабмите, и в автосейве
+    negative = [{"questionId": 1, "selectedIndexes": [-1]}]
+    assert (
+        client.post(
+            f"/api/attempts/{start['attemptId']}/submit",
+            json={"userId": 1, "answers": negative},
+        ).status_code
+        == 422
+    )
+    assert (
+        client.put(
+            f"/api/attempts/{start['attemptId']}/progress",
+            json={"userId": 1, "answers": negative},
+        ).status_code
+        == 422
+    )
+
+    # строки-числа принимает медленный путь через модель, как раньше
+    lax = client.post(
+        f"/api/attempts/{start['attemptId']}/submit",
+        json={"userId": "1", "answers": [{"questionId": "1", "selectedIndexes": []}]},
+    )
+    assert lax.status_code == 200
+    assert lax.json()["score"] == 0
+
+
+def test_github_login_reuses_pooled_connection(tmp_path, monkeypatch, fake_github):
+    quiz_file = make_quiz_file(tmp_path)
+    # все логины идут с одного адреса testclient: по умолчанию это не лимитируется
+    main = reload_main(quiz_file, monkeypatch)
+
+    # with-блок запускает lifespan: общий httpx-клиент живёт всё время приложения
+    with TestClient(main.app) as client:
+        for login in ("alice", "bob", "alice"):
+            url = client.get("/api/auth/github/login").json()["url"]
+            assert url.startswith(fake_github.url)
+            state = url.split("state=")[1]
+            res = client.get(
+                "/api/auth/github/callback", params={"code": login, "state": state}
+            )
+            assert res.status_code == 200
+            assert f'"username": "{login}"' in res.text
+
+        state = client.get("/api/auth/github/login").json()["url"].split("state=")[1]
+        res = client.get(
+            "/api/auth/github/callback", params={"code": "bad", "state": state}
+        )
+        assert res.status_code == 400
+
+    assert fake_github.requests == 7
+    # keep-alive: все логины прошли через одно соединение
+    assert fake_github.connections == 1
+    users = main.get_db().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    assert users == 2
+
+
+def test_metrics_endpoint_reports_routes_and_db(tmp_path, monkeypatch):
+    quiz_file = make_quiz_file(tmp_path)
+    main = reload_main(quiz_file, monkeypatch)
+    main.ensure_schema()
+    client = TestClient(main.app)
+    main.get_db().execute(
+        "INSERT INTO users (github_username, created_at) VALUES ('m', '2024-01-01')"
+    )
+
+    start = client.post("/api/attempts/start", json={"userId": 1}).json()
+    client.post(
+        f"/api/attempts/{start['attemptId']}/submit", json={"userId": 1, "answers": []}
+    )
+    client.post("/api/attempts/start", json={"userId": 999})
+
+    text = client.get("/metrics").text
+    # метки — шаблоны маршрутов, а не конкретные id
+    assert (
+        'quiz_http_requests_total{method="POST",route="/api/attempts/{attempt_id}/submit",status="200"} 1'
+        in text
+    )
+    assert (
+        'quiz_http_requests_total{method="POST",route="/api/attempts/start",status="404"} 1'
+        in text
+    )
+    assert 'quiz_http_request_duration_seconds_count{method="POST",route="/api/attempts/start"} 2' in text
+    assert "quiz_http_requests_in_flight 1" in text
+    assert "quiz_grading_duration_seconds_count 1" in text
+    assert 'quiz_db_query_duration_seconds_count{statement="update"}' in text
+    assert "quiz_db_commit_duration_seconds_count" in text
+    assert 'quiz_db_lock_wait_seconds_bucket{le="+Inf"}' in text
+
+
+def test_profiler_for_lector_and_armed_route(tmp_path, monkeypatch):
+    quiz_file = make_quiz_file(tmp_path)
+    monkeypatch.setenv("LECTOR", "prof")
+    monkeypatch.setenv("QUIZ_PROFILE_DIR", str(tmp_path / "profiles"))
+    monkeypatch.setenv("QUIZ_PROFILE_TOKEN", "secret")
+    main = reload_main(quiz_file, monkeypatch)
+    main.ensure_schema()
+    client = TestClient(main.app)
+    with main.get_db() as conn:
+        for name in ("prof", "student"):
+            conn.execute(
+                "INSERT INTO users (github_username, created_at) VALUES (?, ?)",
+                (name, "2024-01-01T00:00:00Z"),
+            )
+
+    # флаг от студента игнорируется, от лектора — отчёт вместо ответа
+    res = client.post(
+        "/api/attempts/start",
+        json={"userId": 2},
+        headers={"X-Profile": "return", "X-Profile-User": "2"},
+    )
+    assert res.json()["attemptId"] == 1
+    res = client.post(
+        "/api/attempts/start",
+        json={"userId": 1},
+        headers={"X-Profile": "return", "X-Profile-User": "1"},
+    )
+    assert res.headers["x-profile-status"] == "200"
+    assert res.headers["content-type"].startswith("text/plain")
+    for line in res.text.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack.split(";")[0] in ("event-loop", "worker") and int(count) > 0
+
+    res = client.get("/api/config?profile=1", headers={"X-Profile-Token": "secret"})
+    assert res.json()["name"] == "AQA Sample Quiz"
+    assert (tmp_path / "profiles" / res.headers["x-profile-report"]).exists()
+
+    # профилировать следующие 2 запроса к сабмиту
+    armed = client.post(
+        "/api/profile",
+        json={"userId": 1, "route": "/api/attempts/{attempt_id}/submit", "count": 2},
+    )
+    assert armed.json()["remaining"] == 2
+    assert (
+        client.post(
+            "/api/profile", json={"userId": 2, "route": "/api/config"}
+        ).status_code
+        == 403
+    )
+    for attempt_id, user_id in ((1, 2), (2, 1), (1, 2)):
+        client.post(
+            f"/api/attempts/{attempt_id}/submit", json={"userId": user_id, "answers": []}
+        )
+    reports = sorted((tmp_path / "profiles").glob("*submit.folded"))
+    assert len(reports) == 2
+    assert main.profiler.status()["route"] is None
+
+
+def test_progress_autosave_is_buffered_and_used_on_submit(tmp_path, monkeypatch):
+    quiz_file = make_quiz_file(tmp_path)
+    main = reload_main(quiz_file, monkeypatch)
+    main.ensure_schema()
+    client = TestClient(main.app)
+    conn = main.get_db()
+    conn.execute("INSERT INTO users (github_username, created_at) VALUES ('s', 'x')")
+
+    start = client.post("/api/attempts/start", json={"userId": 1}).json()
+    attempt_id = start["attemptId"]
+    correct = {}
+    for q in start["questions"]:
+        original = main.banks.current.questions[q["id"]]
+        correct[q["id"]] = q["options"].index(original["options"][original["correctIndex"]])
+
+    # каждый клик — PUT, но в БД ничего не пишется до flush
+    for qid in (1, 2):
+        res = client.put(
+            f"/api/attempts/{attempt_id}/progress",
+            json={
+                "userId": 1,
+                "answers": [
+                    {"questionId": q, "selectedIndexes": [correct[q]]}
+                    for q in range(1, qid + 1)
+                ],
+                "currentIndex": qid - 1,
+            },
+        )
+        assert res.status_code == 200
+    assert client.put(
+        f"/api/attempts/{attempt_id}/progress", json={"userId": 2, "answers": []}
+    ).status_code == 404
+    assert conn.execute("SELECT COUNT(*) FROM attempt_progress").fetchone()[0] == 0
+
+    saved = client.get(f"/api/attempts/{attempt_id}/progress?userId=1").json()
+    assert saved["currentIndex"] == 1 and len(saved["answers"]) == 2
+
+    assert main.progress.flush() == 1
+    assert main.progress.flush() == 0
+    row = conn.execute("SELECT answers_json FROM attempt_progress").fetchone()
+    assert len(json.loads(row[0])) == 2
+
+    # после вытеснения из памяти прогресс читается из БД
+    main.progress.discard(attempt_id)
+    saved = client.get(f"/api/attempts/{attempt_id}/progress?userId=1").json()
+    assert len(saved["answers"]) == 2
+
+    # устаревшая копия другого воркера не затирает более свежий прогресс
+    stale = main.Progress(1, start["deadline"], [], 0, "2000-01-01T00:00:00+00:00")
+    main.progress.put(attempt_id, stale)
+    main.progress.flush()
+    main.progress.discard(attempt_id)
+    row = conn.execute("SELECT answers_json, updated_at FROM attempt_progress").fetchone()
+    assert len(json.loads(row[0])) == 2 and row[1] == saved["savedAt"]
+
+    # нестрогий ввод проходит через модель и сохраняется в нормальном виде
+    lax = client.put(
+        f"/api/attempts/{attempt_id}/progress",
+        json={
+            "userId": "1",
+            "answers": [{"questionId": 1, "selectedIndexes": [correct[1]], "x": 0}],
+            "currentIndex": "0",
+        },
+    )
+    assert lax.status_code == 200
+    saved = client.get(f"/api/attempts/{attempt_id}/progress?userId=1").json()
+    assert saved["answers"] == [{"questionId": 1, "selectedIndexes": [correct[1]]}]
+    client.put(
+        f"/api/attempts/{attempt_id}/progress",
+        json={
+            "userId": 1,
+            "answers": [{"questionId": q, "selectedIndexes": [correct[q]]} for q in (1, 2)],
+        },
+    )
+
+    # сабмит с другого устройства без ответов добирает их из автосейва
+    res = client.post(
+        f"/api/attempts/{attempt_id}/submit", json={"userId": 1, "answers": []}
+    ).json()
+    assert res["score"] == 2
+    assert conn.execute("SELECT COUNT(*) FROM attempt_progress").fetchone()[0] == 0
+    assert client.put(
+        f"/api/attempts/{attempt_id}/progress", json={"userId": 1, "answers": []}
+    ).status_code == 400
+
+
+def test_get_attempt_resumes_with_etag(tmp_path, monkeypatch):
+    quiz_file = make_quiz_file(tmp_path)
+    main = reload_main(quiz_file, monkeypatch)
+    main.ensure_schema()
+    client = TestClient(main.app)
+    main.get_db().execute(
+        "INSERT INTO users (github_username, created_at) VALUES ('s', 'x')"
+    )
+    start = client.post("/api/attempts/start", json={"userId": 1}).json()
+    url = f"/api/attempts/{start['attemptId']}?userId=1"
+
+    res = client.get(url)
+    assert res.status_code == 200
+    data = res.json()
+    assert data["questions"] == start["questions"]
+    assert data["deadline"] == start["deadline"]
+    assert data["progress"] == {"answers": [], "currentIndex": 0, "savedAt": None}
+    etag = res.headers["etag"]
+
+    # повторное восстановление — 304 без тела
+    cached = client.get(url, headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b""
+    assert client.get(f"/api/attempts/{start['attemptId']}?userId=2").status_code == 404
+
+    answers = [{"questionId": 1, "selectedIndexes": [0]}]
+    client.put(
+        f"/api/attempts/{start['attemptId']}/progress",
+        json={"userId": 1, "answers": answers, "currentIndex": 1},
+    )
+    res = client.get(url, headers={"If-None-Match": etag})
+    assert res.status_code == 200 and res.headers["etag"] != etag
+    assert res.json()["progress"]["answers"] == answers
+
+    # после flush прогресс приходит из того же запроса к БД
+    main.progress.flush()
+    main.progress.discard(start["attemptId"])
+    assert client.get(url).json()["progress"]["currentIndex"] == 1
+
+
+def test_pooled_bank_samples_per_topic_and_pages_questions(tmp_path, monkeypatch):
+    questions = []
+    for qid in range(1, 8):
+        questions.append(
+            {
+                "id": qid,
+                "topic": "A" if qid <= 4 else "B",
+                "text": f"Q{qid}?",
+                "options": [f"o{qid}-{i}" for i in range(3)],
+                "correctIndex": 0,
+            }
+        )
+    # вопрос 5 почти всегда попадает в выборку темы B
+    questions[4]["weight"] = 1000
+    quiz_file = tmp_path / "pool.json"
+    quiz_file.write_text(
+        json.dumps(
+            {
+                "name": "Pool",
+                "pool": {"perTopic": 2, "topics": {"B": 1}},
+                "questions": questions,
+            }
+        ),
+        encoding="utf-8",
+    )
+    monkeypatch.setenv("QUIZ_QUESTION_PAGE_SIZE", "2")
+    main = reload_main(quiz_file, monkeypatch)
+    main.ensure_schema()
+    client = TestClient(main.app)
+    main.get_db().execute(
+        "INSERT INTO users (github_username, created_at) VALUES ('s', 'x')"
+    )
+    bank = main.banks.current
+    assert bank.attempt_size == 3
+    assert client.get("/api/config").json()["questionsPerAttempt"] == 3
+
+    picks = [list(bank.permutations(seed)) for seed in range(200)]
+    assert all(len(p) == 3 and sum(q > 4 for q in p) == 1 for p in picks)
+    assert sum(5 in p for p in picks) > 190
+    assert bank.permutations.__wrapped__(17) == bank.permutations(17)
+
+    # старт отдаёт первую страницу, остальное — по offset
+    start = client.post("/api/attempts/start", json={"userId": 1}).json()
+    assert start["totalQuestions"] == 3 and len(start["questions"]) == 2
+    page = client.get(
+        f"/api/attempts/{start['attemptId']}/questions?userId=1&offset=2"
+    ).json()
+    assert page["offset"] == 2 and len(page["questions"]) == 1
+    shown = start["questions"] + page["questions"]
+
+    answers = []
+    for q in shown[:2]:
+        correct = bank.questions[q["id"]]["options"][0]
+        answers.append({"questionId": q["id"], "selectedIndexes": [q["options"].index(correct)]})
+    res = client.post(
+        f"/api/attempts/{start['attemptId']}/submit", json={"userId": 1, "answers": answers}
+    ).json()
+    # оценка — только по выданным вопросам
+    assert (res["score"], res["total"]) == (2, 3)
+
+    import export_results
+
+    out = tmp_path / "pool.xlsx"
+    export_results.export(main.DB_PATH, quiz_file, out)
+    ws = load_workbook(out)["attempt1"]
+    row = {
+        int(ws.cell(row=1, column=col).value.split(".")[0]): ws.cell(row=2, column=col).value
+        for col in range(5, 12)
+    }
+    assert [ws.cell(row=2, column=c).value for c in (2, 3)] == [2, 1]
+    assert row[shown[2]["id"]] == "—"
+    # невыданные вопросы пусты (openpyxl подставляет в пустые ячейки цель ссылки)
+    skipped = [row[qid] for qid in row if qid not in {q["id"] for q in shown}]
+    assert len(skipped) == 4
+    assert all(v is None or v.startswith("questions!") for v in skipped)
+
+
+def test_result_summaries_back_status_and_overview(tmp_path, monkeypatch):
+    quiz_file = make_quiz_file(tmp_path)
+    monkeypatch.setenv("LECTOR", "prof")
+    main = reload_main(quiz_file, monkeypatch)
+    main.ensure_schema()
+    client = TestClient(main.app)
+
+    with main.get_db() as conn:
+        for name in ("prof", "s1", "s2"):
+            conn.execute(
+                "INSERT INTO users (github_username, created_at) VALUES (?, ?)",
+                (name, "2024-01-01T00:00:00Z"),
+            )
+    lector_id, s1, s2 = 1, 2, 3
+
+    def attempt(user_id: int, n_right: int):
+        start = client.post("/api/attempts/start", json={"userId": user_id}).json()
+        answers = []
+        for i, q in enumerate(start["questions"]):
+            original = main.banks.current.questions[q["id"]]
+            right = q["options"].index(original["options"][original["correctIndex"]])
+            chosen = right if i < n_right else (right + 1) % len(q["options"])
+            answers.append({"questionId": q["id"], "selectedIndexes": [chosen]})
+        client.post(
+            f"/api/attempts/{start['attemptId']}/submit",
+            json={"userId": user_id, "answers": answers},
+        )
+
+    # s1: 2/2, затем 0/2 — лучший и последний результаты расходятся
+    attempt(s1, 2)
+    attempt(s1, 0)
+    attempt(s2, 1)
+    open_id = client.post("/api/attempts/start", json={"userId": s2}).json()["attemptId"]
+
+    status = client.get(f"/api/attempts/status/{s1}").json()
+    assert status["attemptsUsed"] == 2 and status["openAttempt"] is None
+    assert status["summary"]["best"] == {"score": 2, "total": 2}
+    assert status["summary"]["last"]["score"] == 0
+    assert client.get(f"/api/attempts/status/{s2}").json()["openAttempt"]["id"] == open_id
+
+    assert client.get("/api/overview", params={"userId": s1}).status_code == 403
+    overview = client.get("/api/overview", params={"userId": lector_id}).json()
+    assert overview["attempts"] == 3 and overview["meanPercent"] == 50.0
+    assert overview["histogram"]["counts"] == [1, 0, 0, 0, 0, 1, 0, 0, 0, 1]
+    assert [(r["username"], r["percent"]) for r in overview["leaderboard"]] == [
+        ("s1", 100.0),
+        ("s2", 50.0),
+    ]
+
+    # пересборка с нуля совпадает с тем, что накопил сабмит
+    import summaries
+
+    conn = main.get_db()
+    before = summaries.overview(conn, 10), summaries.user_summary(conn, s1)
+    with conn:
+        assert summaries.rebuild(conn) == 3
+    assert (summaries.overview(conn, 10), summaries.user_summary(conn, s1)) == before
+
+
+def test_attempt_answers_backfill_and_derived_result(tmp_path, monkeypatch):
+    import schema
+
+    quiz_file = make_quiz_file(tmp_path)
+    main = reload_main(quiz_file, monkeypatch)
+    main.ensure_schema()
+    client = TestClient(main.app)
+    conn = main.get_db()
+    conn.execute("INSERT INTO users (github_username, created_at) VALUES ('s', 'x')")
+    bank = main.banks.current
+    q1, q2 = bank.questions[1], bank.questions[2]
+
+    # попытка в старом формате: JSON-блобы ответов и ошибок
+    mapping = {"1": [2, 0, 1, 3], "2": [1, 0, 2, 3]}
+    right = mapping["1"].index(q1["correctIndex"])
+    conn.execute(
+        """
+        INSERT INTO attempts (
+            user_id, attempt_number, started_at, deadline_at, finished_at, score,
+            total_questions, answers_json, option_mapping_json, incorrect_json
+        ) VALUES (1, 1, 'a', 'b', '2024-01-01', 1, 2, ?, ?, ?)
+        """,
+        (
+            json.dumps(
+                [
+                    {"questionId": 1, "selectedIndexes": [right]},
+                    {"questionId": 2, "selectedIndexes": [0]},
+                ]
+            ),
+            json.dumps(mapping),
+            json.dumps([{"id": 2, "text": q2["text"], "selected": ["..."]}]),
+        ),
+    )
+    conn.execute("DROP TABLE attempt_answers")
+    # откатить версию до миграции attempt_answers
+    version = schema.MIGRATIONS.index(schema._attempt_answers)
+    conn.execute(f"PRAGMA user_version = {version}")
+    schema.migrate(conn)
+
+    rows = conn.execute(
+        "SELECT question_id, selected_mask, is_correct FROM attempt_answers"
+    ).fetchall()
+    assert [tuple(r) for r in rows] == [(1, 1 << q1["correctIndex"], 1), (2, 1 << 1, 0)]
+    legacy = conn.execute("SELECT answers_json, incorrect_json FROM attempts").fetchone()
+    assert tuple(legacy) == (None, None)
+
+    # карточки ошибок собираются из банка при чтении
+    result = client.get("/api/attempts/1/result", params={"userId": 1}).json()
+    assert (result["score"], result["total"]) == (1, 2)
+    assert result["incorrect"] == [
+        {
+            "id": 2,
+            "text": q2["text"],
+            "topic": q2["topic"],
+            "correct": [q2["options"][q2["correctIndex"]]],
+            "selected": [q2["options"][1]],
+        }
+    ]
+    assert client.get("/api/attempts/1/result", params={"userId": 2}).status_code == 404
+
+
+def test_quizzes_served_by_slug_with_own_db(tmp_path, monkeypatch):
+    quiz_file = make_quiz_file(tmp_path)
+    quiz_dir = tmp_path / "quizzes"
+    quiz_dir.mkdir()
+    other = json.loads(quiz_file.read_text(encoding="utf-8"))
+    other["name"] = "Other Quiz"
+    (quiz_dir / "other.json").write_text(json.dumps(other), encoding="utf-8")
+    monkeypatch.setenv("QUIZ_DIR", str(quiz_dir))
+    main = reload_main(quiz_file, monkeypatch)
+    main.ensure_schema()
+    client = TestClient(main.app)
+
+    assert client.get("/api/quizzes").json() == {"quizzes": ["other"], "open": 0}
+    assert client.get("/q/missing/api/config").status_code == 404
+    cfg = client.get("/q/other/api/config").json()
+    assert cfg["name"] == "Other Quiz" and cfg["quiz"] == "other"
+    assert client.get("/api/config").json()["quiz"] is None
+    assert client.get("/q/other").status_code == 200
+
+    # у квиза своя БД рядом с его json
+    other_quiz = main.quizzes.acquire("other")
+    main.quizzes.release(other_quiz)
+    assert other_quiz.db_path == quiz_dir / "other.db"
+    with other_quiz.connection() as conn:
+        conn.execute(
+            "INSERT INTO users (github_username, created_at) VALUES (?, ?)",
+            ("student", "2024-01-01T00:00:00Z"),
+        )
+
+    start = client.post("/q/other/api/attempts/start", json={"userId": 1})
+    assert start.status_code == 200
+    attempt_id = start.json()["attemptId"]
+    submit = client.post(
+        f"/q/other/api/attempts/{attempt_id}/submit",
+        json={"userId": 1, "answers": []},
+    )
+    assert submit.status_code == 200 and submit.json()["total"] == 2
+    # корневой квиз этого пользователя не знает
+    assert client.post("/api/attempts/start", json={"userId": 1}).status_code == 404
+    with main.get_db() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM attempts").fetchone()[0] == 0
+
+    # простаивающий квиз закрывается, следующий запрос откроет его снова
+    main.quizzes.idle = 0
+    assert main.quizzes.evict() == 1 and len(main.quizzes) == 0
+    status = client.get("/q/other/api/attempts/status/1").json()
+    assert status["attemptsUsed"] == 1
+
+    # фоновый сброс автосейва держит квиз: вытеснение не закроет его посреди сброса
+    import asyncio
+
+    reopened = next(q for q in main.quizzes.hold_all() if q.slug == "other")
+    main.quizzes.release_all([reopened])
+    leases = []
+    monkeypatch.setattr(reopened.progress, "flush", lambda: leases.append(reopened.leases))
+    monkeypatch.setattr(main, "PROGRESS_FLUSH_SECONDS", 0.01)
+
+    async def one_flush():
+        task = asyncio.create_task(main.flush_progress())
+        while not leases:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(one_flush())
+    assert leases[0] == 1
+
+
+def test_live_feed_fans_out_attempt_events(tmp_path, monkeypatch):
+    import asyncio
+
+    quiz_file = make_quiz_file(tmp_path)
+    monkeypatch.setenv("LECTOR", "prof")
+    main = reload_main(quiz_file, monkeypatch)
+    main.ensure_schema()
+    client = TestClient(main.app)
+
+    with main.get_db() as conn:
+        for name in ("prof", "s1"):
+            conn.execute(
+                "INSERT INTO users (github_username, created_at) VALUES (?, ?)",
+                (name, "2024-01-01T00:00:00Z"),
+            )
+    assert client.get("/api/live", params={"userId": 2}).status_code == 403
+    feed = main.quizzes.default.live
+
+    def exam():
+        start = client.post("/api/attempts/start", json={"userId": 2}).json()
+        q = start["questions"][0]
+        answers = [{"questionId": q["id"], "selectedIndexes": [0]}]
+        client.put(
+            f"/api/attempts/{start['attemptId']}/progress",
+            json={"userId": 2, "answers": answers, "currentIndex": 1},
+        )
+        client.post(
+            f"/api/attempts/{start['attemptId']}/submit",
+            json={"userId": 2, "answers": answers},
+        )
+
+    async def watch():
+        fast, snapshot = feed.subscribe()
+        # очередь на одно событие: второе уже не влезает
+        slow, _ = feed.subscribe(maxsize=1)
+        await asyncio.to_thread(exam)
+        await asyncio.sleep(0)
+        frames = []
+        while not fast.queue.empty():
+            frames.append(fast.queue.get_nowait())
+        return snapshot, frames, slow
+
+    snapshot, frames, slow = asyncio.run(watch())
+    assert json.loads(snapshot.split(b"data: ")[1])["stats"]["active"] == 0
+
+    events = [f.split(b"\n")[0] for f in frames]
+    assert events == [b"event: started", b"event: progress", b"event: submitted"]
+    progress = json.loads(frames[1].split(b"data: ")[1])
+    assert progress["username"] == "s1" and progress["answered"] == 1
+    submitted = json.loads(frames[2].split(b"data: ")[1])
+    assert submitted["stats"]["submitted"] == 1 and submitted["stats"]["active"] == 0
+
+    # медленного подписчика отключают, а не копят события без предела
+    assert slow.dropped and slow.queue.get_nowait() is None
+
+
+def test_sweeper_finalizes_expired_attempts_in_batches(tmp_path, monkeypatch):
+    quiz_file = make_quiz_file(tmp_path)
+    main = reload_main(quiz_file, monkeypatch)
+    main.ensure_schema()
+    client = TestClient(main.app)
+
+    with main.get_db() as conn:
+        for name in ("s1", "s2", "s3", "s4"):
+            conn.execute(
+                "INSERT INTO users (github_username, created_at) VALUES (?, ?)",
+                (name, "2024-01-01T00:00:00Z"),
+            )
+    # s1 успел ответить верно на первый вопрос, s2 ничего не сохранил, s3 ещё решает,
+    # попытку s4 проверить нельзя (нет версии банка), и она первая в очереди
+    started = {
+        uid: client.post("/api/attempts/start", json={"userId": uid}).json()
+        for uid in (1, 2, 3, 4)
+    }
+    q = started[1]["questions"][0]
+    original = main.banks.current.questions[q["id"]]
+    right = q["options"].index(original["options"][original["correctIndex"]])
+    client.put(
+        f"/api/attempts/{started[1]['attemptId']}/progress",
+        json={"userId": 1, "answers": [{"questionId": q["id"], "selectedIndexes": [right]}]},
+    )
+    conn = main.get_db()
+    with conn:
+        conn.execute(
+            "UPDATE attempts SET deadline_at = '2024-01-01T00:00:00+00:00' WHERE user_id < 3"
+        )
+        conn.execute(
+            "UPDATE attempts SET deadline_at = '2023-01-01T00:00:00+00:00', "
+            "bank_version = 'gone' WHERE user_id = 4"
+        )
+
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM attempts "
+        "WHERE finished_at IS NULL AND deadline_at <= ? AND (deadline_at, id) > (?, ?) "
+        "ORDER BY deadline_at, id LIMIT 1",
+        ("2025", "", 0),
+    ).fetchall()
+    assert "idx_attempts_finished_deadline" in " ".join(row[-1] for row in plan)
+
+    quiz = main.quizzes.default
+    # сломанная попытка пропускается, курсор уходит дальше
+    finished, cursor = main.sweep_expired(quiz, limit=1)
+    assert finished == 0 and cursor[1] == started[4]["attemptId"]
+    finished, cursor = main.sweep_expired(quiz, limit=1, after=cursor)
+    assert finished == 1
+    finished, cursor = main.sweep_expired(quiz, limit=1, after=cursor)
+    assert finished == 1
+    assert main.sweep_expired(quiz, after=cursor) == (0, None)
+    # следующий проход снова начинает с начала и снова пропускает s4
+    assert main.sweep_expired(quiz) == (0, None)
+
+    scores = dict(
+        conn.execute("SELECT user_id, score FROM attempts WHERE finished_at IS NOT NULL")
+    )
+    assert scores == {1: 1, 2: 0}
+    assert conn.execute("SELECT COUNT(*) FROM attempt_answers").fetchone()[0] == 4
+    assert conn.execute("SELECT COUNT(*) FROM attempt_progress").fetchone()[0] == 0
+    assert client.get("/api/attempts/status/1").json()["summary"]["best"]["score"] == 1
+    assert client.get("/api/attempts/status/3").json()["openAttempt"] is not None
+    assert client.get("/api/attempts/status/4").json()["openAttempt"] is not None
+
+
+def test_sweeper_leaves_queued_submits_alone(tmp_path, monkeypatch):
+    quiz_file = make_quiz_file(tmp_path)
+    main = reload_main(quiz_file, monkeypatch)
+    main.ensure_schema()
+    client = TestClient(main.app)
+    main.get_db().execute(
+        "INSERT INTO users (github_username, created_at) VALUES ('late', '2024-01-01')"
+    )
+    start = client.post("/api/attempts/start", json={"userId": 1}).json()
+    attempt_id = start["attemptId"]
+    quiz = main.quizzes.default
+
+    def expire(seconds_ago):
+        deadline = datetime.now(timezone.utc) - timedelta(seconds=seconds_ago)
+        with main.get_db() as conn:
+            conn.execute(
+                "UPDATE attempts SET deadline_at = ? WHERE id = ?",
+                (deadline.isoformat(), attempt_id),
+            )
+        return deadline
+
+    # дедлайн только что прошёл: сабмит ещё может стоять в очереди
+    expire(1)
+    assert main.sweep_expired(quiz) == (0, None)
+
+    # грейс истёк, но сабмит, пришедший вовремя, ещё ждёт слота
+    deadline = expire(main.SWEEP_GRACE_SECONDS + 1)
+    quiz.submit_started(attempt_id)
+    assert main.sweep_expired(quiz) == (0, None)
+    answers = {q["id"]: [0] for q in start["questions"]}
+    res = main.finish_attempt(attempt_id, 1, answers, deadline - timedelta(seconds=1))
+    quiz.submit_finished(attempt_id)
+    assert res.status_code == 200
+    assert main.get_db().execute(
+        "SELECT finished_at IS NOT NULL FROM attempts WHERE id = ?", (attempt_id,)
+    ).fetchone()[0]
+
+    # HTTP-сабмит снимает свою отметку, даже получив отказ
+    client.post(f"/api/attempts/{attempt_id}/submit", json={"userId": 1, "answers": []})
+    assert not quiz.submits
+
+
+def test_admission_rate_limits_users_and_bounds_the_queue(tmp_path, monkeypatch):
+    import asyncio
+
+    from admission import ConcurrencyGate
+
+    quiz_file = make_quiz_file(tmp_path)
+    monkeypatch.setenv("QUIZ_USER_BURST", "2")
+    monkeypatch.setenv("QUIZ_USER_RATE_PER_SECOND", "0.01")
+    main = reload_main(quiz_file, monkeypatch)
+    main.ensure_schema()
+    client = TestClient(main.app)
+
+    with main.get_db() as conn:
+        for name in ("s1", "s2"):
+            conn.execute(
+                "INSERT INTO users (github_username, created_at) VALUES (?, ?)",
+                (name, "2024-01-01T00:00:00Z"),
+            )
+    # двойной клик проходит, третий запрос подряд — 429 до обработчика
+    assert [
+        client.post("/api/attempts/start", json={"userId": 1}).status_code
+        for _ in range(3)
+    ] == [200, 200, 429]
+    limited = client.post("/api/attempts/start", json={"userId": 1})
+    assert limited.status_code == 429 and int(limited.headers["Retry-After"]) >= 1
+    # у другого пользователя свой бакет
+    assert client.post("/api/attempts/start", json={"userId": 2}).status_code == 200
+    with main.get_db() as conn:
+        assert conn.execute("SELECT attempts_count FROM users WHERE id = 1").fetchone()[0] == 2
+    text = client.get("/metrics").text
+    assert 'quiz_admission_rejected_total{reason="rate_limited"} 2' in text
+    assert 'quiz_admission_limit{limit="user_burst"} 2' in text
+
+    # сабмит, пришедший до дедлайна, засчитывается, даже если ждал слота дольше
+    attempt_id = client.post("/api/attempts/start", json={"userId": 2}).json()["attemptId"]
+    deadline = datetime.now(timezone.utc) - timedelta(seconds=1)
+    with main.get_db() as conn:
+        conn.execute(
+            "UPDATE attempts SET deadline_at = ? WHERE id = ?",
+            (deadline.isoformat(), attempt_id),
+        )
+    late = main.finish_attempt(attempt_id, 2, {}, deadline - timedelta(seconds=1))
+    assert late.status_code == 200
+
+    async def herd():
+        gate = ConcurrencyGate(limit=1, queue_size=1, wait_seconds=0.05)
+        assert await gate.enter()
+        queued = asyncio.ensure_future(gate.enter())
+        await asyncio.sleep(0)
+        # очередь полна: отказ сразу, без ожидания
+        assert gate.full() and not await gate.enter()
+        gate.leave()
+        assert await queued and gate.active == 1
+        # слот не освободился за wait_seconds
+        assert not await gate.enter()
+        # сабмит не получает отказ: встаёт сверх очереди и ждёт сколько нужно
+        queued = asyncio.ensure_future(gate.enter())
+        await asyncio.sleep(0)
+        submit = asyncio.ensure_future(gate.enter(patient=True))
+        await asyncio.sleep(0)
+        assert gate.full() and gate.waiting == 2
+        gate.leave()
+        assert await queued
+        gate.leave()
+        assert await submit
+        gate.leave()
+        return gate.active, gate.waiting
+
+    assert asyncio.run(herd()) == (0, 0)
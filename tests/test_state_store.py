@@ -0,0 +1,74 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db import ConnectionPool  # noqa: E402
+from schema import migrate  # noqa: E402
+from state_store import MemoryStateStore, SQLiteStateStore, StateStore  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_memory_store_expires_from_the_front():
+    clock = Clock()
+    store = MemoryStateStore(10, clock=clock)
+    for i in range(5):
+        store.issue(f"s{i}")
+        clock.now += 3
+
+    # s0 уже выброшен при выдаче s4, purge добирает истёкший s1
+    assert store.purge() == 1
+    assert len(store) == 3
+    assert not store.consume("s0")
+    assert store.consume("s4")
+    assert not store.consume("s4")
+
+
+def test_sqlite_store_is_shared_between_workers(tmp_path):
+    path = tmp_path / "quiz.db"
+    # два пула — как два процесса uvicorn со своими соединениями
+    pools = [ConnectionPool(path) for _ in range(2)]
+    migrate(pools[0].connection())
+    clock = Clock()
+    issuer, callback = [
+        SQLiteStateStore(p.connection, 10, clock=clock) for p in pools
+    ]
+
+    issuer.issue("old")
+    clock.now += 11
+    issuer.issue("fresh")
+
+    # состояние, выданное одним воркером, принимает другой — и только один раз
+    assert callback.consume("fresh")
+    assert not issuer.consume("fresh")
+    assert not callback.consume("old")
+
+    issuer.issue("late")
+    clock.now += 11
+    assert callback.purge() == 1
+    for p in pools:
+        p.close()
+
+
+def test_incomplete_store_cannot_be_created():
+    class NoPurge(StateStore):
+        def issue(self, state):
+            pass
+
+        def consume(self, state):
+            return False
+
+    # забытый метод всплывает при создании, а не в фоновой чистке
+    with pytest.raises(TypeError):
+        NoPurge(10)
@@ -0,0 +1,81 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db import ConnectionPool  # noqa: E402
+from writer import GroupCommitWriter  # noqa: E402
+
+
+def test_writer_batches_and_isolates_failures(tmp_path):
+    pool = ConnectionPool(tmp_path / "w.db")
+    pool.connection().execute("CREATE TABLE t (v INTEGER UNIQUE)")
+    writer = GroupCommitWriter(pool, max_batch=50, window_ms=20)
+
+    batches = []
+
+    def insert(value):
+        def fn(conn):
+            batches.append(conn.in_transaction)
+            conn.execute("INSERT INTO t (v) VALUES (?)", (value,))
+            return value
+
+        return fn
+
+    barrier = threading.Barrier(20)
+    futures = []
+
+    def submit(value):
+        barrier.wait()
+        futures.append(writer.submit(insert(value)))
+
+    # 20 разных значений + один дубль, который должен упасть отдельно
+    threads = [threading.Thread(target=submit, args=(v,)) for v in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    dup = writer.submit(insert(0))
+
+    assert sorted(f.result() for f in futures) == list(range(20))
+    with pytest.raises(Exception):
+        dup.result()
+    writer.close()
+
+    conn = pool.connection()
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 20
+    assert all(batches)
+    pool.close()
+
+
+def test_failed_commit_rolls_back_pooled_connection(tmp_path):
+    import sqlite3
+
+    failures = [1]
+
+    class BusyOnCommit(sqlite3.Connection):
+        def execute(self, sql, *args):
+            if sql == "COMMIT" and failures:
+                failures.pop()
+                raise sqlite3.OperationalError("database is locked")
+            return super().execute(sql, *args)
+
+    pool = ConnectionPool(tmp_path / "w.db", factory=BusyOnCommit)
+    pool.connection().execute("CREATE TABLE t (v INTEGER)")
+    writer = GroupCommitWriter(pool, max_batch=1, window_ms=0)
+
+    # первый COMMIT падает, как при SQLITE_BUSY
+    with pytest.raises(sqlite3.OperationalError):
+        writer.run(lambda conn: conn.execute("INSERT INTO t VALUES (1)"))
+    # соединение писателя не осталось внутри транзакции
+    writer.run(lambda conn: conn.execute("INSERT INTO t VALUES (2)"))
+    writer.close()
+
+    conn = pool.connection()
+    assert [r[0] for r in conn.execute("SELECT v FROM t")] == [2]
+    pool.close()
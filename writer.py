@@ -0,0 +1,106 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+from db import ConnectionPool, transaction
+
+WriteFn = Callable[[sqlite3.Connection], Any]
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """Single writer thread that commits queued writes in batches.
+
+    Each submitted callable runs inside its own SAVEPOINT of a shared
+    BEGIN IMMEDIATE transaction, so one failing write does not roll back
+    the rest of the batch. The returned future resolves after COMMIT.
+    """
+
+    def __init__(self, pool: ConnectionPool, max_batch: int = 128, window_ms: int = 2):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn: WriteFn) -> Future:
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((fn, future))
+        return future
+
+    def run(self, fn: WriteFn) -> Any:
+        return self.submit(fn).result()
+
+    def close(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop, name="quiz-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _loop(self):
+        conn = self.pool.connection()
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    timeout = deadline - time.monotonic()
+                    item = (
+                        self._queue.get(timeout=timeout)
+                        if timeout > 0
+                        else self._queue.get_nowait()
+                    )
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(conn, batch)
+
+    def _flush(self, conn: sqlite3.Connection, batch: List[Tuple[WriteFn, Future]]):
+        outcomes = []
+        try:
+            with transaction(conn, "IMMEDIATE"):
+                for fn, future in batch:
+                    conn.execute("SAVEPOINT write_item")
+                    try:
+                        result = fn(conn)
+                    except Exception as exc:
+                        conn.execute("ROLLBACK TO write_item")
+                        conn.execute("RELEASE write_item")
+                        outcomes.append((future, exc, None))
+                    else:
+                        conn.execute("RELEASE write_item")
+                        outcomes.append((future, None, result))
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+
+        for future, exc, result in outcomes:
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)